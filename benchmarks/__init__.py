@@ -0,0 +1 @@
+"""Benchmarks of nsbox's evaluation hot path; run them with `python -m benchmarks`."""
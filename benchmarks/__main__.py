@@ -0,0 +1,88 @@
+import argparse
+import json
+import sys
+from pathlib import Path
+
+from . import bench_api, bench_memfs, bench_nsio, bench_nsjail  # noqa: F401
+from .runner import BENCHMARKS, Options, UnavailableError, compare, metadata
+
+
+def parse_args() -> argparse.Namespace:
+    """Parse the command-line arguments."""
+    parser = argparse.ArgumentParser(
+        prog="python -m benchmarks", description="Benchmark the evaluation hot path of nsbox."
+    )
+    parser.add_argument(
+        "-k",
+        dest="filter",
+        action="append",
+        metavar="NAME",
+        help="only run the benchmark groups whose name contains NAME; may be repeated",
+    )
+    parser.add_argument("--repeat", type=int, default=Options.repeat, help="measured iterations")
+    parser.add_argument("--warmup", type=int, default=Options.warmup, help="unmeasured iterations")
+    parser.add_argument(
+        "--concurrency",
+        type=int,
+        default=Options.concurrency,
+        help="concurrent clients of the end-to-end benchmarks",
+    )
+    parser.add_argument("-o", "--output", type=Path, help="write the results to this JSON file")
+    parser.add_argument(
+        "--compare",
+        type=Path,
+        metavar="BASELINE",
+        help="compare the results to those in this JSON file, e.g. of another commit",
+    )
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=0.1,
+        help="relative change reported as a regression by --compare (default: %(default)s)",
+    )
+    return parser.parse_args()
+
+
+def main() -> int:
+    """Run the benchmarks, then write and compare their results; return the exit code."""
+    args = parse_args()
+    options = Options(repeat=args.repeat, warmup=args.warmup, concurrency=args.concurrency)
+
+    results = {}
+    skipped = {}
+    for name, func in BENCHMARKS.items():
+        if args.filter and not any(f in name for f in args.filter):
+            continue
+
+        print(f"{name}...", file=sys.stderr, flush=True)
+        try:
+            group = func(options)
+        except UnavailableError as e:
+            skipped[name] = str(e)
+            print(f"  skipped: {e}", file=sys.stderr)
+            continue
+
+        for result in group:
+            data = result.as_dict
+            results[result.name] = data
+            line = f"  {result.name:<38} p50 {data['p50'] * 1000:9.3f} ms"
+            line += f"  p95 {data['p95'] * 1000:9.3f} ms  p99 {data['p99'] * 1000:9.3f} ms"
+            if "throughput" in data:
+                line += f"  {data['throughput']:12.6g} {data['unit']}"
+            print(line, file=sys.stderr)
+
+    if args.output:
+        output = {"meta": metadata(options), "results": results, "skipped": skipped}
+        args.output.write_text(json.dumps(output, indent=2) + "\n")
+
+    if args.compare:
+        regressions = compare(args.compare, results, args.threshold)
+        if regressions:
+            print(f"\nRegressed: {', '.join(regressions)}", file=sys.stderr)
+            return 1
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
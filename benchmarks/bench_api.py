@@ -0,0 +1,99 @@
+"""End-to-end evaluation requests through Gunicorn."""
+import json
+import shutil
+import socket
+import subprocess
+import sys
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Iterator
+
+from .bench_nsjail import NSJAIL_PATH
+from .runner import Options, Result, UnavailableError, benchmark
+
+BODY = json.dumps({"language": "python", "input": "print('Hello world')"}).encode()
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+@contextmanager
+def _gunicorn(port: int) -> Iterator[str]:
+    """Run the API with the default Gunicorn config, and provide the URL of /eval."""
+    process = subprocess.Popen(
+        [
+            sys.executable,
+            "-m",
+            "gunicorn",
+            "-c",
+            "config/gunicorn.conf.py",
+            "--bind",
+            f"127.0.0.1:{port}",
+            "--access-logfile",
+            "/dev/null",
+        ],
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    try:
+        deadline = time.monotonic() + 60
+        while True:
+            try:
+                socket.create_connection(("127.0.0.1", port), timeout=1).close()
+                break
+            except OSError:
+                if process.poll() is not None:
+                    raise UnavailableError(f"Gunicorn exited with code {process.returncode}")
+                if time.monotonic() > deadline:
+                    raise UnavailableError("Gunicorn didn't start within 60 seconds")
+                time.sleep(0.1)
+        yield f"http://127.0.0.1:{port}/eval"
+    finally:
+        process.terminate()
+        process.wait(10)
+
+
+def _post(url: str) -> float:
+    """Send an evaluation request and return how long it took."""
+    request = urllib.request.Request(url, BODY, {"Content-Type": "application/json"})
+    start = time.perf_counter()
+    with urllib.request.urlopen(request) as response:
+        response.read()
+    return time.perf_counter() - start
+
+
+@benchmark("api")
+def bench_api(options: Options) -> list[Result]:
+    """Measure the latency of /eval and the requests served per second under concurrency."""
+    if shutil.which(NSJAIL_PATH) is None:
+        raise UnavailableError(f"NsJail was not found at {NSJAIL_PATH!r}")
+    try:
+        import gunicorn  # noqa: F401
+    except ImportError:
+        raise UnavailableError("Gunicorn is not installed")
+
+    with _gunicorn(_free_port()) as url:
+        for _ in range(options.warmup):
+            _post(url)
+
+        serial = [_post(url) for _ in range(options.repeat)]
+
+        requests = options.repeat * options.concurrency
+        with ThreadPoolExecutor(options.concurrency) as executor:
+            start = time.perf_counter()
+            concurrent = list(executor.map(lambda _: _post(url), range(requests)))
+            elapsed = time.perf_counter() - start
+
+    return [
+        Result("api.eval", serial),
+        Result(
+            f"api.eval.concurrency_{options.concurrency}",
+            concurrent,
+            extra={"throughput": requests / elapsed, "unit": "req/s"},
+        ),
+    ]
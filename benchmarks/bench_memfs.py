@@ -0,0 +1,32 @@
+"""Mounting and unmounting of memory file systems."""
+from nsbox.filesystem import Size
+from nsbox.memfs import MemFS, MemFSPool
+
+from .runner import Options, Result, UnavailableError, benchmark, measure
+
+
+@benchmark("memfs")
+def bench_memfs(options: Options) -> list[Result]:
+    """Measure the cost of creating and destroying a MemFS, and of reusing one from a pool."""
+    try:
+        MemFS(instance_size=Size.MiB).cleanup()
+    except OSError as e:
+        raise UnavailableError(f"Cannot mount a tmpfs: {e}")
+
+    def create_destroy() -> None:
+        MemFS(instance_size=48 * Size.MiB).cleanup()
+
+    results = [Result("memfs.create_destroy", measure(create_destroy, options))]
+
+    pool = MemFSPool(2, instance_size=48 * Size.MiB)
+    try:
+
+        def acquire_release() -> None:
+            with pool.memfs() as fs:
+                (fs.home / "file").write_bytes(b"x")
+
+        results.append(Result("memfs.pool_acquire_release", measure(acquire_release, options)))
+    finally:
+        pool.close()
+
+    return results
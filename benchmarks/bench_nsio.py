@@ -0,0 +1,66 @@
+"""Encoding and decoding of file attachments."""
+import json
+import os
+import tempfile
+from base64 import b64encode
+from pathlib import Path
+
+from nsbox.api.encoding import encode_json
+from nsbox.nsio import FileAttachment
+
+from .runner import Options, Result, benchmark, measure
+
+SIZE = 8 * 1024**2
+FILES = 16
+
+
+@benchmark("nsio")
+def bench_nsio(options: Options) -> list[Result]:
+    """Measure the base64 encoding and decoding throughput of attachments, in bytes."""
+    content = os.urandom(SIZE)
+    data = {"path": "data.bin", "content": b64encode(content).decode("ascii")}
+    results = [
+        Result(
+            "nsio.decode",
+            measure(lambda: FileAttachment.from_dict(data), options),
+            work=SIZE,
+            unit="B",
+        ),
+        Result(
+            "nsio.encode_chunks",
+            measure(lambda: sum(map(len, FileAttachment("a", content).iter_b64())), options),
+            work=SIZE,
+            unit="B",
+        ),
+        Result(
+            "nsio.encode_dict",
+            # as_dict is cached, so a new attachment is needed every time.
+            measure(lambda: FileAttachment("a", content).as_dict, options),
+            work=SIZE,
+            unit="B",
+        ),
+    ]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        for i in range(FILES):
+            Path(tmp, f"{i}.bin").write_bytes(os.urandom(SIZE // FILES))
+
+        def response() -> int:
+            files = [FileAttachment.from_path(path, tmp) for path in sorted(Path(tmp).iterdir())]
+            media = {"stdout": "", "returncode": 0, "files": [{"path": f.path} for f in files]}
+            _, chunks = encode_json(media, files)
+            return sum(map(len, chunks))
+
+        # Mapping the files and encoding the response as it would be written out.
+        results.append(Result("nsio.encode_response", measure(response, options), SIZE, "B"))
+
+    results.append(
+        Result(
+            "nsio.encode_json_dumps",
+            # The same response encoded in one go, for reference.
+            measure(lambda: json.dumps({"files": [FileAttachment("a", content).as_dict]}), options),
+            work=SIZE,
+            unit="B",
+        )
+    )
+    return results
@@ -0,0 +1,50 @@
+"""Evaluation of code with NsJail, the hot path of every request."""
+import logging
+import os
+import shutil
+
+from nsbox.nsio import FileAttachment
+from nsbox.nsjail import NsJail
+
+from .runner import Options, Result, UnavailableError, benchmark, measure
+
+NSJAIL_PATH = "/usr/sbin/nsjail"
+
+SNIPPETS = {
+    "trivial": "pass",
+    "cpu": "sum(i * i for i in range(2_000_000))",
+    "output": "import sys; sys.stdout.write('x' * 500_000)",
+    # Reads the attached files and writes as many back, to be returned.
+    "attachments": (
+        "import glob\n"
+        "for path in glob.glob('in*.bin'):\n"
+        "    with open(path, 'rb') as f, open(path.replace('in', 'out'), 'wb') as out:\n"
+        "        out.write(f.read())\n"
+    ),
+}
+ATTACHMENTS = 16
+ATTACHMENT_SIZE = 256 * 1024
+
+
+@benchmark("nsjail")
+def bench_nsjail(options: Options) -> list[Result]:
+    """Measure the latency of `NsJail.run_code` for snippets which stress different phases."""
+    if shutil.which(NSJAIL_PATH) is None:
+        raise UnavailableError(f"NsJail was not found at {NSJAIL_PATH!r}")
+
+    logging.getLogger("nsbox.nsjail").setLevel(logging.WARNING)
+    nsjail = NsJail(NSJAIL_PATH)
+
+    files = [FileAttachment(f"in{i}.bin", os.urandom(ATTACHMENT_SIZE)) for i in range(ATTACHMENTS)]
+
+    results = []
+    for name, code in SNIPPETS.items():
+        args = (["-c", code], files if name == "attachments" else [])
+        result = nsjail.run_code(*args)
+        if result.returncode != 0:
+            raise UnavailableError(f"The {name!r} snippet failed: {result.stdout[:200]!r}")
+
+        samples = measure(lambda args=args: nsjail.run_code(*args), options)
+        results.append(Result(f"nsjail.run_code.{name}", samples))
+
+    return results
@@ -0,0 +1,184 @@
+"""Measurement, reporting, and comparison of benchmark results."""
+from __future__ import annotations
+
+import datetime
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+from collections.abc import Callable, Iterable
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any
+
+__all__ = (
+    "BENCHMARKS",
+    "Options",
+    "Result",
+    "UnavailableError",
+    "benchmark",
+    "compare",
+    "measure",
+    "metadata",
+    "percentiles",
+)
+
+
+class UnavailableError(Exception):
+    """Raised by a benchmark which can't run on this host, e.g. for lack of NsJail."""
+
+
+@dataclass(frozen=True)
+class Options:
+    """Options shared by all benchmarks."""
+
+    repeat: int = 50
+    """Number of measured iterations of each benchmark."""
+    warmup: int = 3
+    """Number of iterations run before measuring, e.g. to fill caches and pools."""
+    concurrency: int = 4
+    """Number of concurrent clients of the end-to-end benchmarks."""
+
+
+@dataclass
+class Result:
+    """
+    The latencies of the iterations of a benchmark, in seconds.
+
+    If `work` is given, it is the amount of work done by each iteration, in `unit`, which is
+    reported as a throughput per second along with the latencies.
+    """
+
+    name: str
+    samples: list[float]
+    work: float | None = None
+    unit: str | None = None
+    extra: dict[str, float] = field(default_factory=dict)
+
+    @property
+    def as_dict(self) -> dict[str, Any]:
+        """Convert the result to a dict, as written to the JSON output."""
+        data: dict[str, Any] = {"n": len(self.samples), **percentiles(self.samples)}
+        if self.work is not None:
+            data["throughput"] = self.work / data["mean"] if data["mean"] else None
+            data["unit"] = f"{self.unit}/s"
+        data.update(self.extra)
+        return data
+
+
+def percentiles(samples: Iterable[float]) -> dict[str, float]:
+    """Return the p50, p95, and p99 of `samples`, along with their mean, minimum and maximum."""
+    samples = sorted(samples)
+    if len(samples) < 2:
+        (value,) = samples
+        quantiles = [value] * 99
+    else:
+        quantiles = statistics.quantiles(samples, n=100, method="inclusive")
+    return {
+        "p50": quantiles[49],
+        "p95": quantiles[94],
+        "p99": quantiles[98],
+        "mean": statistics.fmean(samples),
+        "min": samples[0],
+        "max": samples[-1],
+    }
+
+
+def measure(
+    func: Callable[[], object],
+    options: Options,
+    setup: Callable[[], object] | None = None,
+) -> list[float]:
+    """
+    Return the latency in seconds of each of `options.repeat` calls of `func`.
+
+    `setup` is called before each call, without being measured.
+    """
+    samples = []
+    for i in range(options.warmup + options.repeat):
+        if setup is not None:
+            setup()
+        start = time.perf_counter()
+        func()
+        elapsed = time.perf_counter() - start
+        if i >= options.warmup:
+            samples.append(elapsed)
+    return samples
+
+
+# Benchmark groups by name. Each returns the results of its benchmarks.
+BENCHMARKS: dict[str, Callable[[Options], list[Result]]] = {}
+
+
+def benchmark(
+    name: str,
+) -> Callable[[Callable[[Options], list[Result]]], Callable[[Options], list[Result]]]:
+    """Register a group of benchmarks under `name`."""
+
+    def decorator(func: Callable[[Options], list[Result]]) -> Callable[[Options], list[Result]]:
+        BENCHMARKS[name] = func
+        return func
+
+    return decorator
+
+
+def _git(*args: str) -> str | None:
+    """Return the output of a git command, or None if it fails."""
+    try:
+        return subprocess.check_output(["git", *args], text=True, stderr=subprocess.DEVNULL).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def metadata(options: Options) -> dict[str, Any]:
+    """Return what the results of a run depend on, to tell whether runs are comparable."""
+    return {
+        "commit": _git("rev-parse", "HEAD"),
+        "dirty": bool(_git("status", "--porcelain", "--untracked-files=no")),
+        "timestamp": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "options": {
+            "repeat": options.repeat,
+            "warmup": options.warmup,
+            "concurrency": options.concurrency,
+        },
+    }
+
+
+def compare(
+    baseline_path: str | Path, results: dict[str, dict[str, Any]], threshold: float
+) -> list[str]:
+    """
+    Print how `results` compare to those in the JSON file at `baseline_path`.
+
+    Latencies are compared by their p50, and throughputs by their value.
+
+    Returns:
+        The names of the benchmarks which regressed by more than `threshold`, e.g. 0.1 for 10%.
+    """
+    baseline = json.loads(Path(baseline_path).read_text())["results"]
+    regressions = []
+
+    print(f"\n{'benchmark':<40} {'baseline':>12} {'current':>12} {'change':>8}")
+    for name, result in results.items():
+        if (old := baseline.get(name)) is None:
+            continue
+
+        key = "throughput" if "throughput" in result else "p50"
+        if not old.get(key) or result.get(key) is None:
+            continue
+
+        change = result[key] / old[key] - 1
+        # Lower is better for latencies, higher for throughputs.
+        worse = -change if key == "throughput" else change
+        flag = " !" if worse > threshold else ""
+        if flag:
+            regressions.append(name)
+        print(f"{name:<40} {old[key]:>12.6g} {result[key]:>12.6g} {change:>+8.1%}{flag}")
+
+    return regressions
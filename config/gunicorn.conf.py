@@ -1,6 +1,45 @@
+import os
+import tempfile
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from gunicorn.arbiter import Arbiter
+    from gunicorn.workers.base import Worker
+
+# Metrics of all workers are collected through files in this directory.
+# It must be set before nsbox is imported; see nsbox/utils/metrics.py.
+os.environ.setdefault(
+    "PROMETHEUS_MULTIPROC_DIR", os.path.join(tempfile.gettempdir(), "nsbox-metrics")
+)
+
 workers = 2
+# Evaluations may also run concurrently in threads within each worker, e.g.:
+# worker_class = "gthread"
+# threads = 4
 bind = "0.0.0.0:8060"
 logger_class = "nsbox.utils.gunicorn.GunicornLogger"
 access_logformat = "%(m)s %(U)s%(q)s %(s)s %(b)s %(L)ss"
 access_logfile = "-"
 wsgi_app = "nsbox:NsAPI()"
+# Load the app in the master rather than in each worker; see on_starting below.
+# preload_app = True
+
+
+def on_starting(server: "Arbiter") -> None:
+    """
+    Remove metrics left behind by a previous run, and probe the host for every language.
+
+    The NsJail configs are parsed and the cgroups are set up once in the master, and inherited
+    by every worker, so that booting or respawning a worker doesn't have to do it again.
+    """
+    from nsbox.utils import metrics, probe
+
+    metrics.clear_multiprocess_dir()
+    probe.probe_languages()
+
+
+def child_exit(server: "Arbiter", worker: "Worker") -> None:
+    """Discard the live gauges of a worker which has exited."""
+    from nsbox.utils import metrics
+
+    metrics.mark_process_dead(worker.pid)
@@ -8,11 +8,12 @@ try:
 except metadata.PackageNotFoundError:  # pragma: no cover
     __version__ = "0.0.0.0+unknown"
 
-from nsbox.api import NsAPI  # noqa: E402
+from nsbox.aio import AsyncNsJail  # noqa: E402
+from nsbox.api import AsyncNsAPI, NsAPI  # noqa: E402
 from nsbox.nsjail import NsJail  # noqa: E402
 from nsbox.utils.logging import init_logger, init_sentry  # noqa: E402
 
-__all__ = ("NsJail", "NsAPI", "DEBUG")
+__all__ = ("NsJail", "NsAPI", "AsyncNsJail", "AsyncNsAPI", "DEBUG")
 
 init_sentry(__version__)
 init_logger(DEBUG)
@@ -0,0 +1,297 @@
+"""Evaluation of code with asyncio, to run many evaluations concurrently in one thread."""
+from __future__ import annotations
+
+import asyncio
+import codecs
+import logging
+import sys
+import time
+from collections.abc import AsyncGenerator, Iterable
+from contextlib import AbstractContextManager, ExitStack, aclosing, asynccontextmanager, suppress
+from tempfile import NamedTemporaryFile
+from typing import IO, TypeVar
+
+from nsbox import DEBUG
+from nsbox.memfs import FileWriteError, MemFS
+from nsbox.nsio import FileAttachment
+from nsbox.nsjail import WALL_TIME_GRACE, NsJail, _StdoutResult
+from nsbox.process import EvalResult
+from nsbox.utils import metrics
+from nsbox.utils.cgroup import RunCgroup
+from nsbox.utils.logging import run_id
+
+__all__ = ("AsyncNsJail",)
+
+log = logging.getLogger(__name__)
+
+_T = TypeVar("_T")
+
+
+@asynccontextmanager
+async def _in_thread(cm: AbstractContextManager[_T]) -> AsyncGenerator[_T, None]:
+    """Enter and exit a blocking context manager in a worker thread."""
+    value = await asyncio.to_thread(cm.__enter__)
+    try:
+        yield value
+    except BaseException:
+        if not await asyncio.to_thread(cm.__exit__, *sys.exc_info()):
+            raise
+    else:
+        await asyncio.to_thread(cm.__exit__, None, None, None)
+
+
+class AsyncNsJail(NsJail):
+    """
+    Core nsbox functionality, with evaluations run as coroutines rather than in threads.
+
+    NsJail is started with `asyncio.create_subprocess_exec` and its output is read from the
+    event loop, so a single thread can wait on many evaluations at once. The remaining
+    blocking work, i.e. mounting and unmounting the memory file system, writing the files,
+    and collecting the attachments, runs in the default executor of the loop.
+
+    The options are the same as those of `NsJail`, except that warm interpreters aren't
+    supported; every evaluation starts a new jail.
+    """
+
+    def __init__(self, *args, warm_pool_size: int = 0, **kwargs):
+        """Initialize NsJail; see `NsJail.__init__`."""
+        if warm_pool_size > 0:
+            log.warning("Warm interpreters aren't supported by AsyncNsJail, ignoring them.")
+        super().__init__(*args, **kwargs)
+
+    async def run_code(  # type: ignore[override]
+        self,
+        run_args: Iterable[str],
+        files: Iterable[FileAttachment] = (),
+        nsjail_args: Iterable[str] = (),
+    ) -> EvalResult:
+        """
+        Execute Python 3 code in an isolated environment and return the completed process.
+
+        Args:
+            run_args: Arguments to pass to Python.
+            files: FileAttachments to write to the sandbox prior to running Python.
+            nsjail_args: Overrides for the NsJail configuration.
+        """
+        output = []
+        async for chunk in self.stream_code(run_args, files, nsjail_args):
+            if isinstance(chunk, EvalResult):
+                result = chunk
+            else:
+                output.append(chunk)
+
+        if result.stdout is None:
+            result.stdout = "".join(output)
+        return result
+
+    async def stream_code(  # type: ignore[override]
+        self,
+        run_args: Iterable[str],
+        files: Iterable[FileAttachment] = (),
+        nsjail_args: Iterable[str] = (),
+    ) -> AsyncGenerator[str | EvalResult, None]:
+        """
+        Execute Python 3 code in an isolated environment, yielding its output as it is produced.
+
+        The last item yielded is the completed process, as returned by `NsJail.stream_code`.
+        Its `usage` only holds the stats read from the cgroup of the run, if any.
+
+        If the generator is closed or cancelled early, NsJail is terminated.
+
+        Args:
+            run_args: Arguments to pass to Python.
+            files: FileAttachments to write to the sandbox prior to running Python.
+            nsjail_args: Overrides for the NsJail configuration.
+        """
+        start = time.monotonic()
+        timings: dict[str, float] = {}
+
+        with run_id(), ExitStack() as blobs:
+            nsjail_args = tuple(nsjail_args)
+            files = tuple(files)
+            try:
+                blob_args = blobs.enter_context(self._blob_mounts(files))
+            except FileWriteError as e:
+                log.info(f"Failed to mount file {e.path!r}.", exc_info=e.error)
+                result = EvalResult([*self._argv_head, *nsjail_args], None, str(e))
+            else:
+                with NamedTemporaryFile() as nsj_log:
+                    async with (
+                        _in_thread(self._memfs(timings)) as fs,
+                        _in_thread(self._cgroup()) as cgroup,
+                    ):
+                        args = self._cold_args(
+                            run_args, (*blob_args, *nsjail_args), nsj_log.name, fs, cgroup
+                        )
+                        stream = self._stream(
+                            args,
+                            fs,
+                            nsj_log,
+                            files,
+                            self._wall_time_limit(nsjail_args),
+                            timings,
+                            cgroup,
+                        )
+                        async with aclosing(stream):
+                            async for item in stream:
+                                if isinstance(item, EvalResult):
+                                    result = item
+                                else:
+                                    yield item
+                        cleanup_start = time.monotonic()
+
+                metrics.observe_phase("cleanup", time.monotonic() - cleanup_start, timings)
+
+        timings["total"] = time.monotonic() - start
+        result.timings = timings
+        metrics.observe_result(result)
+        yield result
+
+    async def _stream(  # type: ignore[override]
+        self,
+        args: list[str],
+        fs: MemFS,
+        nsj_log: IO[bytes],
+        files: Iterable[FileAttachment],
+        timeout: float | None,
+        timings: dict[str, float] | None = None,
+        cgroup: RunCgroup | None = None,
+    ) -> AsyncGenerator[str | EvalResult, None]:
+        """
+        Write `files` to `fs`, start NsJail, and yield its output until it exits.
+
+        The last item yielded is the result. See `NsJail._stream` for the arguments.
+        """
+        files_written = await asyncio.to_thread(self._write_files, args, fs, files, timings)
+        if isinstance(files_written, EvalResult):
+            yield files_written
+            return
+
+        msg = "Executing code..."
+        if DEBUG:
+            msg = f"{msg[:-3]} with the arguments {args}."
+        log.info(msg)
+
+        started = time.monotonic()
+        try:
+            with metrics.timed("nsjail_start", timings):
+                nsjail = await asyncio.create_subprocess_exec(
+                    *args,
+                    stdout=asyncio.subprocess.PIPE,
+                    stderr=asyncio.subprocess.STDOUT,
+                    pass_fds=self._pass_fds,
+                )
+        except ValueError:
+            yield EvalResult(args, None, "ValueError: embedded null byte")
+            return
+
+        # Only the start of the output is kept, in case it is needed to parse NsJail's logs.
+        head = ""
+        reader = self._read_output(nsjail, timeout)
+        async with aclosing(reader):
+            async for chunk in reader:
+                if not isinstance(chunk, str):
+                    stdout = chunk
+                    break
+                head = head or chunk
+                yield chunk
+
+        if stdout is None:
+            yield EvalResult(args, None, "UnicodeDecodeError: invalid Unicode in output pipe")
+            return
+
+        # Both include the start of NsJail; the output is captured until STDOUT is closed,
+        # after which NsJail is reaped.
+        metrics.observe_phase("stdout", stdout.closed - started, timings)
+        metrics.observe_phase("execution", time.monotonic() - started, timings)
+
+        # Signalled processes have negative return codes; NsJail reports them as `N + 128`.
+        returncode = -nsjail.returncode + 128 if nsjail.returncode < 0 else nsjail.returncode
+
+        yield await asyncio.to_thread(
+            self._result,
+            args,
+            returncode,
+            stdout,
+            head,
+            fs,
+            nsj_log,
+            files_written,
+            timings,
+            cgroup,
+        )
+
+    async def _read_output(
+        self, nsjail: asyncio.subprocess.Process, timeout: float | None = None
+    ) -> AsyncGenerator[str | _StdoutResult | None, None]:
+        """
+        Yield the output of NsJail as it is read, stopping at the output limit or when it exits.
+
+        NsJail is terminated once the output exceeds `output_limit`, if it is still running
+        after `timeout` seconds, or if the caller stops iterating early. It is killed if it
+        doesn't exit within a grace period after being terminated.
+
+        The last item yielded is how reading ended, or None if the output isn't valid UTF-8.
+        """
+        loop = asyncio.get_running_loop()
+        decoder = codecs.getincrementaldecoder("utf-8")()
+        limit = self.output_limit
+        output_size = 0
+        truncated = False
+        terminating = False
+        deadline = None if timeout is None else loop.time() + timeout
+
+        def terminate() -> None:
+            # The process may already have exited and been reaped.
+            with suppress(ProcessLookupError):
+                nsjail.terminate()
+
+        try:
+            while True:
+                try:
+                    async with asyncio.timeout_at(deadline):
+                        chunk = await nsjail.stdout.read(self.read_chunk_size)
+                except TimeoutError:
+                    if terminating:
+                        # NsJail didn't close STDOUT within the grace period.
+                        with suppress(ProcessLookupError):
+                            nsjail.kill()
+                        break
+                    log.info(f"NsJail exceeded the wall time limit of {timeout}s, terminating.")
+                    terminate()
+                    terminating = True
+                    # Give NsJail a moment to reap its children.
+                    deadline = loop.time() + WALL_TIME_GRACE
+                    continue
+
+                if not chunk:
+                    break
+
+                output_size += len(chunk)
+                if output_size > limit:
+                    log.info("Output exceeded the output limit, sending SIGTERM to NsJail.")
+                    terminate()
+                    truncated = True
+                    metrics.OUTPUT_TRUNCATIONS.inc()
+                    chunk = chunk[: len(chunk) - (output_size - limit)]
+
+                if chars := decoder.decode(chunk):
+                    yield chars
+                if truncated:
+                    break
+
+            # A character may have been cut off by the truncation, which isn't an error.
+            if not truncated and (chars := decoder.decode(b"", final=True)):
+                yield chars
+        except UnicodeDecodeError:
+            terminate()
+            await nsjail.wait()
+            yield None
+            return
+        except BaseException:
+            terminate()
+            raise
+
+        closed = time.monotonic()
+        await nsjail.wait()
+        yield _StdoutResult(truncated, min(output_size, limit), closed, None)
@@ -1,3 +1,4 @@
 from .nsboxapi import NsAPI
+from .nsboxasgi import AsyncNsAPI
 
-__all__ = ("NsAPI",)
+__all__ = ("AsyncNsAPI", "NsAPI")
@@ -0,0 +1,47 @@
+"""Incremental encoding of responses with files, as they are written out."""
+from __future__ import annotations
+
+import json
+from collections.abc import Iterator, Sequence
+from typing import Any
+
+from nsbox.nsio import FileAttachment
+
+__all__ = ("encode_json",)
+
+
+def encode_json(
+    media: dict[str, Any], files: Sequence[FileAttachment]
+) -> tuple[int, Iterator[bytes]]:
+    """
+    Encode a response as JSON, base64-encoding the content of its files only as it is written.
+
+    `media["files"]` must hold a dict for each of `files`, in the same order, to which
+    the "content" of the file is added. At most one chunk of each file is held in memory at
+    a time.
+
+    Returns:
+        The content length, and an iterator over the chunks of the body.
+    """
+    entries = media.get("files", [])
+    rest = json.dumps({key: value for key, value in media.items() if key != "files"})
+
+    # The "files" array goes last; the other keys are written as is.
+    head = rest[:-1] + (', "files": [' if len(rest) > 2 else '"files": [')
+    # Each entry up to, and then from, its base64-encoded content.
+    parts = [(json.dumps(entry)[:-1] + ', "content": "', '"}') for entry in entries]
+    tail = "]}"
+
+    length = len(head) + len(tail) + max(len(entries) - 1, 0) * 2
+    for (start, end), file in zip(parts, files, strict=True):
+        length += len(start) + file.b64_size + len(end)
+
+    def chunks() -> Iterator[bytes]:
+        yield head.encode()
+        for i, ((start, end), file) in enumerate(zip(parts, files)):
+            yield (", " + start if i else start).encode()
+            yield from file.iter_b64()
+            yield end.encode()
+        yield tail.encode()
+
+    return length, chunks()
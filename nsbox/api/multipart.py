@@ -0,0 +1,139 @@
+"""Binary transport of files as multipart/form-data, as an alternative to base64 in JSON."""
+from __future__ import annotations
+
+import json
+from collections.abc import Iterable, Iterator
+from typing import IO, Any
+from uuid import uuid4
+
+import falcon
+from falcon.media import MultipartFormHandler
+
+from nsbox.nsio import FileAttachment, ParsingError, safe_path
+
+__all__ = ("MULTIPART", "MultipartBody", "MultipartHandler", "encode")
+
+MULTIPART = falcon.MEDIA_MULTIPART
+
+# Name of the part holding the JSON request or response, and of the parts holding files.
+JSON_PART_REQUEST = "request"
+JSON_PART_RESPONSE = "result"
+FILES_PART = "files"
+ARCHIVE_PART = "archive"
+
+
+class MultipartBody(dict):
+    """
+    A request body received as multipart/form-data.
+
+    The dict holds the JSON "request" part, `attachments` the files sent as binary parts, and
+    `archive` the content of the "archive" part, if any.
+    """
+
+    def __init__(
+        self,
+        data: dict[str, Any],
+        attachments: list[FileAttachment],
+        archive: bytes | None = None,
+    ) -> None:
+        super().__init__(data)
+        self.attachments = attachments
+        self.archive = archive
+
+
+class MultipartHandler(MultipartFormHandler):
+    """
+    Deserialize multipart/form-data requests into a `MultipartBody`.
+
+    The form must have a "request" part with the JSON request body, and may have any number
+    of "files" parts, whose filename is the path of the file, and an "archive" part with an
+    archive of files. The content of the files is read
+    as is, without any encoding. The request body is validated as usual once deserialized.
+    """
+
+    def deserialize(
+        self, stream: IO[bytes], content_type: str, content_length: int | None
+    ) -> MultipartBody:
+        """
+        Deserialize the form into a `MultipartBody`.
+
+        Raises:
+            falcon.MediaMalformedError: If the form or the "request" part is malformed.
+            falcon.HTTPBadRequest: If the "request" part is missing, or a file is invalid.
+        """
+        form = super().deserialize(stream, content_type, content_length)
+
+        data = None
+        attachments = []
+        archive = None
+        for part in form:
+            if part.name == JSON_PART_REQUEST:
+                try:
+                    data = json.loads(part.get_data())
+                except ValueError as e:
+                    raise falcon.MediaMalformedError(falcon.MEDIA_JSON) from e
+            elif part.name == FILES_PART:
+                try:
+                    path = safe_path(part.filename or "")
+                except ParsingError as e:
+                    raise falcon.HTTPBadRequest(title="Request file is invalid", description=str(e))
+                # Read straight from the request stream, unlike get_data(), which is limited.
+                attachments.append(FileAttachment(path, part.stream.read()))
+            elif part.name == ARCHIVE_PART:
+                archive = part.stream.read()
+
+        if data is None:
+            raise falcon.HTTPBadRequest(
+                title="Request data is missing",
+                description=f"The form has no {JSON_PART_REQUEST!r} part.",
+            )
+        return MultipartBody(data, attachments, archive)
+
+
+def _filename(path: str) -> str:
+    """Escape a path for use as a quoted filename, like browsers do in forms."""
+    return path.replace('"', "%22").replace("\r", "%0D").replace("\n", "%0A")
+
+
+def encode(
+    media: dict[str, Any], files: Iterable[FileAttachment]
+) -> tuple[str, int, Iterator[bytes]]:
+    """
+    Encode a response and its files as multipart/form-data.
+
+    The JSON "result" part holds `media`; each file follows in a "files" part of its own. The
+    content of the files isn't encoded, and is only read in chunks as the body is written out.
+
+    Returns:
+        The content type, the content length, and the chunks of the body.
+    """
+    boundary = uuid4().hex
+    head = (
+        f"--{boundary}\r\n"
+        f'Content-Disposition: form-data; name="{JSON_PART_RESPONSE}"\r\n'
+        f"Content-Type: {falcon.MEDIA_JSON}\r\n\r\n".encode() + json.dumps(media).encode() + b"\r\n"
+    )
+    parts = [
+        (
+            f"--{boundary}\r\n"
+            f'Content-Disposition: form-data; name="{FILES_PART}"; '
+            f'filename="{_filename(file.path)}"\r\n'
+            "Content-Type: application/octet-stream\r\n\r\n".encode(),
+            file,
+        )
+        for file in files
+    ]
+    tail = f"--{boundary}--\r\n".encode()
+
+    length = len(head) + len(tail) + sum(len(header) + file.size + 2 for header, file in parts)
+
+    def chunks() -> Iterator[bytes]:
+        yield head
+        for header, file in parts:
+            yield header
+            yield from file.iter_content()
+            yield b"\r\n"
+        yield tail
+
+    content_type = f"{MULTIPART}; boundary={boundary}"
+    return content_type, length, chunks()
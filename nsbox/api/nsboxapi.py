@@ -1,20 +1,56 @@
+import tempfile
+from pathlib import Path
+
 import falcon
 
+from nsbox.blobs import BlobStore
+from nsbox.cache import ResultCache
+from nsbox.jobs import JobQueue
+from nsbox.languages import Language, LanguageRegistry
 from nsbox.nsjail import NsJail
 
-from .resources import EvalResource
+from .multipart import MULTIPART, MultipartHandler
+from .resources import (
+    BatchResource,
+    BlobResource,
+    EvalResource,
+    JobResource,
+    JobsResource,
+    MetricsResource,
+    StreamResource,
+)
 
 
 class NsAPI(falcon.App):
     """
     The main entry point to the nsbox JSON API.
 
-    Forward arguments to a new `NsJail` object.
+    Forward arguments to the `NsJail` object of each language, which is only created once the
+    language is first used. The languages are loaded from the TOML files in `languages_dir`;
+    options given in a file override the arguments of the app for that language.
 
     Routes:
 
     - /eval
-        Evaluation of Python code
+        Evaluation of code
+
+    - /eval/stream
+        Evaluation of code with the output streamed as it is produced
+
+    - /eval/batch
+        Evaluation of many code snippets in parallel
+
+    - /eval/jobs
+        Asynchronous evaluation of code
+
+    - /eval/jobs/{id}
+        Status and result of an asynchronous evaluation
+
+    - /blobs/{sha256}
+        Storage of input files by their digest, if the blob store is enabled
+
+    - /metrics
+        Prometheus metrics
 
     Error response format:
 
@@ -24,9 +60,92 @@ class NsAPI(falcon.App):
     ... }
     """
 
-    def __init__(self, *args, **kwargs):
+    def __init__(
+        self,
+        *args,
+        languages_dir: str = "./config/languages",
+        job_workers: int = 2,
+        job_queue_size: int = 16,
+        job_language_limits: dict[str, int] | None = None,
+        job_result_ttl: float = 300,
+        job_state_dir: str | None = None,
+        cache_size: int = 0,
+        cache_max_bytes: int = 64 * 1024**2,
+        cache_ttl: float = 300,
+        batch_workers: int | None = None,
+        batch_max_items: int = 500,
+        batch_timeout: float = 60,
+        blob_store_size: int = 0,
+        blob_dir: str | None = None,
+        **kwargs,
+    ):
+        """
+        Initialize the API.
+
+        Args:
+            languages_dir: Directory of the TOML files which define the languages.
+            job_workers: Number of asynchronous jobs run concurrently by each worker process.
+            job_queue_size: Maximum number of jobs waiting to run in each worker process.
+            job_language_limits: Maximum number of concurrently running jobs per language.
+            job_result_ttl: Time in seconds for which the results of finished jobs are kept.
+            job_state_dir: Directory through which worker processes share job states.
+                Defaults to "nsbox-jobs" in the system's temporary directory.
+            cache_size: Maximum number of results cached by each worker process,
+                0 to disable the result cache.
+            cache_max_bytes: Maximum total size in bytes of the cached results.
+            cache_ttl: Time in seconds for which results are cached.
+            batch_workers: Maximum number of batch items evaluated concurrently by each worker
+                process. Defaults to the number of CPUs.
+            batch_max_items: Maximum number of items in a batch.
+            batch_timeout: Maximum time in seconds a batch may take.
+            blob_store_size: Maximum total size in bytes of the stored input files,
+                0 to disable the blob store.
+            blob_dir: Directory in which worker processes share the stored input files, on the
+                file system to keep them on, e.g. a tmpfs. Defaults to "nsbox-blobs" in the
+                system's temporary directory.
+        """
         super().__init__()
+        self.req_options.media_handlers[MULTIPART] = MultipartHandler()
+
+        def runner(language: Language) -> NsJail:
+            options = {**kwargs, **language.options, "config_path": str(language.config_path)}
+            return NsJail(*args, **options)
+
+        self.languages = LanguageRegistry.from_dir(languages_dir, runner)
+        self.cache = None
+        if cache_size > 0:
+            self.cache = ResultCache(
+                max_entries=cache_size, max_bytes=cache_max_bytes, ttl=cache_ttl
+            )
+
+        self.blobs = None
+        if blob_store_size > 0:
+            self.blobs = BlobStore(
+                blob_dir or Path(tempfile.gettempdir(), "nsbox-blobs"), blob_store_size
+            )
+
+        eval_resource = EvalResource(self.languages, self.cache, self.blobs)
+        self.jobs = JobQueue(
+            workers=job_workers,
+            max_queued=job_queue_size,
+            language_limits=job_language_limits,
+            result_ttl=job_result_ttl,
+            state_dir=job_state_dir or Path(tempfile.gettempdir(), "nsbox-jobs"),
+        )
 
-        nsjail_js = NsJail(*args, config_path='./config/nsbox_js.cfg', **kwargs)
-        nsjail_py = NsJail(*args, config_path='./config/nsbox_py.cfg', **kwargs)
-        self.add_route("/eval", EvalResource(nsjail_py, nsjail_js))
+        self.add_route("/eval", eval_resource)
+        self.add_route("/eval/stream", StreamResource(eval_resource))
+        self.add_route(
+            "/eval/batch",
+            BatchResource(
+                eval_resource,
+                workers=batch_workers,
+                max_items=batch_max_items,
+                timeout=batch_timeout,
+            ),
+        )
+        self.add_route("/eval/jobs", JobsResource(eval_resource, self.jobs))
+        self.add_route("/eval/jobs/{job_id}", JobResource(self.jobs))
+        if self.blobs is not None:
+            self.add_route("/blobs/{sha256}", BlobResource(self.blobs))
+        self.add_route("/metrics", MetricsResource())
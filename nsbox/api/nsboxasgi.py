@@ -0,0 +1,75 @@
+import falcon.asgi
+
+from nsbox.aio import AsyncNsJail
+from nsbox.cache import ResultCache
+from nsbox.languages import Language, LanguageRegistry
+
+from .resources import AsyncEvalResource, AsyncMetricsResource, AsyncStreamResource
+
+
+class AsyncNsAPI(falcon.asgi.App):
+    """
+    The entry point to the nsbox JSON API as an ASGI app.
+
+    Forward arguments to the `AsyncNsJail` object of each language, which is only created once
+    the language is first used; see `NsAPI` for how the languages are defined.
+
+    Evaluations run as coroutines, so that a single worker can have many of them in flight.
+    Only the routes below are available; request bodies must be JSON.
+
+    Routes:
+
+    - /eval
+        Evaluation of code
+
+    - /eval/stream
+        Evaluation of code with the output streamed as it is produced
+
+    - /metrics
+        Prometheus metrics
+
+    Error response format:
+
+    >>> {
+    ...     "title": "415 Unsupported Media Type",
+    ...     "description": "application/xml is an unsupported media type."
+    ... }
+    """
+
+    def __init__(
+        self,
+        *args,
+        languages_dir: str = "./config/languages",
+        cache_size: int = 0,
+        cache_max_bytes: int = 64 * 1024**2,
+        cache_ttl: float = 300,
+        **kwargs,
+    ):
+        """
+        Initialize the API.
+
+        Args:
+            languages_dir: Directory of the TOML files which define the languages.
+            cache_size: Maximum number of results cached by each worker process,
+                0 to disable the result cache.
+            cache_max_bytes: Maximum total size in bytes of the cached results.
+            cache_ttl: Time in seconds for which results are cached.
+        """
+        super().__init__()
+
+        def runner(language: Language) -> AsyncNsJail:
+            options = {**kwargs, **language.options, "config_path": str(language.config_path)}
+            return AsyncNsJail(*args, **options)
+
+        self.languages = LanguageRegistry.from_dir(languages_dir, runner)
+        self.cache = None
+        if cache_size > 0:
+            self.cache = ResultCache(
+                max_entries=cache_size, max_bytes=cache_max_bytes, ttl=cache_ttl
+            )
+
+        eval_resource = AsyncEvalResource(self.languages, self.cache)
+
+        self.add_route("/eval", eval_resource)
+        self.add_route("/eval/stream", AsyncStreamResource(eval_resource))
+        self.add_route("/metrics", AsyncMetricsResource())
@@ -1,3 +1,19 @@
-from .eval import EvalResource
+from .batch import BatchResource
+from .blobs import BlobResource
+from .eval import AsyncEvalResource, EvalResource
+from .jobs import JobResource, JobsResource
+from .metrics import AsyncMetricsResource, MetricsResource
+from .stream import AsyncStreamResource, StreamResource
 
-__all__ = ("EvalResource",)
+__all__ = (
+    "AsyncEvalResource",
+    "AsyncMetricsResource",
+    "AsyncStreamResource",
+    "BatchResource",
+    "BlobResource",
+    "EvalResource",
+    "JobResource",
+    "JobsResource",
+    "MetricsResource",
+    "StreamResource",
+)
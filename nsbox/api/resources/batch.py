@@ -0,0 +1,215 @@
+from __future__ import annotations
+
+import logging
+import os
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+from contextlib import ExitStack
+from typing import Any
+
+import falcon
+from falcon.media.validators.jsonschema import validate
+
+from nsbox.nsio import FileAttachment, ParsingError
+from nsbox.nsjail import WALL_TIME_GRACE, NsJail
+from nsbox.process import EvalResult
+
+from .eval import EvalResource
+
+__all__ = ("BatchResource",)
+
+log = logging.getLogger(__name__)
+
+
+class BatchResource:
+    """
+    Evaluation of many code snippets in one request.
+
+    Supported methods:
+
+    - POST /eval/batch
+        Evaluate a list of snippets in parallel and return their results
+    """
+
+    REQ_SCHEMA = {
+        "type": "object",
+        "properties": {
+            "items": {"type": "array", "items": EvalResource.REQ_SCHEMA, "minItems": 1},
+            "files": EvalResource.REQ_SCHEMA["properties"]["files"],
+            "timeout": {"type": "number", "exclusiveMinimum": 0},
+        },
+        "required": ["items"],
+    }
+
+    def __init__(
+        self,
+        eval_resource: EvalResource,
+        workers: int | None = None,
+        max_items: int = 500,
+        timeout: float = 60,
+    ):
+        """
+        Initialize the resource.
+
+        Args:
+            eval_resource: The resource which evaluates each item.
+            workers: Maximum number of items evaluated concurrently by each worker process.
+                Defaults to the number of CPUs.
+            max_items: Maximum number of items in a request.
+            timeout: Maximum time in seconds a request may take; the default for requests
+                which don't specify a `timeout` of their own.
+        """
+        self.eval_resource = eval_resource
+        self.workers = workers or os.cpu_count() or 1
+        self.max_items = max_items
+        self.timeout = timeout
+
+        self._pool: ThreadPoolExecutor | None = None
+        self._pid: int | None = None
+        self._lock = threading.Lock()
+
+    def _executor(self) -> ThreadPoolExecutor:
+        """Return the thread pool of the current process, creating it if needed."""
+        with self._lock:
+            pid = os.getpid()
+            if self._pid != pid:
+                # Threads inherited through a fork belong to the parent process.
+                self._pool = ThreadPoolExecutor(self.workers, thread_name_prefix="Batch")
+                self._pid = pid
+            return self._pool
+
+    @validate(REQ_SCHEMA)
+    def on_post(self, req: falcon.Request, resp: falcon.Response) -> None:
+        """
+        Evaluate a list of snippets in parallel and return their results.
+
+        Each item of `items` is a request body as for POST /eval. The items are evaluated
+        concurrently by a bounded pool of runners, and their results are returned in the
+        same order.
+
+        The `files` are written once and mounted read-only as the `shared` directory within
+        the home directory of every item, e.g. for test data common to all items.
+
+        All items must finish within `timeout` seconds, which is capped by the server. The time
+        limit of each item is lowered to the time left when it starts, so that it can't
+        outlast the deadline. Items which haven't started by then are skipped. The results of
+        the items which did finish are returned regardless.
+
+        Each result has a status of "done", "failed", or "timeout":
+
+        - done
+            The item was evaluated; `result` is as the response of POST /eval
+        - failed
+            An exception occurred while trying to evaluate the item
+        - timeout
+            The deadline passed before the item finished, or before it started
+
+        Request body:
+
+        >>> {
+        ...     "items": [
+        ...         {"language": "python", "input": "print(open('shared/data.txt').read())"},
+        ...         {"language": "python", "input": "print(1 + 1)"}
+        ...     ],
+        ...     "files": [{"path": "data.txt", "content": "SGVsbG8="}],
+        ...     "timeout": 30
+        ... }
+
+        Response format:
+
+        >>> {
+        ...     "results": [
+        ...         {"status": "done", "result": {"stdout": "Hello\\n", "returncode": 0, ...}},
+        ...         {"status": "timeout"}
+        ...     ],
+        ...     "timed_out": true
+        ... }
+
+        Status codes:
+
+        - 200
+            The items were evaluated, at least partially; see the status of each result
+        - 400
+           Input JSON schema is invalid, or an item or shared file is invalid
+        - 413
+            The request has more items than the server allows
+        - 415
+            Unsupported content type; only application/JSON is supported
+        """
+        body = req.media
+        items = body["items"]
+        if len(items) > self.max_items:
+            raise falcon.HTTPPayloadTooLarge(
+                title="Too many items",
+                description=f"A batch may have at most {self.max_items} items.",
+            )
+
+        deadline = time.monotonic() + min(body.get("timeout", self.timeout), self.timeout)
+
+        # Reject invalid items right away rather than failing them individually.
+        nsjails = []
+        for i, item in enumerate(items):
+            try:
+                nsjails.append(self.eval_resource.parse(item)[0])
+            except falcon.HTTPBadRequest as e:
+                raise falcon.HTTPBadRequest(title=e.title, description=f"Item {i}: {e.description}")
+
+        try:
+            shared = [FileAttachment.from_dict(file) for file in body.get("files", [])]
+        except ParsingError as e:
+            raise falcon.HTTPBadRequest(title="Request file is invalid", description=str(e))
+
+        with ExitStack() as stack:
+            shared_args: tuple[str, ...] = ()
+            if shared:
+                try:
+                    # Every NsJail mounts the files the same way.
+                    shared_args = stack.enter_context(nsjails[0].shared_files(shared))
+                except OSError as e:
+                    log.info("Failed to write the shared files.", exc_info=e)
+                    raise falcon.HTTPBadRequest(
+                        title="Request file is invalid",
+                        description=f"{e.__class__.__name__}: Failed to create the shared files.",
+                    )
+
+            def run(item: dict, nsjail: NsJail) -> EvalResult | None:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return None
+                nsjail_args = (*shared_args, *nsjail.time_limit_args(remaining))
+                return self.eval_resource.run(item, nsjail_args)
+
+            executor = self._executor()
+            futures: list[Future[EvalResult | None]] = [
+                executor.submit(run, item, nsjail) for item, nsjail in zip(items, nsjails)
+            ]
+
+            # Allow for NsJail to be terminated and reaped after its lowered time limit.
+            timeout = max(deadline - time.monotonic(), 0) + WALL_TIME_GRACE
+            wait(futures, timeout=timeout)
+            for future in futures:
+                future.cancel()
+
+            results = [self._result(item, future) for item, future in zip(items, futures)]
+            # Running items must finish before the shared files are removed.
+            wait(futures)
+
+        timed_out = any(result["status"] == "timeout" for result in results)
+        resp.media = {"results": results, "timed_out": timed_out}
+
+    def _result(self, item: dict, future: Future[EvalResult | None]) -> dict[str, Any]:
+        """Return the result of an item as included in the response."""
+        if not future.done() or future.cancelled():
+            return {"status": "timeout"}
+
+        try:
+            result = future.result()
+        except Exception as e:
+            if not isinstance(e, falcon.HTTPError):
+                log.exception("An exception occurred while trying to process a batch item")
+            return {"status": "failed", "error": "An exception occurred during evaluation"}
+
+        if result is None:
+            return {"status": "timeout"}
+        return {"status": "done", "result": self.eval_resource.serialize(item, result)}
@@ -0,0 +1,119 @@
+from __future__ import annotations
+
+import logging
+
+import falcon
+
+from nsbox.blobs import BlobDigestError, BlobStore, BlobTooLargeError, is_digest
+
+__all__ = ("BlobResource",)
+
+log = logging.getLogger(__name__)
+
+
+class BlobResource:
+    """
+    Storage of input files by the SHA-256 digest of their content.
+
+    Supported methods:
+
+    - PUT /blobs/{sha256}
+        Store a file, to refer to it by its digest in evaluation requests
+
+    - HEAD /blobs/{sha256}
+        Check whether a file is stored
+    """
+
+    def __init__(self, store: BlobStore):
+        self.store = store
+
+    def on_put(self, req: falcon.Request, resp: falcon.Response, sha256: str) -> None:
+        """
+        Store the request body as a file, to refer to it by its digest in evaluation requests.
+
+        The body is the raw content of the file, of any content type. Its SHA-256 digest,
+        in lowercase hex, must be the one in the path. A file item of an evaluation request may
+        then have a "blob" with the digest instead of a "content":
+
+        >>> {
+        ...     "language": "python",
+        ...     "input": "import pandas; print(pandas.read_csv('data.csv'))",
+        ...     "files": [{"path": "data.csv", "blob": "9f86d081884c7d65...b0f00a08"}]
+        ... }
+
+        The file is mounted read-only in the sandbox rather than copied into it, and isn't
+        returned as an output file. Stored files are shared by all worker processes, and the
+        least recently used ones are deleted once they exceed the size of the store, so a
+        client should send the file again if an evaluation request fails because it is gone.
+
+        Response format:
+
+        >>> {
+        ...     "sha256": "9f86d081884c7d659a2feaa0c55ad015a3bf4f1b2b0b822cd15d6c15b0f00a08",
+        ...     "size": 4
+        ... }
+
+        Status codes:
+
+        - 200
+            The file was already stored
+        - 201
+            The file was stored
+        - 400
+            The digest is invalid or doesn't match the content
+        - 413
+            The file is larger than the store
+        """
+        self._check(sha256)
+        if req.content_length is not None and req.content_length > self.store.max_bytes:
+            raise _too_large(self.store)
+
+        try:
+            created = self.store.put(sha256, req.bounded_stream)
+        except BlobDigestError as e:
+            raise falcon.HTTPBadRequest(title="Digest mismatch", description=str(e))
+        except BlobTooLargeError:
+            raise _too_large(self.store)
+        except OSError:
+            log.exception(f"Failed to store blob {sha256}")
+            raise falcon.HTTPInternalServerError
+
+        if created:
+            resp.status = falcon.HTTP_201
+            resp.location = req.path
+        resp.media = {"sha256": sha256, "size": self.store.size(sha256)}
+
+    def on_head(self, req: falcon.Request, resp: falcon.Response, sha256: str) -> None:
+        """
+        Check whether a file is stored, and mark it as recently used if it is.
+
+        The Content-Length of the response is the size of the file.
+
+        Status codes:
+
+        - 200
+            The file is stored
+        - 400
+            The digest is invalid
+        - 404
+            The file isn't stored
+        """
+        self._check(sha256)
+        if not self.store.touch(sha256) or (size := self.store.size(sha256)) is None:
+            raise falcon.HTTPNotFound(title="Blob not found")
+        resp.content_length = size
+
+    @staticmethod
+    def _check(sha256: str) -> None:
+        if not is_digest(sha256):
+            raise falcon.HTTPBadRequest(
+                title="Invalid digest",
+                description="The digest must be a SHA-256 digest in lowercase hex.",
+            )
+
+
+def _too_large(store: BlobStore) -> falcon.HTTPPayloadTooLarge:
+    return falcon.HTTPPayloadTooLarge(
+        title="Blob too large",
+        description=f"Blobs may be at most {store.max_bytes} bytes.",
+    )
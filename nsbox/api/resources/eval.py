@@ -1,35 +1,50 @@
 from __future__ import annotations
 
 import logging
-from typing import Union
+from base64 import b64decode
+from collections.abc import AsyncIterator, Iterable, Iterator, Sequence
+from typing import Any
 
 import falcon
+import falcon.asgi
 from falcon.media.validators.jsonschema import validate
 
+from nsbox import archive
+from nsbox.blobs import BlobStore
+from nsbox.cache import ResultCache, cache_key
+from nsbox.languages import LanguageBusyError, LanguageRegistry, UnknownLanguageError
+from nsbox.nsio import FileAttachment, ParsingError, safe_path
 from nsbox.nsjail import NsJail
+from nsbox.process import EvalResult
+from nsbox.utils import metrics
 
-__all__ = ("EvalResource",)
+from .. import encoding, multipart
+from ..multipart import MULTIPART, MultipartBody
 
-from nsbox.nsio import FileAttachment, ParsingError
+__all__ = ("AsyncEvalResource", "EvalResource")
 
 log = logging.getLogger(__name__)
 
+
 class EvalResource:
     """
-    Evaluation of Python and Node.js code.
+    Evaluation of code in any of the registered languages, e.g. Python and Node.js.
 
     Supported methods:
 
     - POST /eval
-        Evaluate Python or Node.js code and return the result
+        Evaluate code and return the result
     """
 
     REQ_SCHEMA = {
         "type": "object",
         "properties": {
-            "language": {"type": "string", "enum": ["python", "nodejs"]},
+            "language": {"type": "string"},
             "input": {"type": "string"},
             "args": {"type": "array", "items": {"type": "string"}},
+            "cache": {"type": "boolean"},
+            "timings": {"type": "boolean"},
+            "usage": {"type": "boolean"},
             "files": {
                 "type": "array",
                 "items": {
@@ -41,10 +56,14 @@ class EvalResource:
                             "pattern": r"^(?!/)(?!.*\\0).*$",
                         },
                         "content": {"type": "string"},
+                        "blob": {"type": "string", "pattern": "^[0-9a-f]{64}$"},
                     },
                     "required": ["path"],
+                    "not": {"required": ["content", "blob"]},
                 },
             },
+            "archive": {"type": "string"},
+            "output_archive": {"enum": list(archive.FORMATS)},
         },
         "anyOf": [
             {"required": ["language", "input"]},
@@ -52,22 +71,69 @@ class EvalResource:
         ],
     }
 
-    def __init__(self, nsjail_py: NsJail, nsjail_js: NsJail):
-        self.nsjail_py = nsjail_py
-        self.nsjail_js = nsjail_js
+    def __init__(
+        self,
+        languages: LanguageRegistry[NsJail],
+        cache: ResultCache | None = None,
+        blobs: BlobStore | None = None,
+    ):
+        self.languages = languages
+        self.cache = cache
+        self.blobs = blobs
 
     @validate(REQ_SCHEMA)
     def on_post(self, req: falcon.Request, resp: falcon.Response) -> None:
         """
-        Evaluate Python or Node.js code and return stdout, stderr, and the return code.
+        Evaluate code and return stdout, stderr, and the return code.
 
-        A list of arguments for the Python or Node.js subprocess can be specified as `args`.
+        A list of arguments for the interpreter of the language can be specified as `args`.
 
         If `input` is specified, it will be appended as the last argument to `args`,
-        and `args` will have a default argument of `"-c"` for Python and `"-e"` for Node.js.
+        and `args` will default to the default arguments of the language, e.g. `"-c"` for
+        Python and `"-e"` for Node.js.
 
         Either `input` or `args` must be specified.
 
+        The languages are those defined in the languages directory of the server. A language
+        may limit how many of its evaluations run at once; a request waits for a while for one
+        of them to finish, and fails with 429 if none does.
+
+        If the result cache is enabled, the result of an earlier evaluation with the same
+        language, arguments, and files may be returned instead. Set `cache` to false to
+        always evaluate the code.
+
+        If `timings` is true, the response includes the duration in seconds of each phase of
+        the evaluation, and the resource usage of the sandbox. If `usage` is true, it includes
+        only the latter. Such requests bypass the cache.
+
+        The resource usage is measured by the kernel for NsJail and the sandboxed processes.
+        The CPU time, peak memory and process count, OOM kills, and I/O of the sandboxed
+        processes are additionally read from their cgroup, as far as the host supports it.
+
+        A whole tree of files may be sent at once as a base64-encoded `archive`: a zip file,
+        or a tar file which may be compressed. It is extracted into the home directory before
+        the `files`, which may overwrite its files. Archives may only hold regular files and
+        directories, and can't extract to more than fits in the sandbox's file system. If
+        `output_archive` is "tar", "tar.gz", or "zip", the files of the response are packed
+        into a single file of that format, e.g. "output.zip", instead.
+
+        If the blob store is enabled, a file may have the SHA-256 digest of a file stored with
+        PUT /blobs/{sha256} as its `blob`, instead of a `content`. The stored file is mounted
+        read-only at the path of the file, and the request fails with 400 if it isn't stored.
+
+        Files may instead be sent without base64 encoding as multipart/form-data, with the
+        rest of the request body as JSON in a "request" part, and each file in a "files" part
+        whose filename is the path of the file. An archive may be sent as an "archive" part.
+        If the client prefers multipart/form-data in its Accept header, the response is sent
+        the same way: a "result" part holds the JSON response, in which files only have a path
+        and a size, followed by a "files" part with the content of each file.
+
+        The output and the files are limited in size, in total as well as individually. If
+        anything was left out to stay within the limits, the response has a "truncated" object:
+        "stdout" tells whether the output was cut off, and "files" lists the path and size of
+        each file which was skipped. Files are considered in order of path, so the same output
+        is always truncated the same way.
+
         The return codes mostly resemble those of a Unix shell. Some noteworthy cases:
 
         - None
@@ -113,55 +179,280 @@ class EvalResource:
         ...     ]
         ... }
 
+        If anything was left out of the response, it additionally includes:
+
+        >>> {
+        ...     "truncated": {
+        ...         "stdout": false,
+        ...         "files": [{"path": "large.bin", "size": 20971520}]
+        ...     }
+        ... }
+
+        With `timings`, the response additionally includes the following; with `usage`, only
+        the "usage" object:
+
+        >>> {
+        ...     "timings": {
+        ...         "memfs_mount": 0.0021,
+        ...         "files_write": 0.0001,
+        ...         "nsjail_start": 0.0012,
+        ...         "stdout": 0.1873,
+        ...         "execution": 0.1881,
+        ...         "attachments": 0.0004,
+        ...         "cleanup": 0.0035,
+        ...         "total": 0.1954,
+        ...         "encoding": 0.0002
+        ...     },
+        ...     "usage": {
+        ...         "user_time": 0.0812,
+        ...         "system_time": 0.0337,
+        ...         "max_rss": 9510912,
+        ...         "minor_faults": 2412,
+        ...         "major_faults": 0,
+        ...         "voluntary_switches": 31,
+        ...         "involuntary_switches": 4,
+        ...         "cpu_time": 0.1049,
+        ...         "memory_peak": 8822784,
+        ...         "oom_kills": 0,
+        ...         "pids_peak": 1
+        ...     }
+        ... }
+
         Status codes:
 
         - 200
             Successful evaluation; not indicative that the input code itself works
         - 400
-           Input JSON schema is invalid
+           Input JSON schema is invalid, or the language is unsupported
         - 415
-            Unsupported content type; only application/JSON is supported
+            Unsupported content type; only application/JSON and multipart/form-data are
+            supported
+        - 429
+            Too many evaluations of the language are running; retry later
         """
-        body: dict[str, Union[str, list[str], list[dict[str, str]]]] = req.media
-        language = body.get("language")
+        body = req.media
+        result = self.run(body)
+        resp.stream = self._encode(req, resp, body, result)
 
-        if language not in ["python", "nodejs"]:
-            raise falcon.HTTPBadRequest(title="Invalid language", description="Supported languages are 'python', 'nodejs'")
+    def _encode(
+        self, req: falcon.Request, resp: falcon.Response, body: dict, result: EvalResult
+    ) -> Iterator[bytes]:
+        """
+        Set the content type and length of the response, and return the chunks of its body.
 
-        if language == "python":
-            if "input" in body:
-                body.setdefault("args", ["-c"])
-                body["args"].append(body["input"])
-            try:
-                result = self.nsjail_py.run_code(
-                    run_args=body["args"],
-                    files=[FileAttachment.from_dict(file) for file in body.get("files", [])],
-                )
-            except ParsingError as e:
-                raise falcon.HTTPBadRequest(title="Request file is invalid", description=str(e))
-            except Exception:
-                log.exception("An exception occurred while trying to process the request")
-                raise falcon.HTTPInternalServerError
-        elif language == "nodejs":
-            if "input" in body:
-                body.setdefault("args", ["-e"])
-                body["args"].append(body["input"])
-            try:
-                result = self.nsjail_js.run_code(
-                    run_args=body["args"],
-                    files=[FileAttachment.from_dict(file) for file in body.get("files", [])],
-                )
-            except ParsingError as e:
-                raise falcon.HTTPBadRequest(title="Request file is invalid", description=str(e))
-            except Exception:
-                log.exception("An exception occurred while trying to process the request")
-                raise falcon.HTTPInternalServerError
+        The content of the files is only read and encoded as the chunks are iterated over.
+        """
+        media, files = self._serialize(body, result, file_content=False)
+        if req.client_prefers((MULTIPART, falcon.MEDIA_JSON)) == MULTIPART:
+            resp.content_type, resp.content_length, chunks = multipart.encode(media, files)
         else:
-            # This should never happen if the schema is correctly enforced, but it's a good practice to handle it.
-            raise falcon.HTTPBadRequest(title="Invalid language", description="Supported languages are 'python', 'nodejs'")
-
-        resp.media = {
-            "stdout": result.stdout,
-            "returncode": result.returncode,
-            "files": [f.as_dict for f in result.files],
-        }
+            resp.content_type = falcon.MEDIA_JSON
+            resp.content_length, chunks = encoding.encode_json(media, files)
+        return chunks
+
+    @classmethod
+    def serialize(cls, body: dict, result: EvalResult, file_content: bool = True) -> dict[str, Any]:
+        """
+        Convert the result of an evaluation request to the response, as requested by `body`.
+
+        If `file_content` is False, the content of the files is left out, to be sent separately.
+        """
+        return cls._serialize(body, result, file_content)[0]
+
+    @staticmethod
+    def _serialize(
+        body: dict, result: EvalResult, file_content: bool = True
+    ) -> tuple[dict[str, Any], list[FileAttachment]]:
+        """Return the response to an evaluation request, and the files it holds."""
+        # Cached results are shared, so their timings mustn't be modified.
+        timings = dict(result.timings) if body.get("timings") else None
+        with metrics.timed("encoding", timings):
+            files = result.files
+            if (output_archive := body.get("output_archive")) and files:
+                files = [archive.pack(files, output_archive)]
+
+            media = {
+                "stdout": result.stdout,
+                "returncode": result.returncode,
+                "files": [
+                    file.as_dict if file_content else {"path": file.path, "size": file.size}
+                    for file in files
+                ],
+            }
+            if (dropped := result.dropped) is not None:
+                media["truncated"] = dropped
+
+        if timings is not None:
+            media["timings"] = timings
+        if timings is not None or body.get("usage"):
+            media["usage"] = result.usage
+        return media, files
+
+    def parse(self, body: dict) -> tuple[NsJail, list[str], list[FileAttachment]]:
+        """
+        Return the NsJail, the run arguments, and the files to use for an evaluation request.
+
+        The body is expected to be valid according to `REQ_SCHEMA`.
+
+        Raises:
+            falcon.HTTPBadRequest: If the language is unsupported or a file is invalid.
+        """
+        try:
+            language = self.languages.language(body.get("language"))
+            nsjail = self.languages.get(language.name)
+        except UnknownLanguageError as e:
+            raise falcon.HTTPBadRequest(title="Invalid language", description=str(e))
+
+        args = list(body.get("args", language.default_args))
+        if "input" in body:
+            args.append(body["input"])
+
+        try:
+            files = self._archive_files(body, nsjail)
+            files += [self._file(file) for file in body.get("files", [])]
+        except ParsingError as e:
+            raise falcon.HTTPBadRequest(title="Request file is invalid", description=str(e))
+        if isinstance(body, MultipartBody):
+            files += body.attachments
+
+        return nsjail, args, files
+
+    def _file(self, data: dict[str, str]) -> FileAttachment:
+        """
+        Convert a file of a request to an attachment, which may refer to a stored blob.
+
+        Raises:
+            ParsingError: If the file is invalid, or its blob isn't stored.
+        """
+        if "blob" not in data:
+            return FileAttachment.from_dict(data)
+        path = safe_path(data["path"])
+        if self.blobs is None:
+            raise ParsingError(f"File '{path}' refers to a blob, but the blob store is disabled")
+        return self.blobs.attachment(path, data["blob"])
+
+    @staticmethod
+    def _archive_files(body: dict, nsjail: NsJail) -> list[FileAttachment]:
+        """
+        Return the files of the archive of a request, if it has one.
+
+        Raises:
+            ParsingError: If the archive is invalid or too large for the sandbox.
+        """
+        data = body.archive if isinstance(body, MultipartBody) else None
+        if data is None and "archive" in body:
+            try:
+                data = b64decode(body["archive"])
+            except (TypeError, ValueError) as e:
+                raise ParsingError("Invalid base64 encoding for the archive") from e
+        if data is None:
+            return []
+        return archive.extract(
+            data, max_files=nsjail.files_max_entries, max_size=nsjail.memfs_instance_size
+        )
+
+    def _cache_key(
+        self,
+        body: dict,
+        nsjail: NsJail,
+        args: list[str],
+        files: list[FileAttachment],
+        nsjail_args: Sequence[str] = (),
+    ) -> str | None:
+        """Return the key to cache the result of an evaluation request by, or None if it isn't."""
+        measured = body.get("timings") or body.get("usage")
+        if self.cache is None or not body.get("cache", True) or measured or nsjail_args:
+            return None
+        return cache_key(body["language"], nsjail.config_digest, args, files)
+
+    def run(self, body: dict, nsjail_args: Sequence[str] = ()) -> EvalResult:
+        """
+        Evaluate the code of an evaluation request and return the result.
+
+        Results are only cached for requests without `nsjail_args`.
+
+        Raises:
+            falcon.HTTPBadRequest: If the request is invalid.
+            falcon.HTTPTooManyRequests: If no evaluation slot of the language became free.
+            falcon.HTTPInternalServerError: If an unexpected error occurs during evaluation.
+        """
+        nsjail, args, files = self.parse(body)
+
+        key = self._cache_key(body, nsjail, args, files, nsjail_args)
+        if key is not None and (result := self.cache.get(key)) is not None:
+            log.info("Returning a cached result.")
+            return result
+
+        try:
+            with self.languages.slot(body["language"]):
+                if nsjail_args:
+                    result = nsjail.run_code(run_args=args, files=files, nsjail_args=nsjail_args)
+                else:
+                    result = nsjail.run_code(run_args=args, files=files)
+        except LanguageBusyError as e:
+            raise _busy(e)
+        except Exception:
+            log.exception("An exception occurred while trying to process the request")
+            raise falcon.HTTPInternalServerError
+
+        if key is not None:
+            self.cache.put(key, result)
+        return result
+
+
+class AsyncEvalResource(EvalResource):
+    """
+    Evaluation of code in any of the registered languages, for the ASGI app.
+
+    The same as `EvalResource`, except that requests must be JSON and that the runners must be
+    `AsyncNsJail` objects. See `EvalResource.on_post`.
+
+    Supported methods:
+
+    - POST /eval
+        Evaluate code and return the result
+    """
+
+    @validate(EvalResource.REQ_SCHEMA)
+    async def on_post(self, req: falcon.asgi.Request, resp: falcon.asgi.Response) -> None:
+        """Evaluate code and return the result; see `EvalResource.on_post`."""
+        body = await req.get_media()
+        result = await self.run(body)
+        resp.stream = _aiter(self._encode(req, resp, body, result))
+
+    async def run(  # type: ignore[override]
+        self, body: dict, nsjail_args: Sequence[str] = ()
+    ) -> EvalResult:
+        """Evaluate the code of an evaluation request and return the result; see `EvalResource`."""
+        nsjail, args, files = self.parse(body)
+
+        key = self._cache_key(body, nsjail, args, files, nsjail_args)
+        if key is not None and (result := self.cache.get(key)) is not None:
+            log.info("Returning a cached result.")
+            return result
+
+        try:
+            async with self.languages.async_slot(body["language"]):
+                result = await nsjail.run_code(run_args=args, files=files, nsjail_args=nsjail_args)
+        except LanguageBusyError as e:
+            raise _busy(e)
+        except Exception:
+            log.exception("An exception occurred while trying to process the request")
+            raise falcon.HTTPInternalServerError
+
+        if key is not None:
+            self.cache.put(key, result)
+        return result
+
+
+def _busy(error: LanguageBusyError) -> falcon.HTTPTooManyRequests:
+    """Return the error response for an evaluation which didn't get a slot of its language."""
+    return falcon.HTTPTooManyRequests(
+        title="Too many evaluations", description=str(error), retry_after=1
+    )
+
+
+async def _aiter(chunks: Iterable[bytes]) -> AsyncIterator[bytes]:
+    """Iterate over `chunks` asynchronously, as ASGI responses are streamed."""
+    for chunk in chunks:
+        yield chunk
@@ -0,0 +1,117 @@
+from __future__ import annotations
+
+import logging
+
+import falcon
+from falcon.media.validators.jsonschema import validate
+
+from nsbox.jobs import JobQueue, JobStatus, QueueFullError
+
+from .eval import EvalResource
+
+__all__ = ("JobResource", "JobsResource")
+
+log = logging.getLogger(__name__)
+
+
+class JobsResource:
+    """
+    Asynchronous evaluation of code.
+
+    Supported methods:
+
+    - POST /eval/jobs
+        Queue code for evaluation and return the ID of the job
+    """
+
+    def __init__(self, eval_resource: EvalResource, queue: JobQueue):
+        self.eval_resource = eval_resource
+        self.queue = queue
+
+    @validate(EvalResource.REQ_SCHEMA)
+    def on_post(self, req: falcon.Request, resp: falcon.Response) -> None:
+        """
+        Queue code for evaluation and return the ID of the job.
+
+        The request body is the same as for POST /eval. The result can be retrieved
+        with GET /eval/jobs/{id} once the job's status is "done".
+
+        Response format:
+
+        >>> {
+        ...     "id": "4b8f2c1e9d6a4f0e8c3b7a5d2e1f0a9b",
+        ...     "status": "queued"
+        ... }
+
+        Status codes:
+
+        - 202
+            The job was accepted
+        - 400
+           Input JSON schema is invalid
+        - 415
+            Unsupported content type; only application/JSON is supported
+        - 429
+            The job queue is full; retry later
+        """
+        body = req.media
+        # Reject invalid requests right away rather than failing the job.
+        self.eval_resource.parse(body)
+
+        try:
+            job = self.queue.submit(body["language"], lambda: self.eval_resource.run(body))
+        except QueueFullError as e:
+            raise falcon.HTTPTooManyRequests(
+                title="Job queue is full", description=str(e), retry_after=1
+            )
+
+        resp.status = falcon.HTTP_202
+        resp.location = f"{req.path}/{job.id}"
+        # A worker may already have picked the job up; it was queued as far as this response goes.
+        resp.media = {"id": job.id, "status": JobStatus.QUEUED.value}
+
+
+class JobResource:
+    """
+    Status and result of an asynchronous evaluation.
+
+    Supported methods:
+
+    - GET /eval/jobs/{id}
+        Return the status of a job, and its result once it's done
+    """
+
+    def __init__(self, queue: JobQueue):
+        self.queue = queue
+
+    def on_get(self, req: falcon.Request, resp: falcon.Response, job_id: str) -> None:
+        """
+        Return the status of a job, and its result once it's done.
+
+        The status is one of "queued", "running", "done", or "failed". Finished jobs are
+        only kept for a limited time.
+
+        Response format:
+
+        >>> {
+        ...     "id": "4b8f2c1e9d6a4f0e8c3b7a5d2e1f0a9b",
+        ...     "status": "done",
+        ...     "result": {
+        ...         "stdout": "Hello\\n",
+        ...         "returncode": 0,
+        ...         "files": []
+        ...     }
+        ... }
+
+        Status codes:
+
+        - 200
+            The job exists
+        - 404
+            The job doesn't exist or has expired
+        """
+        job = self.queue.get(job_id)
+        if job is None:
+            raise falcon.HTTPNotFound(title="Job not found")
+
+        resp.media = job
@@ -0,0 +1,56 @@
+from __future__ import annotations
+
+import falcon
+import falcon.asgi
+
+from nsbox.utils import metrics
+
+__all__ = ("AsyncMetricsResource", "MetricsResource")
+
+
+class MetricsResource:
+    """
+    Prometheus metrics of all worker processes.
+
+    Supported methods:
+
+    - GET /metrics
+        Return the metrics in the Prometheus text format
+    """
+
+    def on_get(self, req: falcon.Request, resp: falcon.Response) -> None:
+        """
+        Return the metrics in the Prometheus text format.
+
+        Status codes:
+
+        - 200
+            Successfully collected the metrics
+        - 404
+            Metrics are unavailable because prometheus_client isn't installed
+        """
+        if not metrics.ENABLED:
+            raise falcon.HTTPNotFound(
+                title="Metrics are unavailable",
+                description="Install nsbox with the metrics extra to enable metrics.",
+            )
+
+        resp.content_type = metrics.CONTENT_TYPE
+        resp.data = metrics.generate()
+
+
+class AsyncMetricsResource(MetricsResource):
+    """
+    Prometheus metrics of all worker processes, for the ASGI app.
+
+    Supported methods:
+
+    - GET /metrics
+        Return the metrics in the Prometheus text format
+    """
+
+    async def on_get(  # type: ignore[override]
+        self, req: falcon.asgi.Request, resp: falcon.asgi.Response
+    ) -> None:
+        """Return the metrics in the Prometheus text format; see `MetricsResource.on_get`."""
+        super().on_get(req, resp)
@@ -0,0 +1,193 @@
+from __future__ import annotations
+
+import json
+import logging
+from collections.abc import AsyncGenerator, Generator
+from contextlib import AbstractAsyncContextManager, AbstractContextManager
+from typing import Any
+
+import falcon
+import falcon.asgi
+from falcon.media.validators.jsonschema import validate
+
+from nsbox.languages import LanguageBusyError
+from nsbox.process import EvalResult
+
+from .eval import EvalResource
+
+__all__ = ("AsyncStreamResource", "StreamResource")
+
+log = logging.getLogger(__name__)
+
+NDJSON = "application/x-ndjson"
+SSE = "text/event-stream"
+
+
+def _frame(event: str, data: dict[str, Any], sse: bool) -> bytes:
+    """Encode a frame as a JSON line, or as a server-sent event if `sse` is True."""
+    encoded = json.dumps(data)
+    if sse:
+        return f"event: {event}\ndata: {encoded}\n\n".encode()
+    return f"{encoded}\n".encode()
+
+
+def _result_frames(result: EvalResult, sse: bool) -> Generator[bytes, None, None]:
+    """Encode the frames which follow the output of an evaluation once it has finished."""
+    if result.stdout is not None:
+        yield _frame("stdout", {"stdout": result.stdout}, sse)
+    media = {"returncode": result.returncode, "files": [f.as_dict for f in result.files]}
+    if (dropped := result.dropped) is not None:
+        media["truncated"] = dropped
+    yield _frame("result", media, sse)
+
+
+def _busy_frame(error: LanguageBusyError, sse: bool) -> bytes:
+    """Encode the frame which reports that no evaluation slot of the language became free."""
+    return _frame("error", {"error": str(error)}, sse)
+
+
+def _error_frame(sse: bool) -> bytes:
+    """Encode the frame which reports that an evaluation failed unexpectedly."""
+    log.exception("An exception occurred while trying to process the request")
+    return _frame("error", {"error": "An exception occurred during evaluation"}, sse)
+
+
+class StreamResource:
+    """
+    Evaluation of code with its output streamed as it is produced.
+
+    Supported methods:
+
+    - POST /eval/stream
+        Evaluate code and stream the output, followed by the return code and files
+    """
+
+    def __init__(self, eval_resource: EvalResource):
+        self.eval_resource = eval_resource
+
+    @validate(EvalResource.REQ_SCHEMA)
+    def on_post(self, req: falcon.Request, resp: falcon.Response) -> None:
+        """
+        Evaluate code and stream the output, followed by the return code and files.
+
+        The request body is the same as for POST /eval.
+
+        The response is a sequence of JSON objects, either one per line
+        (application/x-ndjson, the default) or as server-sent events (text/event-stream)
+        if the client prefers it. Output is sent in "stdout" frames as soon as it is read.
+        The final frame is a "result" frame with the return code and the files, and what was
+        left out of them as for POST /eval, or an "error" frame if the evaluation failed
+        unexpectedly, or couldn't start because too many evaluations of the language were
+        running.
+
+        Response format:
+
+        >>> {"stdout": "Hello "}
+        >>> {"stdout": "world\\n"}
+        >>> {"returncode": 0, "files": []}
+
+        >>> event: stdout
+        ... data: {"stdout": "Hello world\\n"}
+        ...
+        ... event: result
+        ... data: {"returncode": 0, "files": []}
+
+        Status codes:
+
+        - 200
+            Evaluation started; not indicative that the input code itself works
+        - 400
+           Input JSON schema is invalid
+        - 415
+            Unsupported content type; only application/JSON is supported
+        """
+        body = req.media
+        nsjail, args, files = self.eval_resource.parse(body)
+        sse = req.client_prefers([SSE, NDJSON]) == SSE
+
+        resp.content_type = SSE if sse else NDJSON
+        resp.cache_control = ["no-cache"]
+        resp.stream = self._stream(
+            nsjail.stream_code(run_args=args, files=files),
+            sse,
+            self.eval_resource.languages.slot(body["language"]),
+        )
+
+    @staticmethod
+    def _stream(
+        stream: Generator[str, None, EvalResult],
+        sse: bool,
+        slot: AbstractContextManager,
+    ) -> Generator[bytes, None, None]:
+        """Encode the output and the result of an evaluation, run within `slot`, as frames."""
+        try:
+            with slot:
+                while True:
+                    try:
+                        chars = next(stream)
+                    except StopIteration as e:
+                        result: EvalResult = e.value
+                        break
+                    yield _frame("stdout", {"stdout": chars}, sse)
+        except LanguageBusyError as e:
+            yield _busy_frame(e, sse)
+            return
+        except Exception:
+            yield _error_frame(sse)
+            return
+        finally:
+            stream.close()
+
+        yield from _result_frames(result, sse)
+
+
+class AsyncStreamResource(StreamResource):
+    """
+    Evaluation of code with its output streamed as it is produced, for the ASGI app.
+
+    Supported methods:
+
+    - POST /eval/stream
+        Evaluate code and stream the output, followed by the return code and files
+    """
+
+    @validate(EvalResource.REQ_SCHEMA)
+    async def on_post(self, req: falcon.asgi.Request, resp: falcon.asgi.Response) -> None:
+        """Evaluate code and stream the output; see `StreamResource.on_post`."""
+        body = await req.get_media()
+        nsjail, args, files = self.eval_resource.parse(body)
+        sse = req.client_prefers([SSE, NDJSON]) == SSE
+
+        resp.content_type = SSE if sse else NDJSON
+        resp.cache_control = ["no-cache"]
+        resp.stream = self._stream_async(
+            nsjail.stream_code(run_args=args, files=files),
+            sse,
+            self.eval_resource.languages.async_slot(body["language"]),
+        )
+
+    @staticmethod
+    async def _stream_async(
+        stream: AsyncGenerator[str | EvalResult, None],
+        sse: bool,
+        slot: AbstractAsyncContextManager,
+    ) -> AsyncGenerator[bytes, None]:
+        """Encode the output and the result of an evaluation, run within `slot`, as frames."""
+        try:
+            async with slot:
+                async for item in stream:
+                    if isinstance(item, EvalResult):
+                        result = item
+                        break
+                    yield _frame("stdout", {"stdout": item}, sse)
+        except LanguageBusyError as e:
+            yield _busy_frame(e, sse)
+            return
+        except Exception:
+            yield _error_frame(sse)
+            return
+        finally:
+            await stream.aclose()
+
+        for frame in _result_frames(result, sse):
+            yield frame
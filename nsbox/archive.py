@@ -0,0 +1,150 @@
+"""Tar and zip archives of files sent to or returned from the sandbox."""
+from __future__ import annotations
+
+import io
+import tarfile
+import zipfile
+from collections.abc import Iterable
+
+from nsbox.nsio import FileAttachment, ParsingError, safe_path
+
+__all__ = ("ArchiveError", "FORMATS", "extract", "pack")
+
+# Output formats, by the extension of the archive returned.
+FORMATS = ("tar", "tar.gz", "zip")
+
+# Fixed modification time of packed files, so that the same output gives the same archive.
+_ZIP_DATE_TIME = (1980, 1, 1, 0, 0, 0)
+
+
+class ArchiveError(ParsingError):
+    """Raised when an archive is invalid or exceeds the limits of its extraction."""
+
+
+class _Budget:
+    """The number of files and bytes an archive may still extract to."""
+
+    def __init__(self, max_files: int | None, max_size: int | None) -> None:
+        self.files = max_files
+        self.size = max_size
+
+    def take(self, name: str, size: int) -> int | None:
+        """
+        Account for a file of the given size, and return how many bytes may be read from it.
+
+        Raises:
+            ArchiveError: If the file exceeds the limits.
+        """
+        if self.files is not None:
+            self.files -= 1
+            if self.files < 0:
+                raise ArchiveError("Archive has too many files")
+        if self.size is not None:
+            self.size -= size
+            if self.size < 0:
+                raise ArchiveError(f"Archive is too large to extract, at file '{name}'")
+            # The declared size may be a lie; never read past what is left of the budget.
+            return size + self.size + 1
+        return None
+
+
+def _check(data: bytes, name: str, declared: int) -> bytes:
+    """Return `data` read from a member declared as `declared` bytes, if it is consistent."""
+    if len(data) != declared:
+        raise ArchiveError(f"Archive member '{name}' doesn't match its declared size")
+    return data
+
+
+def _extract_zip(archive: zipfile.ZipFile, budget: _Budget) -> list[FileAttachment]:
+    files = []
+    for info in archive.infolist():
+        if info.is_dir():
+            continue
+        path = safe_path(info.filename)
+        limit = budget.take(path, info.file_size)
+        with archive.open(info) as f:
+            data = f.read(-1 if limit is None else limit)
+        files.append(FileAttachment(path, _check(data, path, info.file_size)))
+    return files
+
+
+def _extract_tar(archive: tarfile.TarFile, budget: _Budget) -> list[FileAttachment]:
+    files = []
+    for member in archive:
+        if member.isdir():
+            continue
+        if not member.isfile():
+            raise ArchiveError(f"Archive member '{member.name}' is not a regular file")
+        path = safe_path(member.name)
+        budget.take(path, member.size)
+        f = archive.extractfile(member)
+        data = f.read() if f is not None else b""
+        files.append(FileAttachment(path, _check(data, path, member.size)))
+    return files
+
+
+def extract(
+    data: bytes | memoryview, max_files: int | None = None, max_size: int | None = None
+) -> list[FileAttachment]:
+    """
+    Return the files in a zip archive, or a tar archive which may be compressed.
+
+    Directories are left out, since those of the files are created as they are written, and
+    paths are checked like those of any other file. Members are read one at a time and no
+    further than the limits, so archives which expand to far more than their size are safe.
+
+    Args:
+        data: The archive.
+        max_files: Maximum number of files in the archive, None for any.
+        max_size: Maximum total size in bytes of the extracted files, None for any.
+    Raises:
+        ArchiveError: If the archive is invalid, has members other than regular files and
+            directories, or exceeds the limits.
+        IllegalPathError: If a path in the archive is absolute or traverses beyond the root.
+    """
+    budget = _Budget(max_files, max_size)
+    stream = io.BytesIO(data)
+    try:
+        if zipfile.is_zipfile(stream):
+            with zipfile.ZipFile(stream) as archive:
+                return _extract_zip(archive, budget)
+        stream.seek(0)
+        with tarfile.open(fileobj=stream, mode="r:*") as archive:
+            return _extract_tar(archive, budget)
+    except (tarfile.TarError, zipfile.BadZipFile, EOFError, OSError, ValueError) as e:
+        if isinstance(e, ParsingError):
+            raise
+        raise ArchiveError(f"Archive is invalid: {e}") from e
+
+
+def pack(files: Iterable[FileAttachment], format: str, name: str = "output") -> FileAttachment:
+    """
+    Return an attachment of a single archive holding `files`.
+
+    Args:
+        files: The files to archive, by their path.
+        format: One of `FORMATS`.
+        name: The name of the archive, to which the format is appended as its extension.
+    """
+    buffer = io.BytesIO()
+    if format == "zip":
+        with zipfile.ZipFile(buffer, "w", compression=zipfile.ZIP_DEFLATED) as archive:
+            for file in files:
+                info = zipfile.ZipInfo(file.path, _ZIP_DATE_TIME)
+                info.compress_type = zipfile.ZIP_DEFLATED
+                info.external_attr = 0o644 << 16
+                with archive.open(info, "w") as f:
+                    for chunk in file.iter_content():
+                        f.write(chunk)
+    elif format in ("tar", "tar.gz"):
+        mode = "w:gz" if format == "tar.gz" else "w"
+        kwargs = {"compresslevel": 6} if format == "tar.gz" else {}
+        with tarfile.open(fileobj=buffer, mode=mode, **kwargs) as archive:
+            for file in files:
+                info = tarfile.TarInfo(file.path)
+                info.size = file.size
+                info.mode = 0o644
+                archive.addfile(info, io.BytesIO(file.content))
+    else:
+        raise ValueError(f"Unsupported archive format {format!r}")
+    return FileAttachment(f"{name}.{format}", buffer.getbuffer())
@@ -0,0 +1,247 @@
+"""Content-addressed storage of input files, so that large files are only sent once."""
+from __future__ import annotations
+
+import hashlib
+import logging
+import os
+import tempfile
+import threading
+from collections.abc import Generator
+from contextlib import contextmanager, suppress
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import IO
+from uuid import uuid4
+
+from nsbox.nsio import FileAttachment, ParsingError
+
+__all__ = (
+    "BlobAttachment",
+    "BlobDigestError",
+    "BlobNotFoundError",
+    "BlobStore",
+    "BlobTooLargeError",
+    "is_digest",
+)
+
+log = logging.getLogger(__name__)
+
+# Size of the chunks in which uploaded blobs are read, hashed, and written.
+CHUNK_SIZE = 64 * 1024
+
+
+def is_digest(digest: str) -> bool:
+    """Return True if `digest` is formatted like a hex SHA-256 digest, i.e. the name of a blob."""
+    return len(digest) == 64 and all(c in "0123456789abcdef" for c in digest)
+
+
+class BlobDigestError(Exception):
+    """Raised when the content of a blob doesn't match the digest it was stored under."""
+
+
+class BlobTooLargeError(Exception):
+    """Raised when a blob is larger than the whole store."""
+
+
+class BlobNotFoundError(ParsingError):
+    """Raised when a request refers to a blob which isn't stored."""
+
+
+@dataclass(frozen=True, repr=False)
+class BlobAttachment(FileAttachment):
+    """
+    An input file whose content is a blob of a `BlobStore`, rather than sent with the request.
+
+    The file itself is empty; it is the mount point of the blob, which is mounted read-only
+    over it when the sandbox is started. Its digest is that of the blob.
+    """
+
+    digest: str = ""
+    store: BlobStore | None = field(default=None, compare=False)
+
+    def __repr__(self) -> str:
+        path = f"{self.path[:30]}..." if len(self.path) > 30 else self.path
+        return f"{self.__class__.__name__}(path={path!r}, digest={self.digest[:12]!r}...)"
+
+    @property
+    def sha256(self) -> str:
+        """Hex SHA-256 digest of the blob."""
+        return self.digest
+
+
+class BlobStore:
+    """
+    A directory of files named by the SHA-256 digest of their content, bounded in total size.
+
+    Blobs are uploaded once and then referred to by any number of evaluations. Once the blobs
+    take up more than `max_bytes`, the least recently used ones are deleted. Since the state
+    is kept entirely in the directory, worker processes sharing it share the blobs.
+
+    A blob in use by a run is checked out as a hard link in the `.runs` directory, which pins
+    it: blobs with more than one link are never evicted. The link lives on the same file system
+    as the blob, so that neither has to be copied into the memory file system of the run.
+    """
+
+    def __init__(self, path: str | Path, max_bytes: int) -> None:
+        """
+        Initialize the store, creating its directory if needed.
+
+        Args:
+            path: Directory of the blobs, e.g. on a disk or a tmpfs.
+            max_bytes: Maximum total size in bytes of the blobs, which also bounds each blob.
+        """
+        self.path = Path(path)
+        self.max_bytes = max_bytes
+        self._tmp = self.path / ".tmp"
+        self._runs = self.path / ".runs"
+        self._lock = threading.Lock()
+
+        for directory in (self.path, self._tmp, self._runs):
+            directory.mkdir(parents=True, exist_ok=True)
+
+    def __repr__(self) -> str:
+        return f"<{self.__class__.__name__} path={str(self.path)!r} max_bytes={self.max_bytes}>"
+
+    def __contains__(self, digest: str) -> bool:
+        return self.size(digest) is not None
+
+    def _blob(self, digest: str) -> Path:
+        if not is_digest(digest):
+            raise ValueError(f"Invalid blob digest {digest!r}")
+        return self.path / digest
+
+    def size(self, digest: str) -> int | None:
+        """Return the size in bytes of a blob, or None if it isn't stored."""
+        try:
+            return self._blob(digest).stat().st_size
+        except (OSError, ValueError):
+            return None
+
+    def put(self, digest: str, stream: IO[bytes], chunk_size: int = CHUNK_SIZE) -> bool:
+        """
+        Store the content read from `stream` as the blob `digest`, unless it is already stored.
+
+        The content is hashed as it is written to a temporary file, which is only moved into
+        place once its digest is verified. Blobs are then evicted to make room for it.
+
+        Returns:
+            True if the blob was stored, False if it already was.
+        Raises:
+            BlobDigestError: If the SHA-256 digest of the content isn't `digest`.
+            BlobTooLargeError: If the content is larger than `max_bytes`.
+            OSError: If the blob couldn't be written.
+        """
+        path = self._blob(digest)
+        if self.touch(digest):
+            return False
+
+        sha256 = hashlib.sha256()
+        size = 0
+        fd, tmp = tempfile.mkstemp(dir=self._tmp)
+        try:
+            with open(fd, "wb") as f:
+                while chunk := stream.read(chunk_size):
+                    size += len(chunk)
+                    if size > self.max_bytes:
+                        raise BlobTooLargeError(
+                            f"Blob exceeds the size of the store ({self.max_bytes} bytes)"
+                        )
+                    sha256.update(chunk)
+                    f.write(chunk)
+            if sha256.hexdigest() != digest:
+                raise BlobDigestError(f"Content doesn't match the digest {digest}")
+            os.chmod(tmp, 0o444)
+            os.replace(tmp, path)
+        except BaseException:
+            with suppress(OSError):
+                os.unlink(tmp)
+            raise
+
+        log.info(f"Stored blob {digest} of {size} bytes.")
+        self.evict(keep=digest)
+        return True
+
+    def touch(self, digest: str) -> bool:
+        """Mark a blob as recently used. Return False if it isn't stored."""
+        try:
+            os.utime(self._blob(digest))
+        except (OSError, ValueError):
+            return False
+        return True
+
+    def attachment(self, path: str, digest: str) -> BlobAttachment:
+        """
+        Return an attachment which provides the blob `digest` at `path` in the sandbox.
+
+        Raises:
+            BlobNotFoundError: If the blob isn't stored.
+        """
+        if not self.touch(digest):
+            raise BlobNotFoundError(f"Blob {digest} for file '{path}' is not stored")
+        return BlobAttachment(path, b"", digest, self)
+
+    @contextmanager
+    def checkout(self, digest: str) -> Generator[Path, None, None]:
+        """
+        Pin a blob against eviction while in use, and provide the path of a link to it.
+
+        Raises:
+            FileNotFoundError: If the blob isn't stored, e.g. because it was evicted.
+        """
+        link = self._runs / f"{os.getpid()}-{uuid4().hex}"
+        os.link(self._blob(digest), link)
+        try:
+            yield link
+        finally:
+            with suppress(OSError):
+                link.unlink()
+
+    def _prune_links(self) -> None:
+        """Remove the links of checkouts by processes which have exited without removing them."""
+        with os.scandir(self._runs) as entries:
+            for entry in entries:
+                pid, _, _ = entry.name.partition("-")
+                try:
+                    os.kill(int(pid), 0)
+                except ProcessLookupError:
+                    with suppress(OSError):
+                        os.unlink(entry.path)
+                except (ValueError, OSError):
+                    pass
+
+    def evict(self, keep: str | None = None) -> int:
+        """
+        Delete the least recently used blobs until they take up no more than `max_bytes`.
+
+        Blobs which are checked out, and the blob `keep`, are never deleted.
+
+        Returns:
+            The number of bytes freed.
+        """
+        with self._lock:
+            self._prune_links()
+
+            blobs = []
+            total = 0
+            with os.scandir(self.path) as entries:
+                for entry in entries:
+                    if not is_digest(entry.name):
+                        continue
+                    try:
+                        stat = entry.stat(follow_symlinks=False)
+                    except OSError:
+                        continue
+                    total += stat.st_size
+                    if entry.name != keep and stat.st_nlink == 1:
+                        blobs.append((stat.st_mtime_ns, stat.st_size, entry.path))
+
+            freed = 0
+            blobs.sort()
+            for _, size, path in blobs:
+                if total - freed <= self.max_bytes:
+                    break
+                with suppress(FileNotFoundError):
+                    os.unlink(path)
+                    freed += size
+                    log.info(f"Evicted blob {os.path.basename(path)} of {size} bytes.")
+        return freed
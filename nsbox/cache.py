@@ -0,0 +1,143 @@
+"""In-memory cache of evaluation results."""
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+import threading
+import time
+from collections import OrderedDict
+from collections.abc import Iterable
+
+from nsbox.nsio import FileAttachment
+from nsbox.process import EvalResult
+
+__all__ = ("ResultCache", "cache_key")
+
+log = logging.getLogger(__name__)
+
+# Return codes of evaluations which were cut short rather than having run to completion.
+UNCACHEABLE_RETURNCODES = frozenset((None, 128 + 9, 128 + 15, 255))
+
+
+def cache_key(
+    language: str, config_digest: str, args: Iterable[str], files: Iterable[FileAttachment]
+) -> str:
+    """Return the cache key of an evaluation."""
+    data = [
+        language,
+        config_digest,
+        list(args),
+        [[file.path, file.sha256] for file in files],
+    ]
+    return hashlib.sha256(json.dumps(data).encode("utf-8")).hexdigest()
+
+
+def _result_size(result: EvalResult) -> int:
+    """Return the approximate number of bytes held by a result."""
+    size = len(result.stdout.encode("utf-8")) if isinstance(result.stdout, str) else 0
+    return size + sum(len(file.path) + file.size for file in result.files)
+
+
+class ResultCache:
+    """
+    A thread-safe LRU cache of evaluation results.
+
+    Entries expire after `ttl` seconds. The least recently used entries are evicted once
+    there are more than `max_entries`, or once the results take up more than `max_bytes`.
+    """
+
+    def __init__(self, max_entries: int = 1024, max_bytes: int = 64 * 1024**2, ttl: float = 300):
+        """
+        Initialize the cache.
+
+        Args:
+            max_entries: Maximum number of results to keep.
+            max_bytes: Maximum total size in bytes of the output and files of the results.
+            ttl: Time in seconds for which a result is kept.
+        """
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        self._entries: OrderedDict[str, tuple[EvalResult, int, float]] = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def __repr__(self) -> str:
+        return f"<{self.__class__.__name__} entries={len(self._entries)} size={self._size}>"
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _pop(self, key: str) -> None:
+        """Remove an entry. The lock must be held."""
+        _, size, _ = self._entries.pop(key)
+        self._size -= size
+
+    def get(self, key: str) -> EvalResult | None:
+        """Return the cached result for `key`, or None if there is none or it has expired."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[2] <= time.monotonic():
+                self._pop(key)
+                entry = None
+
+            if entry is None:
+                self.misses += 1
+                return None
+
+            self.hits += 1
+            self._entries.move_to_end(key)
+            return entry[0]
+
+    def put(self, key: str, result: EvalResult) -> bool:
+        """
+        Cache `result` under `key`, and return whether it was cached.
+
+        Results of evaluations which didn't run to completion, i.e. which failed to start,
+        were killed, or were terminated, aren't cached. Neither are results larger than
+        `max_bytes` on their own.
+        """
+        if result.returncode in UNCACHEABLE_RETURNCODES:
+            return False
+
+        size = _result_size(result)
+        if size > self.max_bytes or self.max_entries <= 0:
+            return False
+
+        with self._lock:
+            if key in self._entries:
+                self._pop(key)
+
+            self._entries[key] = (result, size, time.monotonic() + self.ttl)
+            self._size += size
+
+            while len(self._entries) > self.max_entries or self._size > self.max_bytes:
+                self._pop(next(iter(self._entries)))
+                self.evictions += 1
+
+        return True
+
+    def clear(self) -> None:
+        """Remove all cached results."""
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
+
+    def stats(self) -> dict[str, int]:
+        """Return the cache's counters and current occupancy."""
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self._size,
+                "max_entries": self.max_entries,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
@@ -0,0 +1,261 @@
+"""Background execution of evaluation jobs."""
+from __future__ import annotations
+
+import json
+import logging
+import os
+import threading
+import time
+from collections import deque
+from collections.abc import Callable, Mapping
+from dataclasses import dataclass, field
+from enum import Enum
+from pathlib import Path
+from typing import Any
+from uuid import uuid4
+
+from nsbox.process import EvalResult
+from nsbox.utils import metrics
+
+__all__ = ("Job", "JobQueue", "JobStatus", "QueueFullError")
+
+log = logging.getLogger(__name__)
+
+
+def _is_job_id(job_id: str) -> bool:
+    """Return True if `job_id` is formatted like the IDs generated for jobs."""
+    return len(job_id) == 32 and all(c in "0123456789abcdef" for c in job_id)
+
+
+class QueueFullError(Exception):
+    """Raised when a job cannot be admitted because the queue is full."""
+
+
+class JobStatus(str, Enum):
+    """Lifecycle states of a job."""
+
+    QUEUED = "queued"
+    RUNNING = "running"
+    DONE = "done"
+    FAILED = "failed"
+
+
+@dataclass
+class Job:
+    """An evaluation submitted to a JobQueue."""
+
+    language: str
+    func: Callable[[], EvalResult] = field(repr=False)
+    id: str = field(default_factory=lambda: uuid4().hex)
+    status: JobStatus = JobStatus.QUEUED
+    result: EvalResult | None = field(default=None, repr=False)
+    created: float = field(default_factory=time.time)
+    finished: float | None = None
+
+    @property
+    def as_dict(self) -> dict[str, Any]:
+        """Convert the job to a dict."""
+        data: dict[str, Any] = {"id": self.id, "status": self.status.value}
+        if self.status is JobStatus.DONE:
+            data["result"] = self.result.as_dict
+        elif self.status is JobStatus.FAILED:
+            data["error"] = "An exception occurred while trying to process the job"
+        return data
+
+
+class JobQueue:
+    """
+    A bounded in-process queue of evaluation jobs run by a pool of worker threads.
+
+    Jobs are dispatched in submission order, except that a job is skipped over while its
+    language is at its concurrency limit. If `state_dir` is given, the state of each job is
+    mirrored to a JSON file there so that every worker process sharing the directory can
+    report on it.
+    """
+
+    def __init__(
+        self,
+        workers: int = 2,
+        max_queued: int = 16,
+        language_limits: Mapping[str, int] | None = None,
+        result_ttl: float = 300,
+        state_dir: str | Path | None = None,
+    ) -> None:
+        """
+        Initialize the job queue.
+
+        Args:
+            workers: Number of worker threads, i.e. the maximum number of concurrent jobs.
+            max_queued: Maximum number of jobs waiting to run; further submissions are rejected.
+            language_limits: Maximum number of concurrently running jobs per language.
+                Languages not present are only limited by `workers`.
+            result_ttl: Time in seconds for which finished jobs are kept.
+            state_dir: Directory to mirror job states to, for sharing between processes.
+        """
+        self.workers = workers
+        self.max_queued = max_queued
+        self.language_limits = dict(language_limits or {})
+        self.result_ttl = result_ttl
+        self.state_dir = Path(state_dir) if state_dir else None
+
+        self._jobs: dict[str, Job] = {}
+        self._queued: deque[Job] = deque()
+        self._running: dict[str, int] = {}
+        self._lock = threading.Lock()
+        self._wakeup = threading.Condition(self._lock)
+        self._threads: list[threading.Thread] = []
+        self._pid: int | None = None
+        self._closed = False
+
+    def __repr__(self) -> str:
+        return f"<{self.__class__.__name__} workers={self.workers} queued={len(self._queued)}>"
+
+    def _start(self) -> None:
+        """Start the worker threads if they aren't running in the current process."""
+        pid = os.getpid()
+        if self._pid == pid:
+            return
+
+        # Jobs and threads inherited through a fork belong to the parent process.
+        self._jobs.clear()
+        self._queued.clear()
+        self._running.clear()
+
+        self._pid = pid
+        self._threads = [
+            threading.Thread(target=self._run, name=f"JobQueue-{i}", daemon=True)
+            for i in range(self.workers)
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    def _next_job(self) -> Job | None:
+        """Wait for and pop the first queued job whose language is below its limit."""
+        with self._wakeup:
+            while not self._closed:
+                for job in self._queued:
+                    limit = self.language_limits.get(job.language)
+                    if limit is None or self._running.get(job.language, 0) < limit:
+                        self._queued.remove(job)
+                        self._running[job.language] = self._running.get(job.language, 0) + 1
+                        job.status = JobStatus.RUNNING
+                        metrics.JOBS_QUEUED.dec()
+                        metrics.JOBS_RUNNING.inc()
+                        return job
+                self._wakeup.wait()
+        return None
+
+    def _run(self) -> None:
+        """Run jobs until the queue is closed."""
+        while (job := self._next_job()) is not None:
+            self._save(job)
+            try:
+                job.result = job.func()
+                job.status = JobStatus.DONE
+            except Exception:
+                log.exception(f"An exception occurred while trying to process job {job.id}")
+                job.status = JobStatus.FAILED
+
+            job.finished = time.time()
+            self._save(job)
+
+            with self._wakeup:
+                self._running[job.language] -= 1
+                metrics.JOBS_RUNNING.dec()
+                # A job skipped because of its language limit may now be able to run.
+                self._wakeup.notify_all()
+
+    def _path(self, job_id: str) -> Path | None:
+        """Return the path of the state file of a job, if states are mirrored."""
+        if self.state_dir is None:
+            return None
+        return self.state_dir / f"{job_id}.json"
+
+    def _save(self, job: Job) -> None:
+        """Mirror the state of a job to its state file."""
+        if (path := self._path(job.id)) is None:
+            return
+
+        tmp = path.with_suffix(f".{threading.get_ident()}.tmp")
+        try:
+            self.state_dir.mkdir(parents=True, exist_ok=True)
+            tmp.write_text(json.dumps(job.as_dict), encoding="utf-8")
+            tmp.replace(path)
+        except OSError as e:
+            log.warning(f"Failed to save the state of job {job.id}.", exc_info=e)
+
+    def _prune(self) -> None:
+        """Forget finished jobs older than the result TTL. The lock must be held."""
+        expiry = time.time() - self.result_ttl
+        for job_id, job in list(self._jobs.items()):
+            if job.finished is not None and job.finished < expiry:
+                del self._jobs[job_id]
+                if (path := self._path(job_id)) is not None:
+                    path.unlink(missing_ok=True)
+
+    def submit(self, language: str, func: Callable[[], EvalResult]) -> Job:
+        """
+        Queue `func` to be run in a worker thread and return its job.
+
+        Raises:
+            QueueFullError: If `max_queued` jobs are already waiting to run.
+            RuntimeError: If the queue has been closed.
+        """
+        job = Job(language, func)
+        with self._wakeup:
+            if self._closed:
+                raise RuntimeError("Cannot submit to a closed JobQueue")
+            if len(self._queued) >= self.max_queued:
+                raise QueueFullError(f"The job queue is full ({self.max_queued} jobs waiting)")
+
+            self._start()
+            self._prune()
+            self._jobs[job.id] = job
+            self._queued.append(job)
+            metrics.JOBS_QUEUED.inc()
+            self._wakeup.notify()
+
+        self._save(job)
+        return job
+
+    def get(self, job_id: str) -> dict[str, Any] | None:
+        """Return the state of a job as a dict, or None if it doesn't exist or has expired."""
+        with self._lock:
+            self._prune()
+            job = self._jobs.get(job_id)
+
+        if job is not None:
+            return job.as_dict
+
+        # The job may belong to another process sharing the state directory.
+        if not _is_job_id(job_id) or (path := self._path(job_id)) is None:
+            return None
+        try:
+            if path.stat().st_mtime < time.time() - self.result_ttl:
+                path.unlink(missing_ok=True)
+                return None
+            return json.loads(path.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            return None
+
+    def stats(self) -> dict[str, int]:
+        """Return the number of queued and running jobs."""
+        with self._lock:
+            return {
+                "queued": len(self._queued),
+                "running": sum(self._running.values()),
+                "max_queued": self.max_queued,
+                "workers": self.workers,
+            }
+
+    def close(self) -> None:
+        """Stop accepting jobs, drop any still queued, and wait for running jobs to finish."""
+        with self._wakeup:
+            self._closed = True
+            metrics.JOBS_QUEUED.dec(len(self._queued))
+            self._queued.clear()
+            self._wakeup.notify_all()
+
+        if self._pid == os.getpid():
+            for thread in self._threads:
+                thread.join()
@@ -0,0 +1,236 @@
+"""Registry of the languages code can be evaluated in, loaded from a directory of files."""
+from __future__ import annotations
+
+import asyncio
+import logging
+import os
+import threading
+import tomllib
+from collections.abc import AsyncIterator, Callable, Iterable, Iterator
+from contextlib import asynccontextmanager, contextmanager
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Generic, TypeVar
+
+__all__ = ("Language", "LanguageBusyError", "LanguageRegistry", "UnknownLanguageError")
+
+log = logging.getLogger(__name__)
+
+_R = TypeVar("_R")
+
+
+class UnknownLanguageError(LookupError):
+    """Raised when a language isn't in the registry."""
+
+
+class LanguageBusyError(Exception):
+    """Raised when no evaluation slot of a language became free in time."""
+
+
+@dataclass(frozen=True)
+class Language:
+    """
+    A language code can be evaluated in, and the options of the runner which evaluates it.
+
+    Attributes:
+        name: Name of the language as given in requests.
+        config_path: Path to the NsJail configuration file.
+        default_args: Arguments preceding the input of requests which don't specify any.
+        max_concurrency: Maximum number of concurrent evaluations per worker, 0 for no limit.
+        wait_timeout: Maximum time in seconds to wait for an evaluation slot.
+        options: Options of the runner, overriding those shared by all languages.
+    """
+
+    name: str
+    config_path: Path
+    default_args: tuple[str, ...] = ()
+    max_concurrency: int = 0
+    wait_timeout: float = 10
+    options: dict[str, Any] = field(default_factory=dict, compare=False)
+
+    @classmethod
+    def from_file(cls, path: str | Path) -> Language:
+        """
+        Load a language from a TOML file.
+
+        The name defaults to the stem of the file name. A relative `config` path is relative
+        to the directory of the file. The `nsjail` table holds the runner options.
+
+        Raises:
+            ValueError: If the file is invalid.
+        """
+        path = Path(path)
+        try:
+            with path.open("rb") as f:
+                data = tomllib.load(f)
+        except tomllib.TOMLDecodeError as e:
+            raise ValueError(f"{path}: {e}") from e
+
+        unknown = data.keys() - {
+            "name",
+            "config",
+            "default_args",
+            "max_concurrency",
+            "wait_timeout",
+            "nsjail",
+        }
+        if unknown:
+            raise ValueError(f"{path}: unknown keys {sorted(unknown)}")
+        if "config" not in data:
+            raise ValueError(f"{path}: missing the 'config' key")
+
+        try:
+            return cls(
+                name=str(data.get("name", path.stem)),
+                config_path=Path(os.path.normpath(path.parent / data["config"])),
+                default_args=tuple(map(str, data.get("default_args", ()))),
+                max_concurrency=int(data.get("max_concurrency", 0)),
+                wait_timeout=float(data.get("wait_timeout", 10)),
+                options=dict(data.get("nsjail", {})),
+            )
+        except (TypeError, ValueError) as e:
+            raise ValueError(f"{path}: {e}") from e
+
+
+class LanguageRegistry(Generic[_R]):
+    """
+    The languages code can be evaluated in, and a runner for each.
+
+    Runners are only created the first time their language is used, so that a worker only
+    parses the configuration and sets up the cgroups of the languages it actually evaluates.
+
+    Each language may limit its number of concurrent evaluations. An evaluation takes a slot
+    of its language for as long as it runs, and waits for one to become free if there is
+    none. Threads and coroutines have slots of their own, since they are served by
+    different apps.
+    """
+
+    def __init__(self, languages: Iterable[Language], factory: Callable[[Language], _R]):
+        """
+        Initialize the registry.
+
+        Args:
+            languages: The languages to register.
+            factory: Function which creates the runner of a language.
+
+        Raises:
+            ValueError: If a language is registered more than once.
+        """
+        self.factory = factory
+        self._languages: dict[str, Language] = {}
+        for language in languages:
+            if language.name in self._languages:
+                raise ValueError(f"Language {language.name!r} is registered more than once.")
+            self._languages[language.name] = language
+
+        self._runners: dict[str, _R] = {}
+        self._lock = threading.Lock()
+        self._slots = {
+            language.name: threading.BoundedSemaphore(language.max_concurrency)
+            for language in self._languages.values()
+            if language.max_concurrency > 0
+        }
+        self._async_slots: dict[str, asyncio.Semaphore] = {}
+
+    @classmethod
+    def from_dir(cls, path: str | Path, factory: Callable[[Language], _R]) -> LanguageRegistry[_R]:
+        """
+        Load the languages from the TOML files in a directory; see `Language.from_file`.
+
+        Raises:
+            ValueError: If a file is invalid, or a language is defined more than once.
+        """
+        languages = [Language.from_file(file) for file in sorted(Path(path).glob("*.toml"))]
+        if not languages:
+            log.warning(f"No languages are defined in {path}.")
+        return cls(languages, factory)
+
+    def __contains__(self, name: object) -> bool:
+        return name in self._languages
+
+    @property
+    def names(self) -> list[str]:
+        """The names of the registered languages, sorted."""
+        return sorted(self._languages)
+
+    @property
+    def runners(self) -> dict[str, _R]:
+        """The runners created so far, by language."""
+        with self._lock:
+            return dict(self._runners)
+
+    def language(self, name: str) -> Language:
+        """
+        Return the language called `name`.
+
+        Raises:
+            UnknownLanguageError: If there is no such language.
+        """
+        try:
+            return self._languages[name]
+        except KeyError:
+            supported = ", ".join(map(repr, self.names))
+            raise UnknownLanguageError(
+                f"Unsupported language {name!r}; supported languages are {supported}."
+            ) from None
+
+    def get(self, name: str) -> _R:
+        """
+        Return the runner of the language called `name`, creating it if needed.
+
+        Raises:
+            UnknownLanguageError: If there is no such language.
+        """
+        language = self.language(name)
+        with self._lock:
+            if (runner := self._runners.get(name)) is None:
+                log.info(f"Creating the runner for {name!r}.")
+                runner = self._runners[name] = self.factory(language)
+            return runner
+
+    @contextmanager
+    def slot(self, name: str) -> Iterator[None]:
+        """
+        Take an evaluation slot of a language for the duration of the context.
+
+        Raises:
+            UnknownLanguageError: If there is no such language.
+            LanguageBusyError: If no slot became free within the wait timeout of the language.
+        """
+        language = self.language(name)
+        if (semaphore := self._slots.get(name)) is None:
+            yield
+            return
+
+        if not semaphore.acquire(timeout=language.wait_timeout):
+            raise LanguageBusyError(self._busy_message(language))
+        try:
+            yield
+        finally:
+            semaphore.release()
+
+    @asynccontextmanager
+    async def async_slot(self, name: str) -> AsyncIterator[None]:
+        """Take an evaluation slot of a language from a coroutine; see `slot`."""
+        language = self.language(name)
+        if language.max_concurrency <= 0:
+            yield
+            return
+
+        semaphore = self._async_slots.setdefault(name, asyncio.Semaphore(language.max_concurrency))
+        try:
+            async with asyncio.timeout(language.wait_timeout):
+                await semaphore.acquire()
+        except TimeoutError:
+            raise LanguageBusyError(self._busy_message(language)) from None
+        try:
+            yield
+        finally:
+            semaphore.release()
+
+    @staticmethod
+    def _busy_message(language: Language) -> str:
+        return (
+            f"All {language.max_concurrency} evaluation slots for {language.name!r} "
+            f"are still in use after {language.wait_timeout} seconds."
+        )
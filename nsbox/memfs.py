@@ -1,24 +1,58 @@
 """Memory filesystem for nsbox."""
 from __future__ import annotations
 
-import glob
+import heapq
+import itertools
 import logging
-import time
+import os
+import shutil
+import threading
 import warnings
 import weakref
-from collections.abc import Generator
-from contextlib import suppress
+from collections import deque
+from collections.abc import Generator, Iterable, Iterator
+from contextlib import contextmanager, suppress
 from pathlib import Path
 from types import TracebackType
 from typing import Type
 from uuid import uuid4
 
 from nsbox.filesystem import mount, unmount
-from nsbox.nsio import FileAttachment
+from nsbox.nsio import FileAttachment, SkippedFile
+from nsbox.utils.snapshot import Snapshot
+from nsbox.utils.timed import Deadline
+from nsbox.utils.walk import walk_files
 
 log = logging.getLogger(__name__)
 
-__all__ = ("MemFS",)
+__all__ = ("FileWriteError", "MemFS", "MemFSPool")
+
+
+class FileWriteError(Exception):
+    """Raised when a file couldn't be written to a MemFS."""
+
+    def __init__(self, path: str, error: OSError) -> None:
+        """
+        Initialize the error.
+
+        Args:
+            path: Path of the file which couldn't be written, relative to the home directory.
+            error: The error raised while writing or creating its directory.
+        """
+        super().__init__(f"{error.__class__.__name__}: Failed to create file '{path}'.")
+        self.path = path
+        self.error = error
+
+
+def _umask() -> int | None:
+    """Return the file mode creation mask of the process, or None if it can't be read."""
+    # Reading it from procfs avoids setting it, which would race with other threads.
+    with suppress(OSError, ValueError):
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("Umask:"):
+                    return int(line.split()[1], 8)
+    return None
 
 
 class MemFS:
@@ -64,6 +98,7 @@ class MemFS:
 
         self.mkdir(self.home)
         self.mkdir(self.output)
+        self._clean_usage = self._usage()
 
         self._finalizer = weakref.finalize(
             self,
@@ -86,6 +121,33 @@ class MemFS:
             unmount(self.path)
             self.path.rmdir()
 
+    def _usage(self) -> tuple[int, int]:
+        """Return the number of used blocks and inodes of the tmpfs."""
+        stat = os.statvfs(self.path)
+        return stat.f_blocks - stat.f_bfree, stat.f_files - stat.f_ffree
+
+    def wipe(self) -> bool:
+        """
+        Remove everything within the tmpfs and recreate the home and output directories.
+
+        Returns:
+            True if the tmpfs is back to its freshly mounted state, False if it is dirty
+            (e.g. space is still held by files that are open elsewhere) and should be remounted.
+        """
+        if not self.path.is_mount():
+            return False
+
+        with os.scandir(self.path) as it:
+            for entry in it:
+                if entry.is_dir(follow_symlinks=False):
+                    shutil.rmtree(entry.path)
+                else:
+                    os.unlink(entry.path)
+
+        self.mkdir(self.home)
+        self.mkdir(self.output)
+        return self._usage() == self._clean_usage
+
     @property
     def name(self) -> str:
         """Name of the temp dir."""
@@ -122,84 +184,392 @@ class MemFS:
         folder.chmod(chmod)
         return folder
 
+    def write_files(self, files: Iterable[FileAttachment], mode: int = 0o777) -> Snapshot:
+        """
+        Write `files` to the home directory in bulk, and return a snapshot of them.
+
+        The directories of all files are created first, each only once. Each file is then
+        created with `mode`, written, and stat'ed through a single file descriptor.
+
+        Args:
+            files: The files to write. Later files overwrite earlier ones with the same path.
+            mode: The permissions of the files, which are set regardless of the umask.
+        Raises:
+            FileWriteError: If a file or its directory couldn't be created.
+        """
+        files = list(files)
+        home = str(self.home)
+        paths = [os.path.normpath(os.path.join(home, file.path)) for file in files]
+
+        # The file which needs each directory, to blame if it can't be created.
+        dirs: dict[str, FileAttachment] = {}
+        for file, path in zip(files, paths):
+            parent = os.path.dirname(path)
+            while len(parent) > len(home) and parent not in dirs:
+                dirs[parent] = file
+                parent = os.path.dirname(parent)
+        # Parents sort before their children.
+        for path in sorted(dirs):
+            try:
+                os.mkdir(path)
+            except FileExistsError:
+                pass
+            except OSError as e:
+                raise FileWriteError(dirs[path].path, e) from e
+
+        umask = _umask()
+        fchmod = umask is None or mode & umask != 0
+        flags = os.O_WRONLY | os.O_CREAT | os.O_TRUNC | os.O_CLOEXEC | os.O_NOFOLLOW
+        snapshot = Snapshot()
+        for file, path in zip(files, paths):
+            try:
+                fd = os.open(path, flags, mode)
+                try:
+                    if fchmod:
+                        os.fchmod(fd, mode)
+                    content = memoryview(file.content)
+                    while content:
+                        content = content[os.write(fd, content) :]
+                    snapshot.add(path, file.content, os.fstat(fd))
+                finally:
+                    os.close(fd)
+            except OSError as e:
+                raise FileWriteError(file.path, e) from e
+        return snapshot
+
+    def _walk(
+        self,
+        pattern: str,
+        exclude_files: Snapshot | None,
+        deadline: Deadline,
+        max_depth: int | None,
+        max_entries: int | None,
+    ) -> Iterator[tuple[str, os.DirEntry[str]]]:
+        """Yield the files in the output directory which match `pattern`, except unchanged ones."""
+        for name, entry in walk_files(self.output, pattern, max_depth, max_entries, deadline):
+            if exclude_files and not exclude_files.changed(entry.path, entry.stat()):
+                log.info(f"Skipping {name!r} as it has not been modified")
+                continue
+            yield name, entry
+
     def files(
         self,
         limit: int,
         pattern: str = "**/*",
-        exclude_files: dict[Path, float] | None = None,
+        exclude_files: Snapshot | None = None,
         timeout: float | None = None,
+        deadline: Deadline | None = None,
+        max_depth: int | None = None,
+        max_entries: int | None = None,
     ) -> Generator[FileAttachment, None, None]:
         """
-        Yields FileAttachments for files found in the output directory.
+        Yields FileAttachments for files found in the output directory, in directory order.
+
+        Large files are mapped into memory rather than read; see `FileAttachment.from_path`.
 
         Args:
             limit: The maximum number of files to parse.
             pattern: The glob pattern to match files against.
-            exclude_files: A dict of Paths and last modified times.
-                Files will be excluded if their last modified time
-                is equal to the provided value.
+            exclude_files: A snapshot of files, e.g. those written before a run.
+                Files will be excluded if they haven't changed since.
             timeout: Maximum time in seconds for file parsing.
+            deadline: Deadline for file parsing, instead of `timeout`. It may be cancelled
+                from another thread to stop parsing.
+            max_depth: The maximum depth of directories to search, None for any.
+            max_entries: The maximum number of directory entries to search, None for any.
         Raises:
-            TimeoutError: If file parsing exceeds timeout.
+            TimeoutError: If file parsing exceeds the timeout or the deadline.
+            WalkLimitError: If the search exceeds `max_depth` or `max_entries`.
         """
-        start_time = time.monotonic()
-        count = 0
-        files = glob.iglob(pattern, root_dir=str(self.output), recursive=True, include_hidden=False)
-        for file in (Path(self.output, f) for f in files):
-            if timeout and (time.monotonic() - start_time) > timeout:
-                raise TimeoutError("File parsing timeout exceeded in MemFS.files")
-
-            if not file.is_file():
-                continue
-
-            if exclude_files and (orig_time := exclude_files.get(file)):
-                new_time = file.stat().st_mtime
-                log.info(f"Checking {file.name} ({orig_time=}, {new_time=})")
-                if file.stat().st_mtime == orig_time:
-                    log.info(f"Skipping {file.name!r} as it has not been modified")
-                    continue
-
-            if count > limit:
-                log.info(f"Max attachments {limit} reached, skipping remaining files")
-                break
-
-            count += 1
-            log.info(f"Found valid file for upload {file.name!r}")
-            yield FileAttachment.from_path(file, relative_to=self.output)
+        if deadline is None:
+            deadline = Deadline(timeout or None)
+        found = self._walk(pattern, exclude_files, deadline, max_depth, max_entries)
+        for name, entry in itertools.islice(found, limit):
+            log.info(f"Found valid file for upload {name!r}")
+            yield FileAttachment.from_path(Path(entry.path), relative_to=self.output)
 
     def files_list(
         self,
-        limit: int,
+        limit: int | None,
         pattern: str,
-        exclude_files: dict[Path, float] | None = None,
+        exclude_files: Snapshot | None = None,
         preload_dict: bool = False,
         timeout: float | None = None,
+        deadline: Deadline | None = None,
+        max_bytes: int | None = None,
+        max_encoded_size: int | None = None,
+        skipped: list[SkippedFile] | None = None,
+        max_depth: int | None = None,
+        max_entries: int | None = None,
     ) -> list[FileAttachment]:
         """
         Return a sorted list of file paths within the output directory.
 
+        The output directory is walked once, keeping only the first `limit` paths in order,
+        and the size limits are checked with the sizes found on the way, so files which are
+        left out are never opened. The size limits are applied in order of path: a file is
+        skipped if it would exceed either limit, and smaller files after it may still be included.
+
         Args:
-            limit: The maximum number of files to parse.
+            limit: The maximum number of files to parse, None for any.
             pattern: The glob pattern to match files against.
-            exclude_files: A dict of Paths and last modified times.
-                Files will be excluded if their last modified time
-                is equal to the provided value.
-            preload_dict: Whether to preload as_dict property data.
+            exclude_files: A snapshot of files, e.g. those written before a run.
+                Files will be excluded if they haven't changed since.
+            preload_dict: Whether to preload as_dict property data. This reads and encodes
+                all files up front, instead of as they are written out.
             timeout: Maximum time in seconds for file parsing.
+            deadline: Deadline for file parsing, instead of `timeout`.
+            max_bytes: The maximum total size of the files.
+            max_encoded_size: The maximum total size of the files as returned by the API,
+                i.e. base64-encoded within a JSON object; see `FileAttachment.encoded_size`.
+            skipped: A list to append the files skipped due to the size limits to.
+            max_depth: The maximum depth of directories to search, None for any.
+            max_entries: The maximum number of directory entries to search, None for any.
         Returns:
             List of FileAttachments sorted lexically by path name.
         Raises:
-            TimeoutError: If file parsing exceeds timeout.
+            TimeoutError: If file parsing exceeds the timeout or the deadline.
+            WalkLimitError: If the search exceeds `max_depth` or `max_entries`.
         """
-        start_time = time.monotonic()
-        res = sorted(
-            self.files(limit=limit, pattern=pattern, exclude_files=exclude_files),
-            key=lambda f: f.path,
+        if deadline is None:
+            deadline = Deadline(timeout or None)
+        found = (
+            (name, entry.stat().st_size, entry.path)
+            for name, entry in self._walk(pattern, exclude_files, deadline, max_depth, max_entries)
         )
+        # A bounded heap keeps sorting at O(n log limit) however many files there are.
+        candidates = sorted(found) if limit is None else heapq.nsmallest(limit, found)
+        if max_bytes is not None or max_encoded_size is not None:
+            candidates = self._within_limits(candidates, max_bytes, max_encoded_size, skipped)
+
+        res = []
+        for name, _, path in candidates:
+            deadline.check("File parsing in MemFS.files_list")
+            log.info(f"Found valid file for upload {name!r}")
+            res.append(FileAttachment.from_path(Path(path), relative_to=self.output))
         if preload_dict:
             for file in res:
-                if timeout and (time.monotonic() - start_time) > timeout:
-                    raise TimeoutError("File parsing timeout exceeded in MemFS.files_list")
+                deadline.check("File parsing in MemFS.files_list")
                 # Loads the cached property as attribute
                 _ = file.as_dict
         return res
+
+    @staticmethod
+    def _within_limits(
+        files: list[tuple[str, int, str]],
+        max_bytes: int | None,
+        max_encoded_size: int | None,
+        skipped: list[SkippedFile] | None,
+    ) -> list[tuple[str, int, str]]:
+        """Return the `files` (as path, size, and full path) which fit within the size limits."""
+        res = []
+        total_size = 0
+        total_encoded_size = 0
+        for file in files:
+            name, file_size, _ = file
+            size = total_size + file_size
+            encoded_size = total_encoded_size + FileAttachment.encoded_size_of(name, file_size)
+            if (max_bytes is not None and size > max_bytes) or (
+                max_encoded_size is not None and encoded_size > max_encoded_size
+            ):
+                log.info(f"Skipping {name!r} as it exceeds the attachment size limit")
+                if skipped is not None:
+                    skipped.append(SkippedFile(name, file_size))
+                continue
+            res.append(file)
+            total_size, total_encoded_size = size, encoded_size
+        return res
+
+
+class MemFSPool:
+    """
+    A pool of pre-mounted MemFS instances.
+
+    Instances are handed out by `acquire` and wiped by a background thread once released,
+    which keeps the tmpfs mount and unmount off the request path. The pool is started lazily
+    in the process that first acquires from it, so it is safe to create before a fork.
+    """
+
+    def __init__(
+        self,
+        size: int,
+        instance_size: int,
+        root_dir: str | Path = "/memfs",
+        home: str = "home",
+        output: str = "home",
+        low_water: int | None = None,
+        high_water: int | None = None,
+    ) -> None:
+        """
+        Initialize a pool of in-memory temporary file systems.
+
+        Examples:
+            >>> pool = MemFSPool(4, 1024)
+            >>> with pool.memfs() as memfs:
+            ...     (memfs.home / "test.txt").write_text("Hello")
+
+        Args:
+            size: Number of idle instances to mount when the pool starts and to refill up to.
+            instance_size: Size limit of each tmpfs instance in bytes.
+            root_dir: Root directory to mount instances in.
+            home: Name of the home directory.
+            output: Name of the output directory within home. If empty, uses home.
+            low_water: Refill the pool in the background once fewer instances than this are idle.
+                Defaults to half of `size`.
+            high_water: Maximum number of idle instances to keep; any released beyond this
+                are unmounted. Defaults to `size`.
+        """
+        self.size = size
+        self.low_water = size // 2 if low_water is None else low_water
+        self.high_water = size if high_water is None else max(high_water, size)
+        self._memfs_kwargs = dict(
+            instance_size=instance_size, root_dir=root_dir, home=home, output=output
+        )
+
+        self.hits = 0
+        self.misses = 0
+        self.remounts = 0
+
+        self._idle: deque[MemFS] = deque()
+        self._tasks: deque[MemFS | None] = deque()
+        self._lock = threading.Lock()
+        self._wakeup = threading.Condition(self._lock)
+        self._thread: threading.Thread | None = None
+        self._pid: int | None = None
+        self._closed = False
+
+    def __repr__(self) -> str:
+        return f"<{self.__class__.__name__} size={self.size} idle={len(self._idle)}>"
+
+    def _start(self) -> None:
+        """Start the background thread if it isn't running in the current process."""
+        pid = os.getpid()
+        if self._pid == pid:
+            return
+
+        # Instances and threads inherited through a fork belong to the parent process.
+        for fs in self._idle:
+            fs._finalizer.detach()
+        self._idle.clear()
+        self._tasks.clear()
+
+        self._pid = pid
+        self._tasks.append(None)
+        self._thread = threading.Thread(target=self._run, name="MemFSPool", daemon=True)
+        self._thread.start()
+
+    def _run(self) -> None:
+        """Process reset and refill tasks until the pool is closed."""
+        while True:
+            with self._wakeup:
+                while not self._tasks and not self._closed:
+                    self._wakeup.wait()
+                if self._closed:
+                    return
+                task = self._tasks.popleft()
+
+            try:
+                if task is None:
+                    self._fill()
+                else:
+                    self._reset(task)
+            except Exception:
+                log.exception("Unexpected error in the MemFS pool background thread")
+
+    def _fill(self) -> None:
+        """Mount new instances until the pool holds `size` idle instances."""
+        while len(self._idle) < self.size and not self._closed:
+            fs = MemFS(**self._memfs_kwargs)
+            with self._lock:
+                if not self._closed:
+                    self._idle.append(fs)
+                    continue
+            fs.cleanup()
+
+    def _reset(self, fs: MemFS) -> None:
+        """Wipe a released instance and return it to the pool, or remount it if it is dirty."""
+        try:
+            clean = fs.wipe()
+        except OSError as e:
+            log.info(f"Failed to wipe {fs!r}, remounting.", exc_info=e)
+            clean = False
+
+        if not clean:
+            self.remounts += 1
+            fs.cleanup()
+            if len(self._idle) >= self.size:
+                return
+            fs = MemFS(**self._memfs_kwargs)
+
+        with self._lock:
+            if len(self._idle) < self.high_water and not self._closed:
+                self._idle.append(fs)
+                return
+        fs.cleanup()
+
+    def acquire(self) -> MemFS:
+        """Return a wiped MemFS instance, mounting a new one if none are idle."""
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("Cannot acquire from a closed MemFSPool")
+
+            self._start()
+            if self._idle:
+                self.hits += 1
+                fs = self._idle.popleft()
+            else:
+                self.misses += 1
+                fs = None
+
+            if len(self._idle) < self.low_water and None not in self._tasks:
+                self._tasks.append(None)
+                self._wakeup.notify()
+
+        return fs if fs is not None else MemFS(**self._memfs_kwargs)
+
+    def release(self, fs: MemFS) -> None:
+        """Hand an instance back to the pool to be wiped in the background."""
+        with self._lock:
+            if self._closed or self._pid != os.getpid():
+                fs.cleanup()
+                return
+            self._tasks.append(fs)
+            self._wakeup.notify()
+
+    @contextmanager
+    def memfs(self) -> Generator[MemFS, None, None]:
+        """Acquire an instance for the duration of the context and release it afterwards."""
+        fs = self.acquire()
+        try:
+            yield fs
+        finally:
+            self.release(fs)
+
+    def stats(self) -> dict[str, int]:
+        """Return the pool's counters and current occupancy."""
+        with self._lock:
+            return {
+                "size": self.size,
+                "low_water": self.low_water,
+                "high_water": self.high_water,
+                "idle": len(self._idle),
+                "resetting": sum(task is not None for task in self._tasks),
+                "hits": self.hits,
+                "misses": self.misses,
+                "remounts": self.remounts,
+            }
+
+    def close(self) -> None:
+        """Stop the background thread and unmount all idle and pending instances."""
+        with self._wakeup:
+            self._closed = True
+            self._wakeup.notify()
+            pending = [*self._idle, *(task for task in self._tasks if task is not None)]
+            self._idle.clear()
+            self._tasks.clear()
+
+        if self._thread is not None and self._pid == os.getpid():
+            self._thread.join()
+
+        for fs in pending:
+            fs.cleanup()
@@ -1,11 +1,25 @@
 """I/O Operations for sending / receiving files from the sandbox."""
 from __future__ import annotations
 
+import hashlib
+import json
+import mmap
+import os
 from base64 import b64decode, b64encode
+from collections.abc import Iterator
 from dataclasses import dataclass
 from functools import cached_property
 from pathlib import Path
 
+# Size of the chunks in which attachments are written out; a multiple of 3 bytes so that each
+# chunk can be base64-encoded on its own.
+CHUNK_SIZE = 3 * 16 * 1024
+
+# Files from this size on are mapped into memory by `FileAttachment.from_path`; smaller ones are
+# read. A mapping holds the blocks of its file until it is dropped, which keeps a pooled MemFS
+# instance from being wiped clean, so it is only worth it for large files.
+MMAP_MIN_SIZE = 1024 * 1024
+
 
 def safe_path(path: str) -> str:
     """
@@ -38,14 +52,20 @@ class IllegalPathError(ParsingError):
 
 @dataclass(frozen=True)
 class FileAttachment:
-    """A file attachment."""
+    """
+    A file attachment.
+
+    The content of large attachments created with `from_path` is a read-only memoryview of the
+    file mapped into memory rather than bytes, so it is only paged in as it is written out.
+    """
 
     path: str
-    content: bytes
+    content: bytes | memoryview
 
     def __repr__(self) -> str:
         path = f"{self.path[:30]}..." if len(self.path) > 30 else self.path
-        content = f"{self.content[:15]}..." if len(self.content) > 15 else self.content
+        content = bytes(self.content[:15])
+        content = f"{content}..." if len(self.content) > 15 else content
         return f"{self.__class__.__name__}(path={path!r}, content={content!r})"
 
     @classmethod
@@ -68,18 +88,67 @@ class FileAttachment:
         """
         Create an attachment from a file path.
 
+        Files of at least `MMAP_MIN_SIZE` bytes are mapped into memory instead of read. The
+        mapping stays valid once the file is deleted or its tmpfs is lazily unmounted, but the
+        file must not be truncated while the attachment is in use.
+
         Args:
             file: The file to attach.
             relative_to: The root for the path name.
         """
         path = file.relative_to(relative_to) if relative_to else file
-        return cls(str(path), file.read_bytes())
+        with open(file, "rb") as f:
+            size = os.fstat(f.fileno()).st_size
+            # Empty files can't be mapped.
+            if size < MMAP_MIN_SIZE or size == 0:
+                content = f.read()
+            else:
+                content = memoryview(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ))
+        return cls(str(path), content)
 
     @property
     def size(self) -> int:
         """Size of the attachment."""
         return len(self.content)
 
+    @property
+    def sha256(self) -> str:
+        """Hex SHA-256 digest of the content."""
+        return hashlib.sha256(self.content).hexdigest()
+
+    @property
+    def b64_size(self) -> int:
+        """Size of the base64-encoded content of the attachment."""
+        return (self.size + 2) // 3 * 4
+
+    @property
+    def encoded_size(self) -> int:
+        """Size of the attachment as a JSON object with base64-encoded content, as returned."""
+        return self.encoded_size_of(self.path, self.size)
+
+    @staticmethod
+    def encoded_size_of(path: str, size: int) -> int:
+        """Return the `encoded_size` of an attachment of `size` bytes at `path`."""
+        return len(json.dumps({"path": path, "size": size, "content": ""})) + (size + 2) // 3 * 4
+
+    def iter_content(self, chunk_size: int = CHUNK_SIZE) -> Iterator[bytes]:
+        """Yield the content in chunks of at most `chunk_size` bytes, reading it as needed."""
+        if isinstance(self.content, bytes):
+            # Already in memory; no need to copy it.
+            if self.content:
+                yield self.content
+            return
+
+        for i in range(0, len(self.content), chunk_size):
+            yield bytes(self.content[i : i + chunk_size])
+
+    def iter_b64(self, chunk_size: int = CHUNK_SIZE) -> Iterator[bytes]:
+        """Yield the base64-encoded content, encoding `chunk_size` bytes at a time."""
+        if chunk_size % 3:
+            raise ValueError("The chunk size must be a multiple of 3")
+        for i in range(0, len(self.content), chunk_size):
+            yield b64encode(self.content[i : i + chunk_size])
+
     def save_to(self, directory: Path | str) -> Path:
         """Write the attachment to a file in `directory`. Return a Path of the file."""
         file = Path(directory, self.path)
@@ -97,3 +166,16 @@ class FileAttachment:
             "size": self.size,
             "content": content,
         }
+
+
+@dataclass(frozen=True)
+class SkippedFile:
+    """An output file which was left out of a result, e.g. to stay within the size limit."""
+
+    path: str
+    size: int
+
+    @property
+    def as_dict(self) -> dict[str, str | int]:
+        """Convert the skipped file to a dict."""
+        return {"path": self.path, "size": self.size}
@@ -1,21 +1,37 @@
+import codecs
+import fcntl
 import logging
+import math
+import os
 import re
+import resource
+import selectors
+import signal
 import subprocess
-import sys
-from collections.abc import Generator
+import time
+import weakref
+from collections.abc import Callable, Generator
+from contextlib import ExitStack, contextmanager, suppress
 from pathlib import Path
 from tempfile import NamedTemporaryFile
-from typing import Iterable, TypeVar
+from typing import IO, Iterable, NamedTuple, TypeVar
 
 from google.protobuf import text_format
 
 from nsbox import DEBUG, utils
+from nsbox.blobs import BlobAttachment
 from nsbox.config_pb2 import NsJailConfig
 from nsbox.filesystem import Size
-from nsbox.memfs import MemFS
+from nsbox.memfs import FileWriteError, MemFS, MemFSPool
+from nsbox.nsio import FileAttachment, SkippedFile
 from nsbox.process import EvalResult
-from nsbox.nsio import FileAttachment
-from nsbox.utils.timed import time_limit
+from nsbox.utils import metrics
+from nsbox.utils.cgroup import RunCgroup
+from nsbox.utils.logging import run_id
+from nsbox.utils.snapshot import Snapshot
+from nsbox.utils.timed import Deadline
+from nsbox.utils.walk import WalkLimitError
+from nsbox.warm import BOOTSTRAP, WarmJail, WarmPool, warm_argv
 
 __all__ = ("NsJail",)
 
@@ -24,6 +40,9 @@ log = logging.getLogger(__name__)
 _T = TypeVar("_T")
 
 # [level][timestamp][PID]? function_signature:line_no? message
+# Seconds NsJail gets on top of its own time limit before nsbox terminates it.
+WALL_TIME_GRACE = 2
+
 LOG_PATTERN = re.compile(
     r"\[(?P<level>(I)|[DWEF])\]\[.+?\](?(2)|(?P<func>\[\d+\] .+?:\d+ )) ?(?P<msg>.+)"
 )
@@ -39,6 +58,61 @@ def iter_lstrip(iterable: Iterable[_T]) -> Generator[_T, None, None]:
     yield from it
 
 
+class _StdoutResult(NamedTuple):
+    """How reading the output of NsJail ended."""
+
+    truncated: bool
+    """Whether the output exceeded the limit."""
+    size: int
+    """Size of the output in bytes, up to the limit."""
+    closed: float
+    """Monotonic time at which STDOUT was closed or the output limit was reached."""
+    usage: resource.struct_rusage | None
+    """Resource usage of NsJail and the processes it reaped."""
+
+
+def _reap(process: subprocess.Popen) -> resource.struct_rusage | None:
+    """Wait for `process` to exit and return its resource usage, including that of its children."""
+    try:
+        _, status, usage = os.wait4(process.pid, 0)
+    except ChildProcessError:
+        # Already reaped elsewhere.
+        process.wait()
+        return None
+
+    process.returncode = os.waitstatus_to_exitcode(status)
+    return usage
+
+
+def _usage_dict(usage: resource.struct_rusage) -> dict[str, float]:
+    """Convert resource usage to a dict as returned by the API."""
+    return {
+        "user_time": usage.ru_utime,
+        "system_time": usage.ru_stime,
+        # Kilobytes on Linux.
+        "max_rss": usage.ru_maxrss * 1024,
+        "minor_faults": usage.ru_minflt,
+        "major_faults": usage.ru_majflt,
+        "voluntary_switches": usage.ru_nvcsw,
+        "involuntary_switches": usage.ru_nivcsw,
+    }
+
+
+def _decode_output(data: memoryview, truncated: bool) -> str:
+    """
+    Decode UTF-8 output, dropping a character cut off at the end if the output was truncated.
+
+    Raises:
+        UnicodeDecodeError: If the output is not valid UTF-8.
+    """
+    try:
+        return str(data, "utf-8")
+    except UnicodeDecodeError as e:
+        if truncated and e.reason == "unexpected end of data":
+            return str(data[: e.start], "utf-8")
+        raise
+
+
 class NsJail:
     """
     Core nsbox functionality, providing safe execution of Python code.
@@ -52,12 +126,24 @@ class NsJail:
         config_path: str = "./config/nsbox_py.cfg",
         max_output_size: int = 1_000_000,
         read_chunk_size: int = 10_000,
+        max_response_size: int | None = None,
+        wall_time_limit: float | None = None,
         memfs_instance_size: int = 48 * Size.MiB,
         memfs_home: str = "home",
         memfs_output: str = "home",
+        memfs_pool_size: int = 0,
+        memfs_pool_low_water: int | None = None,
+        memfs_pool_high_water: int | None = None,
+        warm_pool_size: int = 0,
+        warm_imports: Iterable[str] = (),
+        cgroup_stats: bool = True,
         files_limit: int | None = 100,
         files_timeout: int | None = 5,
         files_pattern: str = "**/[!_]*",
+        files_max_bytes: int | None = None,
+        files_max_depth: int | None = 100,
+        files_max_entries: int | None = 100_000,
+        config_memfd: bool = False,
     ):
         """
         Initialize NsJail.
@@ -66,55 +152,138 @@ class NsJail:
             nsjail_path: Path to the NsJail binary.
             config_path: Path to the NsJail configuration file.
             max_output_size: Maximum size of the output in bytes.
-            read_chunk_size: Size of the read buffer in bytes.
+            read_chunk_size: Size of the read buffer in bytes when streaming output.
+            max_response_size: Maximum total size in bytes of the output and the attached
+                files, base64-encoded as returned by the API. The output is cut off at this
+                size, and files which don't fit in the rest are skipped, in order of path.
+                None for no limit other than `max_output_size` and `files_max_bytes`.
+            wall_time_limit: Time in seconds after which NsJail is terminated by nsbox itself,
+                as a backstop for NsJail's own time limit. Defaults to the configured
+                `time_limit` plus a grace period of 2 seconds; 0 disables it.
             memfs_instance_size: Size of the tmpfs instance in bytes.
             memfs_home: Name of the mounted home directory.
             memfs_output: Name of the output directory within home,
                 can be empty to use home as output.
+            memfs_pool_size: Number of pre-mounted tmpfs instances to keep ready,
+                0 to mount a new instance on every run.
+            memfs_pool_low_water: Refill the pool once fewer instances than this are idle.
+            memfs_pool_high_water: Maximum number of idle instances kept in the pool.
+            warm_pool_size: Number of sandboxed Python interpreters to keep started ahead of
+                time, 0 to start a new one on every run. Ignored for other executables.
+            warm_imports: Modules imported by the warm interpreters before they are used.
+            cgroup_stats: Whether to read the resource usage of each run from a cgroup created
+                for it. Disabled automatically if the cgroup can't be created.
             files_limit: Maximum number of output files to parse.
             files_timeout: Maximum time in seconds to wait for output files to be read.
             files_pattern: Pattern to match files to attach within the output directory.
+            files_max_bytes: Maximum total size in bytes of the files to attach, None to only
+                be limited by the size of the tmpfs instance.
+            files_max_depth: Maximum depth of directories to search for output files.
+                Deeper directories fail the evaluation. None for no limit.
+            files_max_entries: Maximum number of directory entries to search for output files.
+                More entries fail the evaluation. None for no limit.
+            config_memfd: Whether to give NsJail the config through a sealed in-memory file
+                inherited by each NsJail process, rather than by its path. The config is then
+                read only once, when this object is created, rather than on every run.
         """
         self.nsjail_path = nsjail_path
         self.config_path = config_path
         self.max_output_size = max_output_size
+        self.max_response_size = max_response_size
         self.read_chunk_size = read_chunk_size
+        self.wall_time_limit = wall_time_limit
 
         self.memfs_instance_size = memfs_instance_size
         self.memfs_home = memfs_home
         self.memfs_output = memfs_output
+        self.memfs_pool = None
+        if memfs_pool_size > 0:
+            self.memfs_pool = MemFSPool(
+                memfs_pool_size,
+                instance_size=memfs_instance_size,
+                home=memfs_home,
+                output=memfs_output,
+                low_water=memfs_pool_low_water,
+                high_water=memfs_pool_high_water,
+            )
         self.files_limit = files_limit
         self.files_timeout = files_timeout
         self.files_pattern = files_pattern
+        self.files_max_bytes = files_max_bytes
+        self.files_max_depth = files_max_depth
+        self.files_max_entries = files_max_entries
+
+        # Parsed once per process tree. Copying the shared config is much cheaper than parsing it.
+        probe = utils.probe.probe(config_path)
+        self.config = NsJailConfig()
+        self.config.CopyFrom(probe.config)
+        # Identifies the configuration, e.g. to tell apart cached results of different configs.
+        self.config_digest = probe.digest
+        self.cgroup_version = probe.cgroup_version
+        self.ignore_swap_limits = probe.ignore_swap_limits
+
+        # File descriptors NsJail processes inherit.
+        self._pass_fds: tuple[int, ...] = ()
+        config_arg = config_path
+        if config_memfd:
+            fd = self._write_config_memfd()
+            self._pass_fds = (fd,)
+            config_arg = f"/proc/self/fd/{fd}"
+
+        # The arguments which are the same for every run are only computed once. Each run
+        # fills in its log, MemFS, cgroup, and NsJail and interpreter arguments in between.
+        self._argv_head = (self.nsjail_path, "--config", config_arg, *self._host_args())
+        self._argv_exec = ("--", self.config.exec_bin.path, *self.config.exec_bin.arg)
+
+        self.cgroup_stats = cgroup_stats
+
+        self.warm_imports = tuple(warm_imports)
+        self.warm_pool = None
+        if warm_pool_size > 0:
+            if Path(self.config.exec_bin.path).name.startswith("python"):
+                self.warm_pool = WarmPool(warm_pool_size, self._spawn_warm)
+            else:
+                log.warning(f"Warm jails are only supported for Python, not {config_path!r}.")
+
+    @property
+    def output_limit(self) -> int:
+        """Maximum size of the output in bytes, accounting for the response size limit."""
+        if self.max_response_size is None:
+            return self.max_output_size
+        return min(self.max_output_size, self.max_response_size)
+
+    def _host_args(self) -> tuple[str, ...]:
+        """Return the NsJail arguments required by the host's cgroup setup."""
+        args: tuple[str, ...] = ()
+        if self.cgroup_version == 2:
+            args = ("--use_cgroupv2",)
 
-        self.config = self._read_config(config_path)
-        self.cgroup_version = utils.cgroup.init(self.config)
-        self.ignore_swap_limits = utils.swap.should_ignore_limit(self.config, self.cgroup_version)
+        if self.ignore_swap_limits:
+            args = ("--cgroup_mem_memsw_max", "0", "--cgroup_mem_swap_max", "-1", *args)
 
-        log.info(f"Assuming cgroup version {self.cgroup_version}.")
+        return args
 
-    @staticmethod
-    def _read_config(config_path: str) -> NsJailConfig:
-        """Read the NsJail config at `config_path` and return a protobuf Message object."""
-        config = NsJailConfig()
+    def _write_config_memfd(self) -> int:
+        """
+        Write the config to a sealed memfd and return its file descriptor.
 
-        try:
-            with open(config_path, encoding="utf-8") as f:
-                config_text = f.read()
-        except FileNotFoundError:
-            log.fatal(f"The NsJail config at {config_path!r} could not be found.")
-            sys.exit(1)
-        except OSError as e:
-            log.fatal(f"The NsJail config at {config_path!r} could not be read.", exc_info=e)
-            sys.exit(1)
+        The file descriptor is closed once this object is garbage collected.
+        """
+        fd = os.memfd_create(
+            f"nsjail:{Path(self.config_path).name}", os.MFD_CLOEXEC | os.MFD_ALLOW_SEALING
+        )
+        weakref.finalize(self, os.close, fd)
 
-        try:
-            text_format.Parse(config_text, config)
-        except text_format.ParseError as e:
-            log.fatal(f"The NsJail config at {config_path!r} could not be parsed.", exc_info=e)
-            sys.exit(1)
+        with open(fd, "wb", closefd=False) as f:
+            f.write(text_format.MessageToString(self.config).encode("utf-8"))
+        seals = fcntl.F_SEAL_SEAL | fcntl.F_SEAL_SHRINK | fcntl.F_SEAL_GROW | fcntl.F_SEAL_WRITE
+        fcntl.fcntl(fd, fcntl.F_ADD_SEALS, seals)
+        return fd
 
-        return config
+    @staticmethod
+    def _read_config(config_path: str) -> NsJailConfig:
+        """Read the NsJail config at `config_path` and return a protobuf Message object."""
+        return utils.probe.read_config(config_path)
 
     @staticmethod
     def _parse_log(log_lines: Iterable[str]) -> None:
@@ -142,37 +311,261 @@ class NsJail:
                 # Treat fatal as error.
                 log.error(msg)
 
-    def _consume_stdout(self, nsjail: subprocess.Popen) -> str:
+    @contextmanager
+    def _memfs(self, timings: dict[str, float] | None = None) -> Generator[MemFS, None, None]:
+        """Provide a MemFS instance for the duration of the context, from the pool if enabled."""
+        with ExitStack() as stack:
+            with metrics.timed("memfs_mount", timings):
+                if self.memfs_pool is not None:
+                    fs = stack.enter_context(self.memfs_pool.memfs())
+                else:
+                    fs = stack.enter_context(
+                        MemFS(
+                            instance_size=self.memfs_instance_size,
+                            home=self.memfs_home,
+                            output=self.memfs_output,
+                        )
+                    )
+            yield fs
+
+    def _run_cgroup(self) -> RunCgroup | None:
+        """Create a cgroup for a run to read its resource usage from, or return None if disabled."""
+        if not self.cgroup_stats:
+            return None
+
+        cgroup = RunCgroup(self.config, self.cgroup_version)
+        try:
+            cgroup.create()
+        except OSError as e:
+            log.warning(f"Failed to create a cgroup for the run, disabling cgroup stats: {e}")
+            self.cgroup_stats = False
+            return None
+        return cgroup
+
+    @contextmanager
+    def _cgroup(self) -> Generator[RunCgroup | None, None, None]:
+        """Provide a cgroup for the duration of the context; see `_run_cgroup`."""
+        cgroup = self._run_cgroup()
+        try:
+            yield cgroup
+        finally:
+            if cgroup is not None:
+                cgroup.remove()
+
+    @contextmanager
+    def shared_files(
+        self, files: Iterable[FileAttachment]
+    ) -> Generator[tuple[str, ...], None, None]:
         """
-        Consume STDOUT, stopping when the output limit is reached or NsJail has exited.
+        Write `files` once for several runs, and provide the NsJail arguments which mount them.
+
+        The files are written to a MemFS instance of their own, which is mounted read-only
+        as the `shared` directory within the home directory of each run given the arguments.
+
+        Raises:
+            OSError: If a file could not be written.
+        """
+        with MemFS(instance_size=self.memfs_instance_size) as fs:
+            try:
+                fs.write_files(files)
+            except FileWriteError as e:
+                raise e.error
+            yield ("--bindmount_ro", f"{fs.home}:home/shared")
+
+    @contextmanager
+    def _blob_mounts(
+        self, files: Iterable[FileAttachment]
+    ) -> Generator[tuple[str, ...], None, None]:
+        """
+        Check out the blobs among `files`, and provide the NsJail arguments which mount them.
+
+        Each blob is mounted read-only over its file, which is written empty as its mount point,
+        so that it is neither copied into the MemFS instance nor mistaken for an output file.
+
+        Raises:
+            FileWriteError: If a blob is no longer stored.
+        """
+        with ExitStack() as stack:
+            args: list[str] = []
+            for file in files:
+                if not isinstance(file, BlobAttachment):
+                    continue
+                try:
+                    source = stack.enter_context(file.store.checkout(file.digest))
+                except OSError as e:
+                    raise FileWriteError(file.path, e) from e
+                args += ("--bindmount_ro", f"{source}:home/{os.path.normpath(file.path)}")
+            yield tuple(args)
+
+    def time_limit_args(self, time_limit: float) -> tuple[str, ...]:
+        """Return NsJail arguments which lower the time limit to at most `time_limit` seconds."""
+        # NsJail only supports whole seconds; round up so the limit is never 0, i.e. disabled.
+        seconds = max(math.ceil(time_limit), 1)
+        if 0 < self.config.time_limit <= seconds:
+            return ()
+        return ("--time_limit", str(seconds))
+
+    def _wall_time_limit(self, nsjail_args: Iterable[str]) -> float | None:
+        """Return the host-side time limit in seconds for a run, or None if there is none."""
+        if self.wall_time_limit is not None:
+            return self.wall_time_limit or None
+
+        time_limit = self.config.time_limit
+        args = list(nsjail_args)
+        for i, arg in enumerate(args[:-1]):
+            if arg in ("--time_limit", "-t"):
+                with suppress(ValueError):
+                    time_limit = int(args[i + 1])
+
+        if time_limit <= 0:
+            return None
+        return time_limit + WALL_TIME_GRACE
+
+    def _read_stdout(
+        self, nsjail: subprocess.Popen, buffer: bytearray, timeout: float | None = None
+    ) -> Generator[memoryview, None, _StdoutResult]:
+        """
+        Read STDOUT into `buffer`, stopping when the output limit is reached or NsJail has exited.
 
         The aim of this function is to limit the size of the output received from
         NsJail to prevent container from claiming too much memory. If the output
         received from STDOUT goes over the OUTPUT_MAX limit, the NsJail subprocess
         is asked to terminate with a SIGKILL.
 
-        Once the subprocess has exited, either naturally or because it was terminated,
-        we return the output as a single string.
+        The pipe is read without blocking through a selector, directly into `buffer`.
+        Each chunk is yielded as a view into the buffer as soon as it is read; reading
+        wraps around to the start of the buffer once it is full, so a buffer smaller
+        than the output limit may only be used if each chunk is consumed before the next.
+        The chunks add up to at most `output_limit` bytes.
+
+        NsJail is also terminated if it is still running after `timeout` seconds, or if
+        the caller stops iterating early. Once STDOUT is closed, NsJail is reaped.
+
+        Returns:
+            Whether the output was truncated, when reading stopped, and the resource usage.
         """
+        view = memoryview(buffer)
+        fd = nsjail.stdout.fileno()
+        os.set_blocking(fd, False)
+
+        limit = self.output_limit
         output_size = 0
-        output = []
+        pos = 0
+        truncated = False
+        terminating = False
+        deadline = None if timeout is None else time.monotonic() + timeout
 
         # Context manager will wait for process to terminate and close file descriptors.
-        with nsjail:
-            # We'll consume STDOUT as long as the NsJail subprocess is running.
-            while nsjail.poll() is None:
-                chars = nsjail.stdout.read(self.read_chunk_size)
-                output_size += sys.getsizeof(chars)
-                output.append(chars)
-
-                if output_size > self.max_output_size:
-                    # Terminate the NsJail subprocess with SIGTERM.
-                    # This in turn reaps and kills children with SIGKILL.
-                    log.info("Output exceeded the output limit, sending SIGTERM to NsJail.")
-                    nsjail.terminate()
+        with nsjail, selectors.DefaultSelector() as selector:
+            selector.register(fd, selectors.EVENT_READ)
+            try:
+                # We'll consume STDOUT until every writer has closed it.
+                while True:
+                    if deadline is not None and time.monotonic() >= deadline:
+                        if terminating:
+                            # NsJail didn't close STDOUT within the grace period.
+                            nsjail.kill()
+                            break
+                        log.info(f"NsJail exceeded the wall time limit of {timeout}s, terminating.")
+                        nsjail.terminate()
+                        terminating = True
+                        # Give NsJail a moment to reap its children.
+                        deadline = time.monotonic() + WALL_TIME_GRACE
+
+                    remaining = None if deadline is None else max(deadline - time.monotonic(), 0)
+                    if not selector.select(remaining):
+                        continue
+
+                    if pos == len(view):
+                        pos = 0
+                    try:
+                        size = os.readv(fd, [view[pos:]])
+                    except BlockingIOError:
+                        continue
+                    if size == 0:
+                        break
+
+                    chunk = view[pos : pos + size]
+                    pos += size
+                    output_size += size
+
+                    if output_size > limit:
+                        # Terminate the NsJail subprocess with SIGTERM.
+                        # This in turn reaps and kills children with SIGKILL.
+                        log.info("Output exceeded the output limit, sending SIGTERM to NsJail.")
+                        nsjail.terminate()
+                        truncated = True
+                        metrics.OUTPUT_TRUNCATIONS.inc()
+                        yield chunk[: size - (output_size - limit)]
+                        break
+
+                    yield chunk
+            except BaseException:
+                nsjail.terminate()
+                raise
+
+            closed = time.monotonic()
+            usage = _reap(nsjail)
+
+        return _StdoutResult(truncated, min(output_size, limit), closed, usage)
+
+    def _iter_stdout(
+        self, nsjail: subprocess.Popen, timeout: float | None = None
+    ) -> Generator[str, None, _StdoutResult]:
+        """
+        Yield STDOUT as it is read, stopping when the output limit is reached or NsJail has exited.
+
+        Only a buffer of `read_chunk_size` bytes is held; each chunk is decoded incrementally.
+        Return how reading ended, as `_read_stdout` does.
+
+        Raises:
+            UnicodeDecodeError: If the output is not valid UTF-8.
+        """
+        decoder = codecs.getincrementaldecoder("utf-8")()
+        reader = self._read_stdout(nsjail, bytearray(self.read_chunk_size), timeout)
+        try:
+            while True:
+                try:
+                    chunk = next(reader)
+                except StopIteration as e:
+                    stdout: _StdoutResult = e.value
                     break
+                if chars := decoder.decode(chunk):
+                    yield chars
+        finally:
+            reader.close()
+
+        # A character may have been cut off by the truncation, which isn't an error.
+        if not stdout.truncated and (chars := decoder.decode(b"", final=True)):
+            yield chars
+        return stdout
+
+    def _consume_stdout(
+        self, nsjail: subprocess.Popen, timeout: float | None = None
+    ) -> tuple[str, _StdoutResult]:
+        """
+        Consume STDOUT, stopping when the output limit is reached or NsJail has exited.
 
-        return "".join(output)
+        The output is read into a single buffer of `output_limit` bytes and decoded
+        once the subprocess has exited, either naturally or because it was terminated.
+
+        Returns:
+            The output, and how reading it ended, as `_read_stdout` returns.
+        Raises:
+            UnicodeDecodeError: If the output is not valid UTF-8.
+        """
+        # One extra byte allows telling whether the limit was exceeded.
+        buffer = bytearray(self.output_limit + 1)
+        reader = self._read_stdout(nsjail, buffer, timeout)
+        size = 0
+        while True:
+            try:
+                size += len(next(reader))
+            except StopIteration as e:
+                stdout: _StdoutResult = e.value
+                break
+
+        return _decode_output(memoryview(buffer)[:size], stdout.truncated), stdout
 
     def run_code(
         self,
@@ -188,119 +581,411 @@ class NsJail:
             files: FileAttachments to write to the sandbox prior to running Python.
             nsjail_args: Overrides for the NsJail configuration.
         """
-        if self.cgroup_version == 2:
-            nsjail_args = ("--use_cgroupv2", *nsjail_args)
+        # The output is read into a single buffer rather than yielded, so nothing is.
+        stream = self._evaluate(run_args, files, nsjail_args, buffered=True)
+        try:
+            next(stream)
+        except StopIteration as e:
+            return e.value
+        raise RuntimeError("A buffered evaluation yielded output")
 
-        if self.ignore_swap_limits:
-            nsjail_args = (
-                "--cgroup_mem_memsw_max",
-                "0",
-                "--cgroup_mem_swap_max",
-                "-1",
-                *nsjail_args,
+    def stream_code(
+        self,
+        run_args: Iterable[str],
+        files: Iterable[FileAttachment] = (),
+        nsjail_args: Iterable[str] = (),
+    ) -> Generator[str, None, EvalResult]:
+        """
+        Execute Python 3 code in an isolated environment, yielding its output as it is produced.
+
+        The generator returns the completed process once NsJail has exited. Its `stdout` is
+        None, unless the evaluation failed before or while running, in which case it holds
+        the error message instead. Its `timings` hold the duration of each phase of the
+        evaluation, and its `usage` the resource usage of NsJail and its children.
+
+        Evaluations may run concurrently in multiple threads. Each uses its own log file,
+        memory file system, and cgroup; the records it logs are tagged with its own run ID.
+
+        Args:
+            run_args: Arguments to pass to Python.
+            files: FileAttachments to write to the sandbox prior to running Python.
+            nsjail_args: Overrides for the NsJail configuration.
+        """
+        return (yield from self._evaluate(run_args, files, nsjail_args))
+
+    def _evaluate(
+        self,
+        run_args: Iterable[str],
+        files: Iterable[FileAttachment],
+        nsjail_args: Iterable[str],
+        buffered: bool = False,
+    ) -> Generator[str, None, EvalResult]:
+        """
+        Run an evaluation, as `stream_code` does.
+
+        If `buffered` is True, the output is read into a single buffer and returned as the
+        `stdout` of the result instead of being yielded.
+        """
+        start = time.monotonic()
+        timings: dict[str, float] = {}
+
+        with run_id():
+            files = tuple(files)
+            jail = None
+            # Blobs are mounted as the jail starts, which warm jails already have.
+            blobs = any(isinstance(file, BlobAttachment) for file in files)
+            if self.warm_pool is not None and not nsjail_args and not blobs:
+                if (argv := warm_argv(iter_lstrip(run_args))) is not None:
+                    jail = self.warm_pool.acquire()
+
+            if jail is not None:
+                result = yield from self._stream_warm(jail, argv, files, timings, buffered)
+            else:
+                result = yield from self._stream_cold(
+                    run_args, files, nsjail_args, timings, buffered
+                )
+
+        timings["total"] = time.monotonic() - start
+        result.timings = timings
+        metrics.observe_result(result)
+        return result
+
+    def _stream_cold(
+        self,
+        run_args: Iterable[str],
+        files: Iterable[FileAttachment],
+        nsjail_args: Iterable[str],
+        timings: dict[str, float],
+        buffered: bool = False,
+    ) -> Generator[str, None, EvalResult]:
+        """Start a new jail to run Python with `run_args`, yielding its output unless buffered."""
+        nsjail_args = tuple(nsjail_args)
+        with ExitStack() as stack:
+            try:
+                blob_args = stack.enter_context(self._blob_mounts(files))
+            except FileWriteError as e:
+                log.info(f"Failed to mount file {e.path!r}.", exc_info=e.error)
+                return EvalResult([*self._argv_head, *nsjail_args], None, str(e))
+
+            nsj_log = stack.enter_context(NamedTemporaryFile())
+            fs = stack.enter_context(self._memfs(timings))
+            cgroup = stack.enter_context(self._cgroup())
+            args = self._cold_args(run_args, (*blob_args, *nsjail_args), nsj_log.name, fs, cgroup)
+
+            def start() -> subprocess.Popen:
+                return subprocess.Popen(
+                    args,
+                    stdout=subprocess.PIPE,
+                    stderr=subprocess.STDOUT,
+                    pass_fds=self._pass_fds,
+                )
+
+            result = yield from self._stream(
+                args,
+                fs,
+                nsj_log,
+                files,
+                start,
+                self._wall_time_limit(nsjail_args),
+                timings,
+                cgroup,
+                buffered,
             )
+            cleanup_start = time.monotonic()
+
+        metrics.observe_phase("cleanup", time.monotonic() - cleanup_start, timings)
+        return result
 
-        with NamedTemporaryFile() as nsj_log, MemFS(
+    def _cold_args(
+        self,
+        run_args: Iterable[str],
+        nsjail_args: Iterable[str],
+        log_path: str,
+        fs: MemFS,
+        cgroup: RunCgroup | None,
+    ) -> list[str]:
+        """Return the arguments to start a new jail with, which runs Python with `run_args`."""
+        return [
+            *self._argv_head,
+            "--log",
+            log_path,
+            # Mount `home` with Read/Write access
+            "--bindmount",
+            f"{fs.home}:home",
+            *(cgroup.nsjail_args if cgroup is not None else ()),
+            *nsjail_args,
+            *self._argv_exec,
+            # Filter out empty strings at start of run_args
+            # (causes issues with python cli)
+            *iter_lstrip(run_args),
+        ]
+
+    def _spawn_warm(self) -> WarmJail:
+        """Start a jail which imports `warm_imports` and then waits for the code to run."""
+        nsj_log = NamedTemporaryFile()
+        fs = MemFS(
             instance_size=self.memfs_instance_size,
             home=self.memfs_home,
             output=self.memfs_output,
-        ) as fs:
-            nsjail_args = (
-                # Mount `home` with Read/Write access
-                "--bindmount",
-                f"{fs.home}:home",
-                *nsjail_args,
+        )
+        cgroup = self._run_cgroup()
+        args = [
+            *self._argv_head,
+            "--log",
+            nsj_log.name,
+            "--bindmount",
+            f"{fs.home}:home",
+            *(cgroup.nsjail_args if cgroup is not None else ()),
+            # The clock only starts once the code is sent; see _stream_warm().
+            "--time_limit",
+            "0",
+            *self._argv_exec,
+            "-c",
+            BOOTSTRAP,
+            *self.warm_imports,
+        ]
+
+        try:
+            process = subprocess.Popen(
+                args,
+                stdin=subprocess.PIPE,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.STDOUT,
+                pass_fds=self._pass_fds,
             )
+        except BaseException:
+            fs.cleanup()
+            nsj_log.close()
+            if cgroup is not None:
+                cgroup.remove()
+            raise
 
-            args = [
-                self.nsjail_path,
-                "--config",
-                self.config_path,
-                "--log",
-                nsj_log.name,
-                *nsjail_args,
-                "--",
-                self.config.exec_bin.path,
-                *self.config.exec_bin.arg,
-                # Filter out empty strings at start of run_args
-                # (causes issues with python cli)
-                *iter_lstrip(run_args),
-            ]
-
-            # Write provided files if any
-            files_written: dict[Path, float] = {}
-            for file in files:
-                try:
-                    f_path = file.save_to(fs.home)
-                    # Allow file to be writable
-                    f_path.chmod(0o777)
-                    # Save the written at time to later check if it was modified
-                    files_written[f_path] = f_path.stat().st_mtime
-                    log.info(f"Created file at {(fs.home / file.path)!r}.")
-                except OSError as e:
-                    log.info(f"Failed to create file at {(fs.home / file.path)!r}.", exc_info=e)
-                    return EvalResult(
-                        args, None, f"{e.__class__.__name__}: Failed to create file '{file.path}'."
-                    )
+        return WarmJail(process, fs, nsj_log, args, cgroup)
 
-            msg = "Executing code..."
-            if DEBUG:
-                msg = f"{msg[:-3]} with the arguments {args}."
-            log.info(msg)
+    def _stream_warm(
+        self,
+        jail: WarmJail,
+        argv: list[str],
+        files: Iterable[FileAttachment],
+        timings: dict[str, float] | None = None,
+        buffered: bool = False,
+    ) -> Generator[str, None, EvalResult]:
+        """Run the interpreter arguments `argv` in a warm jail, yielding its output."""
+        # NsJail's own time limit is disabled in warm jails, so nsbox enforces it instead.
+        timeout = self.config.time_limit or self._wall_time_limit(())
+
+        with jail:
+            started = time.monotonic()
+            result = yield from self._stream(
+                [*jail.args, *argv],
+                jail.fs,
+                jail.nsj_log,
+                files,
+                lambda: jail.start(argv),
+                timeout,
+                timings,
+                jail.cgroup,
+                buffered,
+            )
+            cleanup_start = time.monotonic()
+
+        metrics.observe_phase("cleanup", time.monotonic() - cleanup_start, timings)
+        if (
+            result.returncode == 128 + signal.SIGTERM
+            and timeout is not None
+            and time.monotonic() - started >= timeout
+        ):
+            # Report the timeout the same way NsJail would have.
+            result.returncode = 128 + signal.SIGKILL
+        return result
+
+    def _write_files(
+        self,
+        args: list[str],
+        fs: MemFS,
+        files: Iterable[FileAttachment],
+        timings: dict[str, float] | None = None,
+    ) -> Snapshot | EvalResult:
+        """
+        Write `files` to the home directory of `fs`.
 
+        Returns:
+            A snapshot of the files written, to tell which of them the run changes, or the
+            failed result if a file couldn't be written.
+        """
+        with metrics.timed("files_write", timings):
             try:
-                nsjail = subprocess.Popen(
-                    args, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True
-                )
-            except ValueError:
-                return EvalResult(args, None, "ValueError: embedded null byte")
+                files_written = fs.write_files(files)
+            except FileWriteError as e:
+                log.info(f"Failed to create file at {(fs.home / e.path)!r}.", exc_info=e.error)
+                return EvalResult(args, None, str(e))
+        log.info(f"Created {len(files_written)} files in {fs.home!r}.")
+        return files_written
+
+    def _stream(
+        self,
+        args: list[str],
+        fs: MemFS,
+        nsj_log: IO[bytes],
+        files: Iterable[FileAttachment],
+        start: Callable[[], subprocess.Popen],
+        timeout: float | None,
+        timings: dict[str, float] | None = None,
+        cgroup: RunCgroup | None = None,
+        buffered: bool = False,
+    ) -> Generator[str, None, EvalResult]:
+        """
+        Write `files` to `fs`, start NsJail, and yield its output until it exits.
 
-            try:
-                output = self._consume_stdout(nsjail)
-            except UnicodeDecodeError:
-                return EvalResult(args, None, "UnicodeDecodeError: invalid Unicode in output pipe")
+        If `buffered` is True, the output is read into a single buffer of `output_limit` bytes
+        and decoded once NsJail exits instead, and nothing is yielded. It is then the `stdout`
+        of the result, unless the evaluation failed.
 
-            # When you send signal `N` to a subprocess to terminate it using Popen, it
-            # will return `-N` as its exit code. As we normally get `N + 128` back, we
-            # convert negative exit codes to the `N + 128` form.
-            returncode = -nsjail.returncode + 128 if nsjail.returncode < 0 else nsjail.returncode
+        Args:
+            args: Arguments NsJail is started with, as reported in the result.
+            fs: The MemFS instance mounted as the home directory of the jail.
+            nsj_log: The file NsJail writes its log to.
+            files: FileAttachments to write to the sandbox prior to running Python.
+            start: Function which starts the NsJail subprocess.
+            timeout: Time in seconds after which nsbox terminates NsJail.
+            timings: Dict to record the duration of each phase in.
+            cgroup: The cgroup NsJail creates its cgroup in, to read the resource usage from.
+            buffered: Whether to return the output in the result rather than yield it.
+        """
+        files_written = self._write_files(args, fs, files, timings)
+        if isinstance(files_written, EvalResult):
+            return files_written
 
-            # Parse attachments with time limit
-            try:
-                with time_limit(self.files_timeout):
-                    attachments = fs.files_list(
-                        limit=self.files_limit,
-                        pattern=self.files_pattern,
-                        preload_dict=True,
-                        exclude_files=files_written,
-                        timeout=self.files_timeout,
-                    )
-                log.info(f"Found {len(attachments)} files.")
-            except RecursionError:
-                log.info("Recursion error while parsing attachments")
-                return EvalResult(
-                    args,
-                    None,
-                    "FileParsingError: Exceeded directory depth limit while parsing attachments",
-                )
-            except TimeoutError as e:
-                log.info(f"Exceeded time limit while parsing attachments: {e}")
-                return EvalResult(
-                    args, None, "TimeoutError: Exceeded time limit while parsing attachments"
-                )
-            except Exception as e:
-                log.exception(f"Unexpected {type(e).__name__} while parse attachments", exc_info=e)
-                return EvalResult(
-                    args, None, "FileParsingError: Unknown error while parsing attachments"
+        msg = "Executing code..."
+        if DEBUG:
+            msg = f"{msg[:-3]} with the arguments {args}."
+        log.info(msg)
+
+        started = time.monotonic()
+        try:
+            with metrics.timed("nsjail_start", timings):
+                nsjail = start()
+        except ValueError:
+            return EvalResult(args, None, "ValueError: embedded null byte")
+
+        # Only the start of the output is kept, in case it is needed to parse NsJail's logs.
+        head = ""
+        output = None
+        try:
+            if buffered:
+                output, stdout = self._consume_stdout(nsjail, timeout)
+                head = output
+            else:
+                reader = self._iter_stdout(nsjail, timeout)
+                while True:
+                    try:
+                        chars = next(reader)
+                    except StopIteration as e:
+                        stdout = e.value
+                        break
+                    head = head or chars
+                    yield chars
+        except UnicodeDecodeError:
+            return EvalResult(args, None, "UnicodeDecodeError: invalid Unicode in output pipe")
+
+        # Both include the start of NsJail; the output is captured until STDOUT is closed,
+        # after which NsJail is reaped.
+        metrics.observe_phase("stdout", stdout.closed - started, timings)
+        metrics.observe_phase("execution", time.monotonic() - started, timings)
+
+        # When you send signal `N` to a subprocess to terminate it using Popen, it
+        # will return `-N` as its exit code. As we normally get `N + 128` back, we
+        # convert negative exit codes to the `N + 128` form.
+        returncode = -nsjail.returncode + 128 if nsjail.returncode < 0 else nsjail.returncode
+
+        result = self._result(
+            args, returncode, stdout, head, fs, nsj_log, files_written, timings, cgroup
+        )
+        if result.stdout is None:
+            result.stdout = output
+        return result
+
+    def _result(
+        self,
+        args: list[str],
+        returncode: int,
+        stdout: _StdoutResult,
+        head: str,
+        fs: MemFS,
+        nsj_log: IO[bytes],
+        files_written: Snapshot,
+        timings: dict[str, float] | None = None,
+        cgroup: RunCgroup | None = None,
+    ) -> EvalResult:
+        """
+        Collect the attachments, parse the log, and return the result of a jail which exited.
+
+        Args:
+            args: Arguments NsJail was started with.
+            returncode: The return code of NsJail, in the `N + 128` form if it was signalled.
+            stdout: How reading the output ended.
+            head: The start of the output, in case it holds NsJail's log.
+            fs: The MemFS instance mounted as the home directory of the jail.
+            nsj_log: The file NsJail wrote its log to.
+            files_written: A snapshot of the files written before the run.
+            timings: Dict to record the duration of each phase in.
+            cgroup: The cgroup NsJail created its cgroup in, to read the resource usage from.
+        """
+        # Attachments get whatever the output left of the response size limit.
+        files_budget = None
+        if self.max_response_size is not None:
+            files_budget = max(self.max_response_size - stdout.size, 0)
+
+        # Parse attachments with time limit
+        skipped: list[SkippedFile] = []
+        try:
+            with metrics.timed("attachments", timings):
+                attachments = fs.files_list(
+                    limit=self.files_limit,
+                    pattern=self.files_pattern,
+                    exclude_files=files_written,
+                    deadline=Deadline(self.files_timeout or None),
+                    max_bytes=self.files_max_bytes,
+                    max_encoded_size=files_budget,
+                    skipped=skipped,
+                    max_depth=self.files_max_depth,
+                    max_entries=self.files_max_entries,
                 )
+            log.info(f"Found {len(attachments)} files, skipped {len(skipped)}.")
+        except WalkLimitError as e:
+            log.info(f"Exceeded {e} while parsing attachments")
+            return EvalResult(
+                args, None, f"FileParsingError: Exceeded {e} while parsing attachments"
+            )
+        except TimeoutError as e:
+            log.info(f"Exceeded time limit while parsing attachments: {e}")
+            return EvalResult(
+                args, None, "TimeoutError: Exceeded time limit while parsing attachments"
+            )
+        except Exception as e:
+            log.exception(f"Unexpected {type(e).__name__} while parse attachments", exc_info=e)
+            return EvalResult(
+                args, None, "FileParsingError: Unknown error while parsing attachments"
+            )
 
-            log_lines = nsj_log.read().decode("utf-8").splitlines()
-            if not log_lines and returncode == 255:
-                # NsJail probably failed to parse arguments so log output will still be in stdout
-                log_lines = output.splitlines()
+        log_lines = nsj_log.read().decode("utf-8").splitlines()
+        if not log_lines and returncode == 255:
+            # NsJail probably failed to parse arguments so log output will still be in stdout
+            log_lines = head.splitlines()
 
-            self._parse_log(log_lines)
+        self._parse_log(log_lines)
 
         log.info(f"nsjail return code: {returncode}")
 
-        return EvalResult(args, returncode, output, files=attachments)
\ No newline at end of file
+        usage = _usage_dict(stdout.usage) if stdout.usage is not None else None
+        if cgroup is not None:
+            usage = {**(usage or {}), **cgroup.stats()}
+        return EvalResult(
+            args,
+            returncode,
+            None,
+            files=attachments,
+            usage=usage,
+            truncated=stdout.truncated,
+            skipped_files=skipped,
+        )
@@ -2,9 +2,9 @@
 from collections.abc import Sequence
 from os import PathLike
 from subprocess import CompletedProcess
-from typing import TypeVar
+from typing import Any, TypeVar
 
-from nsbox.nsio import FileAttachment
+from nsbox.nsio import FileAttachment, SkippedFile
 
 _T = TypeVar("_T")
 ArgType = (
@@ -26,7 +26,47 @@ class EvalResult(CompletedProcess[_T]):
         stdout: _T | None = None,
         stderr: _T | None = None,
         files: list[FileAttachment] | None = None,
+        timings: dict[str, float] | None = None,
+        usage: dict[str, float] | None = None,
+        truncated: bool = False,
+        skipped_files: list[SkippedFile] | None = None,
     ) -> None:
-        """Create an evaluation result."""
+        """
+        Create an evaluation result.
+
+        Args:
+            args: The arguments NsJail was started with.
+            returncode: The return code of NsJail, or None if it failed to run.
+            stdout: The output of the evaluation, or an error message.
+            stderr: Unused; STDERR is redirected to STDOUT.
+            files: Files attached to the result.
+            timings: Duration in seconds of each phase of the evaluation.
+            usage: Resource usage of NsJail and the sandboxed processes.
+            truncated: Whether the output was cut off at the size limit.
+            skipped_files: Files left out of the result due to the size limits.
+        """
         super().__init__(args, returncode, stdout, stderr)
         self.files: list[FileAttachment] = files or []
+        self.timings: dict[str, float] = timings or {}
+        self.usage = usage
+        self.truncated = truncated
+        self.skipped_files: list[SkippedFile] = skipped_files or []
+
+    @property
+    def dropped(self) -> dict[str, Any] | None:
+        """What was left out of the result as returned by the API, or None if nothing was."""
+        if not self.truncated and not self.skipped_files:
+            return None
+        return {"stdout": self.truncated, "files": [f.as_dict for f in self.skipped_files]}
+
+    @property
+    def as_dict(self) -> dict[str, Any]:
+        """Convert the result to a dict as returned by the API."""
+        result = {
+            "stdout": self.stdout,
+            "returncode": self.returncode,
+            "files": [f.as_dict for f in self.files],
+        }
+        if (dropped := self.dropped) is not None:
+            result["truncated"] = dropped
+        return result
@@ -1,3 +1,3 @@
-from . import cgroup, logging, swap, timed
+from . import cgroup, logging, metrics, probe, snapshot, swap, timed, walk
 
-__all__ = ("cgroup", "logging", "swap", "timed")
+__all__ = ("cgroup", "logging", "metrics", "probe", "snapshot", "swap", "timed", "walk")
@@ -1,11 +1,65 @@
+from __future__ import annotations
+
 import logging
+import uuid
 from pathlib import Path
+from types import TracebackType
+from typing import NamedTuple, Type
 
 from nsbox.config_pb2 import NsJailConfig
 
 log = logging.getLogger(__name__)
 
-__all__ = ("get_version", "init", "init_v1", "init_v2")
+__all__ = ("RunCgroup", "get_version", "init", "init_v1", "init_v2")
+
+# Name of the cgroupv2 child under which the cgroups of individual runs are created.
+RUN_CGROUPS_V2 = "NSBOX"
+
+
+class _V1Controller(NamedTuple):
+    """A cgroupv1 controller used by NsJail."""
+
+    mount: str
+    parent: str
+    option: str
+    """NsJail command line option which sets the parent cgroup."""
+
+
+def _v1_controllers(config: NsJailConfig) -> dict[str, _V1Controller]:
+    """
+    Return the cgroupv1 controllers in-use by the NsJail config.
+
+    A controller is in-use if any of its settings (except the mount and parent) have a non-default
+    value in the NsJail config.
+    """
+    # If the config doesn't "have" a value, then it's set to the default value, which means the
+    # controller is not being used.
+    controllers = {}
+    if config.HasField("cgroup_cpu_ms_per_sec"):
+        controllers["cpu"] = _V1Controller(
+            config.cgroup_cpu_mount, config.cgroup_cpu_parent, "--cgroup_cpu_parent"
+        )
+
+    if (
+        config.HasField("cgroup_mem_max")
+        or config.HasField("cgroup_mem_memsw_max")
+        or config.HasField("cgroup_mem_swap_max")
+    ):
+        controllers["memory"] = _V1Controller(
+            config.cgroup_mem_mount, config.cgroup_mem_parent, "--cgroup_mem_parent"
+        )
+
+    if config.HasField("cgroup_net_cls_classid"):
+        controllers["net_cls"] = _V1Controller(
+            config.cgroup_net_cls_mount, config.cgroup_net_cls_parent, "--cgroup_net_cls_parent"
+        )
+
+    if config.HasField("cgroup_pids_max"):
+        controllers["pids"] = _V1Controller(
+            config.cgroup_pids_mount, config.cgroup_pids_parent, "--cgroup_pids_parent"
+        )
+
+    return controllers
 
 
 def get_version(config: NsJailConfig) -> int:
@@ -73,27 +127,8 @@ def init_v1(config: NsJailConfig) -> None:
     NsJail doesn't do this automatically because it requires privileges NsJail usually doesn't
     have.
     """
-    # If the config doesn't "have" a value, then it's set to the default value, which means the
-    # controller is not being used.
-    if config.HasField("cgroup_cpu_ms_per_sec"):
-        pids = Path(config.cgroup_cpu_mount, config.cgroup_cpu_parent)
-        pids.mkdir(parents=True, exist_ok=True)
-
-    if (
-        config.HasField("cgroup_mem_max")
-        or config.HasField("cgroup_mem_memsw_max")
-        or config.HasField("cgroup_mem_swap_max")
-    ):
-        mem = Path(config.cgroup_mem_mount, config.cgroup_mem_parent)
-        mem.mkdir(parents=True, exist_ok=True)
-
-    if config.HasField("cgroup_net_cls_classid"):
-        net_cls = Path(config.cgroup_net_cls_mount, config.cgroup_net_cls_parent)
-        net_cls.mkdir(parents=True, exist_ok=True)
-
-    if config.HasField("cgroup_pids_max"):
-        pids = Path(config.cgroup_pids_mount, config.cgroup_pids_parent)
-        pids.mkdir(parents=True, exist_ok=True)
+    for controller in _v1_controllers(config).values():
+        Path(controller.mount, controller.parent).mkdir(parents=True, exist_ok=True)
 
 
 def init_v2(config: NsJailConfig) -> None:
@@ -121,3 +156,187 @@ def init_v2(config: NsJailConfig) -> None:
     controllers = (cgroup_mount / "cgroup.controllers").read_text().split()
     for controller in controllers:
         (cgroup_mount / "cgroup.subtree_control").write_text(f"+{controller}")
+
+
+def _read_int(path: Path) -> int | None:
+    """Return the integer in a cgroup file, or None if it doesn't exist or can't be parsed."""
+    try:
+        return int(path.read_text())
+    except (OSError, ValueError):
+        return None
+
+
+def _read_keyed(path: Path) -> dict[str, int]:
+    """Return the "key value" pairs in a flat keyed cgroup file, or an empty dict on error."""
+    try:
+        lines = path.read_text().splitlines()
+    except OSError:
+        return {}
+
+    values = {}
+    for line in lines:
+        key, _, value = line.partition(" ")
+        try:
+            values[key] = int(value)
+        except ValueError:
+            continue
+    return values
+
+
+def _read_io_stat(path: Path) -> dict[str, int]:
+    """Return the bytes read and written summed across devices from a cgroupv2 io.stat file."""
+    try:
+        lines = path.read_text().splitlines()
+    except OSError:
+        return {}
+
+    totals = {"rbytes": 0, "wbytes": 0}
+    for line in lines:
+        # MAJ:MIN rbytes=... wbytes=... rios=... wios=... dbytes=... dios=...
+        for field in line.split()[1:]:
+            key, _, value = field.partition("=")
+            if key in totals and value.isdigit():
+                totals[key] += int(value)
+    return totals
+
+
+def _enable_controllers(path: Path) -> None:
+    """Enable all controllers available in the cgroupv2 `path` for its children."""
+    available = set((path / "cgroup.controllers").read_text().split())
+    enabled = set((path / "cgroup.subtree_control").read_text().split())
+    for controller in sorted(available - enabled):
+        (path / "cgroup.subtree_control").write_text(f"+{controller}")
+
+
+class RunCgroup:
+    """
+    A cgroup dedicated to a single run, under which NsJail creates its own cgroup.
+
+    NsJail removes its cgroup once the sandboxed process exits, and with it the cgroup's stats.
+    The stats of a cgroup include those of its descendants, even after they are removed, so
+    nesting NsJail's cgroup in one per run allows reading the run's stats once NsJail exits.
+
+    For cgroupv1, a cgroup is created for each controller in-use by the NsJail config.
+    """
+
+    # Stats which only ever increase, as opposed to peaks.
+    COUNTERS = ("cpu_time", "io_read_bytes", "io_write_bytes", "oom_kills")
+
+    def __init__(self, config: NsJailConfig, version: int):
+        """
+        Initialize the cgroup without creating it.
+
+        Args:
+            config: The NsJail config, from which the mounts and parents are read.
+            version: The cgroup version in use; see `get_version`.
+        """
+        self.version = version
+        self.name = f"NSBOX.{uuid.uuid4().hex}"
+        self._baseline: dict[str, float] = {}
+
+        if version == 2:
+            path = Path(config.cgroupv2_mount, RUN_CGROUPS_V2, self.name)
+            self.paths = [path]
+            self.nsjail_args: tuple[str, ...] = ("--cgroupv2_mount", str(path))
+        else:
+            controllers = _v1_controllers(config).values()
+            self.paths = [Path(c.mount, c.parent, self.name) for c in controllers]
+            self.nsjail_args = tuple(
+                arg for c in controllers for arg in (c.option, f"{c.parent}/{self.name}")
+            )
+
+    def __repr__(self) -> str:
+        return f"<{self.__class__.__name__} version={self.version} name={self.name!r}>"
+
+    def __enter__(self) -> RunCgroup:
+        self.create()
+        return self
+
+    def __exit__(
+        self,
+        exc_type: Type[BaseException] | None,
+        exc_value: BaseException | None,
+        exc_tb: TracebackType | None,
+    ) -> None:
+        self.remove()
+
+    def create(self) -> None:
+        """
+        Create the cgroup, and for cgroupv2, enable all available controllers for its children.
+
+        Raises:
+            OSError: If the cgroup could not be created.
+        """
+        try:
+            for path in self.paths:
+                if self.version == 2:
+                    path.parent.mkdir(exist_ok=True)
+                    _enable_controllers(path.parent)
+                path.mkdir()
+                if self.version == 2:
+                    _enable_controllers(path)
+        except BaseException:
+            self.remove()
+            raise
+
+    def reset(self) -> None:
+        """Only count usage from now on in the counters returned by `stats`; peaks are kept."""
+        self._baseline = {}
+        stats = self.stats()
+        self._baseline = {key: stats[key] for key in self.COUNTERS if key in stats}
+
+    def stats(self) -> dict[str, float]:
+        """
+        Return the resource usage of the processes which ran in the cgroup.
+
+        Stats which the kernel or the in-use controllers don't provide are left out. Keys:
+
+        - cpu_time: CPU time in seconds.
+        - memory_peak: Peak memory usage in bytes.
+        - oom_kills: Number of processes killed by the OOM killer.
+        - pids_peak: Peak number of processes.
+        - io_read_bytes, io_write_bytes: Bytes read from and written to block devices (v2 only).
+        """
+        stats: dict[str, float] = {}
+        if self.version == 2:
+            path = self.paths[0]
+            if (usage := _read_keyed(path / "cpu.stat").get("usage_usec")) is not None:
+                stats["cpu_time"] = usage / 1_000_000
+            if (peak := _read_int(path / "memory.peak")) is not None:
+                stats["memory_peak"] = peak
+            if (oom_kills := _read_keyed(path / "memory.events").get("oom_kill")) is not None:
+                stats["oom_kills"] = oom_kills
+            if io := _read_io_stat(path / "io.stat"):
+                stats["io_read_bytes"] = io["rbytes"]
+                stats["io_write_bytes"] = io["wbytes"]
+        else:
+            for path in self.paths:
+                # The cpuacct controller may be mounted along with the cpu controller.
+                if (usage := _read_int(path / "cpuacct.usage")) is not None:
+                    stats["cpu_time"] = usage / 1_000_000_000
+                if (peak := _read_int(path / "memory.max_usage_in_bytes")) is not None:
+                    stats["memory_peak"] = peak
+                oom_kills = _read_keyed(path / "memory.oom_control").get("oom_kill")
+                if oom_kills is not None:
+                    stats["oom_kills"] = oom_kills
+
+        for path in self.paths:
+            if (peak := _read_int(path / "pids.peak")) is not None:
+                stats["pids_peak"] = peak
+
+        for key, value in self._baseline.items():
+            if key in stats:
+                stats[key] -= value
+        return stats
+
+    def remove(self) -> None:
+        """Remove the cgroup, along with any cgroup NsJail left behind in it."""
+        for path in self.paths:
+            try:
+                for child in path.glob("NSJAIL.*"):
+                    child.rmdir()
+                path.rmdir()
+            except FileNotFoundError:
+                pass
+            except OSError as e:
+                log.warning(f"Failed to remove the cgroup {str(path)!r}: {e}")
@@ -5,7 +5,7 @@ from gunicorn.config import Config
 
 from nsbox import DEBUG
 
-from .logging import FORMAT
+from .logging import FORMAT, RunIdFilter
 
 __all__ = ("GunicornLogger",)
 
@@ -21,6 +21,8 @@ class GunicornLogger(glogging.Logger):
         """
         Set up loggers and set error logger's level to DEBUG if the DEBUG env var is set.
 
+        Also add the run ID to the records of every handler, as the format expects it.
+
         Note: Access and syslog handlers would need to be recreated to use a custom date format
         because they are created with an unspecified datefmt argument by default.
         """
@@ -32,3 +34,7 @@ class GunicornLogger(glogging.Logger):
             self.loglevel = self.LOG_LEVELS.get(cfg.loglevel.lower(), logging.INFO)
 
         self.error_log.setLevel(self.loglevel)
+
+        # The format includes the run ID.
+        for handler in (*self.error_log.handlers, *self.access_log.handlers):
+            handler.addFilter(RunIdFilter())
@@ -1,10 +1,39 @@
 import logging
 import os
 import sys
+from collections.abc import Generator
+from contextlib import contextmanager
+from contextvars import ContextVar
+from uuid import uuid4
 
-__all__ = ("FORMAT", "init_logger", "init_sentry")
+__all__ = ("FORMAT", "RunIdFilter", "init_logger", "init_sentry", "run_id")
 
-FORMAT = "%(asctime)s | %(process)5s | %(name)30s | %(levelname)8s | %(message)s"
+FORMAT = "%(asctime)s | %(process)5s | %(run_id)8s | %(name)30s | %(levelname)8s | %(message)s"
+
+# ID of the evaluation the current thread or task is running, to tell apart the log records
+# of concurrent evaluations.
+_run_id: ContextVar[str] = ContextVar("run_id", default="-")
+
+
+@contextmanager
+def run_id(id_: str | None = None) -> Generator[str, None, None]:
+    """Set the run ID added to log records within the context. Generate one if not given."""
+    # Not reset with a token, as generators may be closed from another context.
+    previous = _run_id.get()
+    _run_id.set(id_ or uuid4().hex[:8])
+    try:
+        yield _run_id.get()
+    finally:
+        _run_id.set(previous)
+
+
+class RunIdFilter(logging.Filter):
+    """Add the ID of the current run to log records as `run_id`; see `run_id`."""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        """Add the run ID to `record`, letting every record through."""
+        record.run_id = _run_id.get()
+        return True
 
 
 def init_logger(debug: bool) -> None:
@@ -16,6 +45,7 @@ def init_logger(debug: bool) -> None:
     formatter = logging.Formatter(FORMAT)
     handler = logging.StreamHandler(sys.stdout)
     handler.setFormatter(formatter)
+    handler.addFilter(RunIdFilter())
     log.addHandler(handler)
 
 
@@ -0,0 +1,154 @@
+"""
+Prometheus metrics, if prometheus_client is installed.
+
+When the `PROMETHEUS_MULTIPROC_DIR` environment variable is set, metrics are written to files
+in that directory, so that those of every Gunicorn worker can be collected together. It must be
+set before this module is first imported; see config/gunicorn.conf.py.
+"""
+import logging
+import os
+import time
+from collections.abc import Generator
+from contextlib import contextmanager, nullcontext
+from pathlib import Path
+
+from nsbox.process import EvalResult
+
+try:
+    import prometheus_client
+    from prometheus_client import multiprocess
+except ImportError:
+    prometheus_client = None
+
+__all__ = (
+    "ATTACHMENT_BYTES",
+    "ATTACHMENTS",
+    "CONTENT_TYPE",
+    "ENABLED",
+    "JOBS_QUEUED",
+    "JOBS_RUNNING",
+    "OUTPUT_TRUNCATIONS",
+    "PHASE_SECONDS",
+    "RETURNCODES",
+    "clear_multiprocess_dir",
+    "generate",
+    "mark_process_dead",
+    "observe_phase",
+    "observe_result",
+    "timed",
+)
+
+log = logging.getLogger(__name__)
+
+ENABLED = prometheus_client is not None
+MULTIPROC_DIR = os.environ.get("PROMETHEUS_MULTIPROC_DIR")
+CONTENT_TYPE = prometheus_client.CONTENT_TYPE_LATEST if ENABLED else "text/plain"
+
+if ENABLED and MULTIPROC_DIR:
+    Path(MULTIPROC_DIR).mkdir(parents=True, exist_ok=True)
+
+
+class _NoOpMetric:
+    """Stand-in for a metric when prometheus_client isn't installed."""
+
+    def __init__(self, *args, **kwargs):
+        pass
+
+    def labels(self, *args, **kwargs) -> "_NoOpMetric":
+        return self
+
+    def inc(self, amount: float = 1) -> None:
+        pass
+
+    def dec(self, amount: float = 1) -> None:
+        pass
+
+    def set(self, value: float) -> None:
+        pass
+
+    def observe(self, value: float) -> None:
+        pass
+
+    def time(self) -> nullcontext:
+        return nullcontext()
+
+
+if ENABLED:
+    from prometheus_client import Counter, Gauge, Histogram
+else:
+    Counter = Gauge = Histogram = _NoOpMetric
+
+PHASE_SECONDS = Histogram(
+    "nsbox_phase_seconds",
+    "Time spent in each phase of an evaluation.",
+    ["phase"],
+    buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30),
+)
+RETURNCODES = Counter("nsbox_returncodes", "Evaluations by return code.", ["returncode"])
+OUTPUT_TRUNCATIONS = Counter(
+    "nsbox_output_truncations", "Evaluations whose output exceeded the limit."
+)
+ATTACHMENTS = Histogram(
+    "nsbox_attachments",
+    "Number of files attached to the result of an evaluation.",
+    buckets=(0, 1, 2, 5, 10, 25, 50, 100),
+)
+ATTACHMENT_BYTES = Histogram(
+    "nsbox_attachment_bytes",
+    "Total size of the files attached to the result of an evaluation.",
+    buckets=(0, 1024, 16 * 1024, 128 * 1024, 1024**2, 4 * 1024**2, 16 * 1024**2),
+)
+JOBS_QUEUED = Gauge("nsbox_jobs_queued", "Jobs waiting to run.", multiprocess_mode="livesum")
+JOBS_RUNNING = Gauge("nsbox_jobs_running", "Jobs currently running.", multiprocess_mode="livesum")
+
+
+def observe_phase(phase: str, seconds: float, timings: dict[str, float] | None = None) -> None:
+    """Record the duration of a phase of an evaluation, and add it to `timings` if given."""
+    PHASE_SECONDS.labels(phase).observe(seconds)
+    if timings is not None:
+        timings[phase] = seconds
+
+
+@contextmanager
+def timed(phase: str, timings: dict[str, float] | None = None) -> Generator[None, None, None]:
+    """Measure the duration of a phase of an evaluation; see `observe_phase`."""
+    start = time.monotonic()
+    try:
+        yield
+    finally:
+        observe_phase(phase, time.monotonic() - start, timings)
+
+
+def observe_result(result: EvalResult) -> None:
+    """Count the return code and the attachments of an evaluation result."""
+    RETURNCODES.labels(str(result.returncode)).inc()
+    ATTACHMENTS.observe(len(result.files))
+    ATTACHMENT_BYTES.observe(sum(file.size for file in result.files))
+
+
+def generate() -> bytes:
+    """Return the metrics of all processes in the Prometheus text format."""
+    if not ENABLED:
+        return b""
+
+    if MULTIPROC_DIR:
+        registry = prometheus_client.CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = prometheus_client.REGISTRY
+    return prometheus_client.generate_latest(registry)
+
+
+def clear_multiprocess_dir() -> None:
+    """Remove metrics left behind by processes of a previous run."""
+    if not ENABLED or not MULTIPROC_DIR:
+        return
+
+    for path in Path(MULTIPROC_DIR).glob("*.db"):
+        path.unlink(missing_ok=True)
+
+
+def mark_process_dead(pid: int) -> None:
+    """Discard the live gauges of a process which has exited."""
+    if ENABLED and MULTIPROC_DIR:
+        multiprocess.mark_process_dead(pid)
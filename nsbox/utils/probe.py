@@ -0,0 +1,111 @@
+"""Parsing of NsJail configs and probing of the host for them, done once per process tree."""
+from __future__ import annotations
+
+import hashlib
+import logging
+import os
+import sys
+import threading
+from dataclasses import dataclass
+from pathlib import Path
+
+from google.protobuf import text_format
+
+from nsbox.config_pb2 import NsJailConfig
+from nsbox.languages import LanguageRegistry
+
+from . import cgroup, swap
+
+__all__ = ("ConfigProbe", "clear", "probe", "probe_languages", "read_config")
+
+log = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class ConfigProbe:
+    """An NsJail config, and how the cgroups of the host were set up for it."""
+
+    config: NsJailConfig
+    digest: str
+    """Identifies the config, e.g. to tell apart cached results of different configs."""
+    cgroup_version: int
+    ignore_swap_limits: bool
+
+
+# Probes by the real path of their config, along with the modification time and size of the
+# file when it was read. Forked processes inherit the probes made before the fork.
+_probes: dict[str, tuple[tuple[int, int] | None, ConfigProbe]] = {}
+_lock = threading.Lock()
+
+
+def _stamp(path: str) -> tuple[int, int] | None:
+    """Return the modification time and size of a file, or None if it can't be stat'd."""
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return stat.st_mtime_ns, stat.st_size
+
+
+def read_config(config_path: str | Path) -> NsJailConfig:
+    """Read the NsJail config at `config_path` and return a protobuf Message object."""
+    config = NsJailConfig()
+
+    try:
+        with open(config_path, encoding="utf-8") as f:
+            config_text = f.read()
+    except FileNotFoundError:
+        log.fatal(f"The NsJail config at {str(config_path)!r} could not be found.")
+        sys.exit(1)
+    except OSError as e:
+        log.fatal(f"The NsJail config at {str(config_path)!r} could not be read.", exc_info=e)
+        sys.exit(1)
+
+    try:
+        text_format.Parse(config_text, config)
+    except text_format.ParseError as e:
+        log.fatal(f"The NsJail config at {str(config_path)!r} could not be parsed.", exc_info=e)
+        sys.exit(1)
+
+    return config
+
+
+def probe(config_path: str | Path) -> ConfigProbe:
+    """
+    Parse the NsJail config at `config_path`, and set up the cgroups of the host for it.
+
+    This only happens the first time a config is probed in the process, or again once its file
+    has changed. Afterwards, the same probe is returned, including to processes forked later on;
+    probing in the Gunicorn master spares every worker from doing it when it boots.
+
+    The config of the probe is shared, so it must not be modified.
+    """
+    path = os.path.realpath(config_path)
+    with _lock:
+        stamp = _stamp(path)
+        if (cached := _probes.get(path)) is not None and cached[0] == stamp:
+            return cached[1]
+
+        config = read_config(config_path)
+        digest = hashlib.sha256(config.SerializeToString(deterministic=True)).hexdigest()
+        cgroup_version = cgroup.init(config)
+        ignore_swap_limits = swap.should_ignore_limit(config, cgroup_version)
+        log.info(f"Assuming cgroup version {cgroup_version} for {str(config_path)!r}.")
+
+        result = ConfigProbe(config, digest, cgroup_version, ignore_swap_limits)
+        _probes[path] = (stamp, result)
+        return result
+
+
+def probe_languages(languages_dir: str | Path = "./config/languages") -> dict[str, ConfigProbe]:
+    """Probe the NsJail config of every language defined in `languages_dir`; see `probe`."""
+    registry = LanguageRegistry.from_dir(
+        languages_dir, lambda language: probe(language.config_path)
+    )
+    return {name: registry.get(name) for name in registry.names}
+
+
+def clear() -> None:
+    """Forget all probes, so that configs are probed again when next used."""
+    with _lock:
+        _probes.clear()
@@ -0,0 +1,113 @@
+"""Snapshots of files, to tell which ones were changed since."""
+from __future__ import annotations
+
+import hashlib
+import os
+from typing import NamedTuple
+
+__all__ = ("FileState", "Snapshot", "HASH_SIZE")
+
+# Files up to this size are also compared by content, since the clock which sets modified times
+# may be too coarse to tell apart writes in quick succession.
+HASH_SIZE = 64 * 1024
+
+
+def _digest(content: bytes | memoryview) -> bytes:
+    return hashlib.blake2b(content, digest_size=16).digest()
+
+
+class FileState(NamedTuple):
+    """The identity and version of a file, as recorded in a snapshot."""
+
+    ino: int
+    size: int
+    mtime_ns: int
+    digest: bytes | None = None
+    """Hash of the content, for small files only."""
+
+
+class Snapshot:
+    """
+    The states of files by path, taken to tell which of them changed since.
+
+    A file is considered changed if it was replaced, its size differs, or, for files larger
+    than `hash_size`, its modified time differs. Smaller files are compared by their content
+    instead of their modified time, which makes the comparison exact.
+
+    Examples:
+        >>> snapshot = Snapshot()
+        >>> snapshot.add(path, content, os.stat(path))
+        >>> ...
+        >>> snapshot.changed(path, os.stat(path))
+    """
+
+    def __init__(self, hash_size: int = HASH_SIZE) -> None:
+        """
+        Create an empty snapshot.
+
+        Args:
+            hash_size: Size in bytes up to which files are compared by content.
+        """
+        self.hash_size = hash_size
+        self.files: dict[str, FileState] = {}
+
+    def __repr__(self) -> str:
+        return f"<{self.__class__.__name__} files={len(self.files)}>"
+
+    def __len__(self) -> int:
+        return len(self.files)
+
+    def __contains__(self, path: str | os.PathLike[str]) -> bool:
+        return os.path.normpath(path) in self.files
+
+    def add(
+        self,
+        path: str | os.PathLike[str],
+        content: bytes | memoryview | None = None,
+        stat: os.stat_result | None = None,
+    ) -> FileState:
+        """
+        Record the current state of the file at `path`.
+
+        Args:
+            path: Path of the file.
+            content: The content of the file if known, e.g. as it was just written. Otherwise,
+                the file is read if it is small enough to be compared by content.
+            stat: The stat result of the file if known, to save a system call.
+        """
+        path = os.path.normpath(path)
+        if stat is None:
+            stat = os.stat(path)
+
+        digest = None
+        if stat.st_size <= self.hash_size:
+            digest = _digest(self._read(path) if content is None else content)
+
+        state = FileState(stat.st_ino, stat.st_size, stat.st_mtime_ns, digest)
+        self.files[path] = state
+        return state
+
+    def changed(self, path: str | os.PathLike[str], stat: os.stat_result | None = None) -> bool:
+        """
+        Return whether the file at `path` changed since it was added, or wasn't added at all.
+
+        Args:
+            path: Path of the file.
+            stat: The current stat result of the file if known, to save a system call.
+        """
+        path = os.path.normpath(path)
+        if (state := self.files.get(path)) is None:
+            return True
+
+        if stat is None:
+            stat = os.stat(path)
+        if stat.st_ino != state.ino or stat.st_size != state.size:
+            return True
+        if state.digest is None:
+            return stat.st_mtime_ns != state.mtime_ns
+        return _digest(self._read(path)) != state.digest
+
+    def _read(self, path: str) -> bytes:
+        """Read at most `hash_size` bytes of a file; any more means it changed."""
+        with open(path, "rb") as f:
+            return f.read(self.hash_size + 1)
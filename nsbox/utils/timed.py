@@ -1,34 +1,87 @@
-"""Calling functions with time limits."""
-import signal
-from collections.abc import Generator
-from contextlib import contextmanager
-from typing import TypeVar
+"""Deadlines for operations which must finish in time."""
+from __future__ import annotations
 
-_T = TypeVar("_T")
-_V = TypeVar("_V")
+import threading
+import time
 
-__all__ = ("time_limit",)
+__all__ = ("Deadline",)
 
 
-@contextmanager
-def time_limit(timeout: int | None = None) -> Generator[None, None, None]:
+class Deadline:
     """
-    Decorator to call a function with a time limit.
+    A point in time by which an operation must finish, which may also be cancelled early.
 
-    Args:
-        timeout: Timeout limit in seconds.
+    Unlike a signal-based alarm, a deadline works in any thread and with sub-second precision,
+    but it is cooperative: the operation must call `check` regularly, e.g. once per item
+    it processes. Any thread may `cancel` the deadline to make the next `check` fail.
 
-    Raises:
-        TimeoutError: If the function call takes longer than `timeout` seconds.
+    Examples:
+        >>> deadline = Deadline(0.5)
+        >>> for item in items:
+        ...     deadline.check()
+        ...     process(item)
     """
 
-    def signal_handler(_signum, _frame):
-        raise TimeoutError(f"time_limit call timed out after {timeout} seconds.")
+    def __init__(self, timeout: float | None = None) -> None:
+        """
+        Start the deadline.
 
-    signal.signal(signal.SIGALRM, signal_handler)
-    signal.alarm(timeout)
+        Args:
+            timeout: Time in seconds from now until the deadline, or None for no deadline.
+        """
+        self.timeout = timeout
+        self.expires = None if timeout is None else time.monotonic() + timeout
+        self._cancelled = threading.Event()
 
-    try:
-        yield
-    finally:
-        signal.alarm(0)
+    def __repr__(self) -> str:
+        return f"<{self.__class__.__name__} timeout={self.timeout} remaining={self.remaining()}>"
+
+    def remaining(self) -> float | None:
+        """Return the time in seconds left until the deadline, or None if there is none."""
+        if self._cancelled.is_set():
+            return 0
+        if self.expires is None:
+            return None
+        return max(self.expires - time.monotonic(), 0)
+
+    @property
+    def cancelled(self) -> bool:
+        """Whether the deadline was cancelled."""
+        return self._cancelled.is_set()
+
+    @property
+    def expired(self) -> bool:
+        """Whether the deadline has passed or was cancelled."""
+        return self.remaining() == 0
+
+    def cancel(self) -> None:
+        """Make the deadline expire right away, waking up any thread waiting for it."""
+        self._cancelled.set()
+
+    def check(self, what: str = "Operation") -> None:
+        """
+        Return if there is still time left.
+
+        Args:
+            what: Description of the operation for the error message.
+
+        Raises:
+            TimeoutError: If the deadline has passed or was cancelled.
+        """
+        if self.cancelled:
+            raise TimeoutError(f"{what} was cancelled.")
+        if self.expired:
+            raise TimeoutError(f"{what} timed out after {self.timeout} seconds.")
+
+    def wait(self, timeout: float | None = None) -> bool:
+        """
+        Sleep until the deadline expires, or for at most `timeout` seconds.
+
+        Returns:
+            Whether the deadline has expired.
+        """
+        remaining = self.remaining()
+        if remaining is None or (timeout is not None and timeout < remaining):
+            remaining = timeout
+        self._cancelled.wait(remaining)
+        return self.expired
@@ -0,0 +1,158 @@
+"""Walking of directory trees within budgets, for collecting output files."""
+from __future__ import annotations
+
+import functools
+import os
+import re
+from collections.abc import Iterator
+
+from nsbox.utils.timed import Deadline
+
+__all__ = ("GlobPattern", "WalkLimitError", "compile_glob", "walk_files")
+
+
+class WalkLimitError(Exception):
+    """
+    Raised when walking a tree would exceed one of its budgets.
+
+    The message names the exceeded limit, e.g. "directory depth limit".
+    """
+
+
+def _set_end(segment: str, start: int) -> int:
+    """Return the index of the "]" which closes the set starting at `start`, or -1 if none."""
+    # The first character of a set is literal, even if it is a "]".
+    if segment[start : start + 1] == "!":
+        start += 1
+    if segment[start : start + 1] == "]":
+        start += 1
+    return segment.find("]", start)
+
+
+def _translate_segment(segment: str) -> str:
+    """Translate a glob pattern of a single path component to a regex."""
+    parts = []
+    i, n = 0, len(segment)
+    while i < n:
+        c = segment[i]
+        i += 1
+        if c == "*":
+            parts.append("[^/]*")
+        elif c == "?":
+            parts.append("[^/]")
+        elif c == "[" and (end := _set_end(segment, i)) > 0:
+            chars = segment[i:end].replace("\\", r"\\").replace("[", r"\[")
+            i = end + 1
+            if chars.startswith("!"):
+                parts.append(f"[^/{chars[1:]}]")
+            elif chars.startswith("^"):
+                parts.append(f"[\\{chars}]")
+            else:
+                parts.append(f"[{chars}]")
+        else:
+            parts.append(re.escape(c))
+    # Like glob, wildcards don't match hidden names unless the pattern starts with a dot.
+    hidden = "" if segment.startswith(".") else r"(?!\.)"
+    return hidden + "".join(parts)
+
+
+class GlobPattern:
+    """
+    A glob pattern compiled to match relative paths like `glob.glob(recursive=True)` does.
+
+    `**` matches any number of directories, and wildcards don't match hidden names, as with
+    `include_hidden=False`.
+    """
+
+    def __init__(self, pattern: str) -> None:
+        """
+        Compile a glob pattern.
+
+        Args:
+            pattern: A glob pattern relative to the root of the tree, separated by "/".
+        """
+        self.pattern = pattern
+        segments = pattern.split("/")
+
+        regex = []
+        for i, segment in enumerate(segments):
+            last = i == len(segments) - 1
+            if segment == "**":
+                regex.append(r"(?:(?!\.)[^/]+/)*" + (r"(?!\.)[^/]+" if last else ""))
+            else:
+                regex.append(_translate_segment(segment) + ("" if last else "/"))
+        self._regex = re.compile("".join(regex), re.DOTALL)
+
+        self.max_depth: int | None = None if "**" in segments else len(segments) - 1
+        """Deepest level of directories the pattern can match files in; None for any level."""
+        self.hidden_dirs = any(segment.startswith(".") for segment in segments[:-1])
+        """Whether the pattern can match files within hidden directories."""
+
+    def __repr__(self) -> str:
+        return f"{self.__class__.__name__}({self.pattern!r})"
+
+    def match(self, path: str) -> bool:
+        """Return whether the relative `path` matches the pattern."""
+        return self._regex.fullmatch(path) is not None
+
+
+@functools.lru_cache(maxsize=32)
+def compile_glob(pattern: str) -> GlobPattern:
+    """Return the compiled `pattern`, cached for reuse across walks."""
+    return GlobPattern(pattern)
+
+
+def walk_files(
+    root: str | os.PathLike[str],
+    pattern: str | GlobPattern = "**/*",
+    max_depth: int | None = None,
+    max_entries: int | None = None,
+    deadline: Deadline | None = None,
+) -> Iterator[tuple[str, os.DirEntry[str]]]:
+    """
+    Yield the files within `root` which match `pattern`, along with their relative paths.
+
+    The tree is walked iteratively with `os.scandir`, in directory order rather than sorted,
+    so its depth isn't limited by recursion. Symlinks to files are yielded like files, but
+    symlinks to directories aren't followed. The stat results of the yielded `os.DirEntry`
+    objects are cached, so they cost at most one system call per file.
+
+    Args:
+        root: The directory to walk.
+        pattern: The glob pattern to match the paths relative to `root` against.
+        max_depth: The maximum number of nested directories to walk into, or None for any.
+        max_entries: The maximum number of directory entries to scan, or None for any.
+        deadline: Deadline for the walk, checked once per directory entry.
+    Raises:
+        WalkLimitError: If the walk would exceed `max_depth` or `max_entries`.
+        TimeoutError: If the deadline expires or is cancelled.
+    """
+    if isinstance(pattern, str):
+        pattern = compile_glob(pattern)
+    if deadline is None:
+        deadline = Deadline()
+
+    entries = 0
+    # Directories to scan, as their path, their path relative to root, and their depth.
+    stack = [(os.fspath(root), "", 0)]
+    while stack:
+        path, prefix, depth = stack.pop()
+        with os.scandir(path) as it:
+            for entry in it:
+                deadline.check("Walking the output directory")
+                entries += 1
+                if max_entries is not None and entries > max_entries:
+                    raise WalkLimitError("directory entry limit")
+
+                name = prefix + entry.name
+                if entry.is_dir(follow_symlinks=False):
+                    if (entry.name.startswith(".") and not pattern.hidden_dirs) or (
+                        pattern.max_depth is not None and depth >= pattern.max_depth
+                    ):
+                        # Nothing within can match.
+                        continue
+                    if max_depth is not None and depth >= max_depth:
+                        raise WalkLimitError("directory depth limit")
+                    stack.append((entry.path, name + "/", depth + 1))
+                elif entry.is_file() and pattern.match(name):
+                    yield name, entry
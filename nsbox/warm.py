@@ -0,0 +1,285 @@
+"""Pre-spawned sandboxed interpreters for low-latency Python evaluations."""
+from __future__ import annotations
+
+import json
+import logging
+import os
+import subprocess
+import threading
+from collections import deque
+from collections.abc import Callable, Iterable
+from types import TracebackType
+from typing import IO, Type
+
+from nsbox.memfs import MemFS
+from nsbox.utils.cgroup import RunCgroup
+
+__all__ = ("BOOTSTRAP", "WarmJail", "WarmPool", "warm_argv")
+
+log = logging.getLogger(__name__)
+
+# Run by the sandboxed interpreter of a warm jail. The modules named in its arguments are
+# imported ahead of time; it then blocks until the command line to emulate is written to
+# STDIN as a JSON array, and runs it as `python -c`, `python -m`, or `python <path>` would.
+BOOTSTRAP = """\
+import json, sys
+
+for name in sys.argv[1:]:
+    try:
+        __import__(name)
+    except Exception:
+        pass
+
+argv = json.loads(sys.stdin.buffer.read() or b"null")
+if not argv:
+    sys.exit(0)
+
+import builtins, os, runpy, types
+
+def main(argv):
+    if argv[0] == "-c":
+        sys.argv = ["-c", *argv[2:]]
+        module = types.ModuleType("__main__")
+        module.__builtins__ = builtins
+        sys.modules["__main__"] = module
+        exec(compile(argv[1], "<string>", "exec"), module.__dict__)
+    elif argv[0] == "-m":
+        sys.argv = [argv[1], *argv[2:]]
+        runpy.run_module(argv[1], run_name="__main__", alter_sys=True)
+    else:
+        sys.argv = list(argv)
+        sys.path[0] = os.path.dirname(os.path.abspath(argv[0]))
+        runpy.run_path(argv[0], run_name="__main__")
+
+try:
+    main(argv)
+except Exception as e:
+    # Leave out the frames of this script to match the traceback of a regular interpreter.
+    tb = e.__traceback__
+    while tb is not None and tb.tb_frame.f_globals is globals():
+        tb = tb.tb_next
+    sys.excepthook(type(e), e.with_traceback(tb), tb)
+    sys.exit(1)
+"""
+
+
+def warm_argv(run_args: Iterable[str]) -> list[str] | None:
+    """
+    Return the interpreter arguments if they can be emulated by a warm jail, otherwise None.
+
+    Only `-c <code>`, `-m <module>`, and `<path>`, each followed by any arguments for the
+    program itself, are supported; interpreter options need a regular run.
+    """
+    args = list(run_args)
+    # Null bytes are rejected by a regular run before NsJail is even started.
+    if not args or any("\0" in arg for arg in args):
+        return None
+
+    if args[0] in ("-c", "-m"):
+        return args if len(args) > 1 else None
+    if args[0].startswith("-"):
+        return None
+    return args
+
+
+class WarmJail:
+    """
+    A sandboxed interpreter started ahead of time, waiting on STDIN for the code to run.
+
+    Each warm jail is a separate NsJail process with its own MemFS instance, and is used
+    for a single evaluation only.
+    """
+
+    def __init__(
+        self,
+        process: subprocess.Popen,
+        fs: MemFS,
+        nsj_log: IO[bytes],
+        args: list[str],
+        cgroup: RunCgroup | None = None,
+    ) -> None:
+        """
+        Initialize a warm jail.
+
+        Args:
+            process: The NsJail subprocess, with pipes for STDIN and STDOUT.
+            fs: The MemFS instance mounted as the home directory of the jail.
+            nsj_log: The file NsJail writes its log to.
+            args: The arguments NsJail was started with.
+            cgroup: The cgroup NsJail created its cgroup in, if any.
+        """
+        self.process = process
+        self.fs = fs
+        self.nsj_log = nsj_log
+        self.args = args
+        self.cgroup = cgroup
+
+    def __repr__(self) -> str:
+        return f"<{self.__class__.__name__} pid={self.process.pid} fs={self.fs}>"
+
+    def __enter__(self) -> WarmJail:
+        return self
+
+    def __exit__(
+        self,
+        exc_type: Type[BaseException] | None,
+        exc_value: BaseException | None,
+        exc_tb: TracebackType | None,
+    ) -> None:
+        self.cleanup()
+
+    @property
+    def alive(self) -> bool:
+        """Whether NsJail is still waiting for the code to run."""
+        return self.process.poll() is None
+
+    def start(self, argv: list[str]) -> subprocess.Popen:
+        """Send the interpreter arguments to the jail and return the running NsJail subprocess."""
+        if self.cgroup is not None:
+            # Leave out the usage of the bootstrap; peaks include it regardless.
+            self.cgroup.reset()
+        try:
+            self.process.stdin.write(json.dumps(argv).encode("utf-8"))
+            self.process.stdin.close()
+        except BrokenPipeError:
+            # The jail has died; its output and return code will tell why.
+            pass
+        return self.process
+
+    def cleanup(self) -> None:
+        """Kill the jail if it is still running, and release its resources."""
+        if self.process.poll() is None:
+            self.process.terminate()
+            try:
+                self.process.wait(timeout=5)
+            except subprocess.TimeoutExpired:
+                self.process.kill()
+                self.process.wait()
+        for pipe in (self.process.stdin, self.process.stdout):
+            if pipe is not None:
+                pipe.close()
+        self.fs.cleanup()
+        self.nsj_log.close()
+        if self.cgroup is not None:
+            self.cgroup.remove()
+
+
+class WarmPool:
+    """
+    A pool of warm jails.
+
+    Jails are spawned by a background thread and handed out by `acquire`; the pool is refilled
+    after every acquisition. The pool is started lazily in the process that first acquires from
+    it, so it is safe to create before a fork.
+    """
+
+    def __init__(self, size: int, spawn: Callable[[], WarmJail]) -> None:
+        """
+        Initialize a pool of warm jails.
+
+        Args:
+            size: Number of idle jails to keep ready.
+            spawn: Function which starts a new warm jail.
+        """
+        self.size = size
+        self._spawn = spawn
+
+        self.hits = 0
+        self.misses = 0
+
+        self._idle: deque[WarmJail] = deque()
+        self._lock = threading.Lock()
+        self._wakeup = threading.Condition(self._lock)
+        self._thread: threading.Thread | None = None
+        self._pid: int | None = None
+        self._closed = False
+
+    def __repr__(self) -> str:
+        return f"<{self.__class__.__name__} size={self.size} idle={len(self._idle)}>"
+
+    def _start(self) -> None:
+        """Start the background thread if it isn't running in the current process."""
+        pid = os.getpid()
+        if self._pid == pid:
+            return
+
+        # Jails and threads inherited through a fork belong to the parent process.
+        self._idle.clear()
+
+        self._pid = pid
+        self._thread = threading.Thread(target=self._run, name="WarmPool", daemon=True)
+        self._thread.start()
+
+    def _run(self) -> None:
+        """Keep `size` jails ready until the pool is closed."""
+        while True:
+            with self._wakeup:
+                while len(self._idle) >= self.size and not self._closed:
+                    self._wakeup.wait()
+                if self._closed:
+                    return
+
+            try:
+                jail = self._spawn()
+            except Exception:
+                log.exception("Failed to spawn a warm jail")
+                with self._wakeup:
+                    # Don't retry in a tight loop if spawning keeps failing.
+                    self._wakeup.wait(1)
+                continue
+
+            with self._lock:
+                if not self._closed:
+                    self._idle.append(jail)
+                    continue
+            jail.cleanup()
+
+    def acquire(self) -> WarmJail | None:
+        """Return an idle jail, or None if none are ready."""
+        stale = []
+        with self._wakeup:
+            if self._closed:
+                raise RuntimeError("Cannot acquire from a closed WarmPool")
+
+            self._start()
+            jail = None
+            while self._idle:
+                candidate = self._idle.popleft()
+                if candidate.alive:
+                    jail = candidate
+                    break
+                stale.append(candidate)
+
+            if jail is not None:
+                self.hits += 1
+            else:
+                self.misses += 1
+            self._wakeup.notify()
+
+        for candidate in stale:
+            log.warning(f"{candidate!r} exited while idle, discarding it.")
+            candidate.cleanup()
+        return jail
+
+    def stats(self) -> dict[str, int]:
+        """Return the pool's counters and current occupancy."""
+        with self._lock:
+            return {
+                "size": self.size,
+                "idle": len(self._idle),
+                "hits": self.hits,
+                "misses": self.misses,
+            }
+
+    def close(self) -> None:
+        """Stop the background thread and kill all idle jails."""
+        with self._wakeup:
+            self._closed = True
+            idle = list(self._idle)
+            self._idle.clear()
+            self._wakeup.notify_all()
+
+        if self._thread is not None and self._pid == os.getpid():
+            self._thread.join()
+        for jail in idle:
+            jail.cleanup()
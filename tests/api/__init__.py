@@ -11,9 +11,9 @@ class NsAPITestCase(testing.TestCase):
     def setUp(self):
         super().setUp()
 
-        self.patcher = mock.patch("nsbox.api.nsapi.NsJail", autospec=True)
+        self.patcher = mock.patch("nsbox.api.nsboxapi.NsJail", autospec=True)
         self.mock_nsjail = self.patcher.start()
-        self.mock_nsjail.return_value.python3.return_value = EvalResult(
+        self.mock_nsjail.return_value.run_code.return_value = EvalResult(
             args=[], returncode=0, stdout="output", stderr="error"
         )
         self.addCleanup(self.patcher.stop)
@@ -0,0 +1,88 @@
+import json
+import logging
+from unittest import mock
+
+from falcon import testing
+
+from nsbox.api import AsyncNsAPI
+from nsbox.nsio import FileAttachment
+from nsbox.process import EvalResult
+
+
+class TestAsyncNsAPI(testing.TestCase):
+    def setUp(self):
+        super().setUp()
+
+        self.patcher = mock.patch("nsbox.api.nsboxasgi.AsyncNsJail", autospec=True)
+        self.mock_nsjail = self.patcher.start()
+        self.mock_nsjail.return_value.run_code.return_value = EvalResult(
+            args=[], returncode=0, stdout="output", files=[FileAttachment("a.txt", b"a")]
+        )
+        self.addCleanup(self.patcher.stop)
+
+        logging.getLogger("nsbox.nsjail").setLevel(logging.WARNING)
+
+        self.app = AsyncNsAPI()
+
+    def test_eval(self):
+        body = {"language": "python", "input": "print('hello')"}
+        result = self.simulate_post("/eval", json=body)
+
+        self.assertEqual(result.status_code, 200)
+        self.assertEqual(int(result.headers["Content-Length"]), len(result.content))
+        self.assertEqual(
+            result.json,
+            {
+                "stdout": "output",
+                "returncode": 0,
+                "files": [{"path": "a.txt", "size": 1, "content": "YQ=="}],
+            },
+        )
+        self.mock_nsjail.return_value.run_code.assert_awaited_once_with(
+            run_args=["-c", "print('hello')"], files=[], nsjail_args=()
+        )
+
+    def test_eval_invalid_400(self):
+        result = self.simulate_post("/eval", json={"language": "python"})
+        self.assertEqual(result.status_code, 400)
+        self.mock_nsjail.return_value.run_code.assert_not_awaited()
+
+    def test_eval_cache(self):
+        self.mock_nsjail.return_value.config_digest = "digest"
+        self.app = AsyncNsAPI(cache_size=10)
+        body = {"language": "python", "input": "print('hello')", "cache": True}
+
+        for _ in range(2):
+            result = self.simulate_post("/eval", json=body)
+            self.assertEqual(result.json["stdout"], "output")
+        self.assertEqual(self.mock_nsjail.return_value.run_code.await_count, 1)
+
+    def test_stream(self):
+        async def stream_code(run_args, files):
+            yield "hello "
+            yield "world\n"
+            yield EvalResult([], 0, None)
+
+        self.mock_nsjail.return_value.stream_code.side_effect = stream_code
+        body = {"language": "python", "input": "print('hello world')"}
+        result = self.simulate_post("/eval/stream", json=body)
+
+        self.assertEqual(result.status_code, 200)
+        frames = [json.loads(line) for line in result.text.splitlines()]
+        self.assertEqual(
+            frames,
+            [{"stdout": "hello "}, {"stdout": "world\n"}, {"returncode": 0, "files": []}],
+        )
+
+    def test_stream_error(self):
+        async def stream_code(run_args, files):
+            yield "hello"
+            raise RuntimeError
+
+        self.mock_nsjail.return_value.stream_code.side_effect = stream_code
+        body = {"language": "python", "input": ""}
+        with self.assertLogs("nsbox.api.resources.stream", logging.ERROR):
+            result = self.simulate_post("/eval/stream", json=body)
+
+        frames = [json.loads(line) for line in result.text.splitlines()]
+        self.assertEqual(frames[-1], {"error": "An exception occurred during evaluation"})
@@ -0,0 +1,114 @@
+import time
+from unittest import mock
+
+from nsbox.api import NsAPI
+from nsbox.process import EvalResult
+from tests.api import NsAPITestCase
+
+
+class TestBatchResource(NsAPITestCase):
+    PATH = "/eval/batch"
+
+    def setUp(self):
+        super().setUp()
+        self.nsjail = self.mock_nsjail.return_value
+        self.nsjail.time_limit_args.return_value = ()
+
+    def test_results_in_order(self):
+        self.nsjail.run_code.side_effect = lambda run_args, files: EvalResult([], 0, run_args[-1])
+        items = [{"language": "python", "input": str(i)} for i in range(10)]
+
+        result = self.simulate_post(self.PATH, json={"items": items})
+        self.assertEqual(result.status_code, 200)
+        self.assertFalse(result.json["timed_out"])
+        self.assertEqual(
+            result.json["results"],
+            [
+                {"status": "done", "result": {"stdout": str(i), "returncode": 0, "files": []}}
+                for i in range(10)
+            ],
+        )
+
+    def test_item_options(self):
+        self.nsjail.run_code.return_value = EvalResult([], 0, "", usage={"memory_peak": 1})
+        items = [{"language": "python", "input": "", "usage": True}]
+
+        result = self.simulate_post(self.PATH, json={"items": items})
+        self.assertEqual(result.json["results"][0]["result"]["usage"], {"memory_peak": 1})
+
+    def test_shared_files(self):
+        shared_args = ("--bindmount_ro", "/memfs/shared/home:home/shared")
+        self.nsjail.shared_files.return_value.__enter__.return_value = shared_args
+        self.nsjail.time_limit_args.return_value = ("--time_limit", "5")
+        body = {
+            "items": [{"language": "python", "input": "print(open('shared/a').read())"}],
+            "files": [{"path": "a", "content": "YQ=="}],
+        }
+
+        result = self.simulate_post(self.PATH, json=body)
+        self.assertEqual(result.json["results"][0]["status"], "done")
+
+        (files,), _ = self.nsjail.shared_files.call_args
+        self.assertEqual([(file.path, file.content) for file in files], [("a", b"a")])
+        self.nsjail.shared_files.return_value.__exit__.assert_called_once()
+        self.nsjail.run_code.assert_called_once_with(
+            run_args=["-c", "print(open('shared/a').read())"],
+            files=[],
+            nsjail_args=(*shared_args, "--time_limit", "5"),
+        )
+
+    def test_partial_results_on_timeout(self):
+        def run_code(run_args: list[str], files: list) -> EvalResult:
+            if run_args[-1] == "slow":
+                time.sleep(0.5)
+            return EvalResult([], 0, run_args[-1])
+
+        self.nsjail.run_code.side_effect = run_code
+        self.app = NsAPI(batch_workers=1)
+        items = [{"language": "python", "input": code} for code in ("fast", "slow", "late")]
+
+        with mock.patch("nsbox.api.resources.batch.WALL_TIME_GRACE", 0):
+            result = self.simulate_post(self.PATH, json={"items": items, "timeout": 0.2})
+
+        self.assertTrue(result.json["timed_out"])
+        self.assertEqual(
+            [item["status"] for item in result.json["results"]], ["done", "timeout", "timeout"]
+        )
+        self.assertEqual(self.nsjail.run_code.call_count, 2)
+
+    def test_failed_item(self):
+        self.nsjail.run_code.side_effect = [EvalResult([], 0, "ok"), RuntimeError]
+        self.app = NsAPI(batch_workers=1)
+        items = [{"language": "python", "input": "1"}, {"language": "python", "input": "2"}]
+
+        result = self.simulate_post(self.PATH, json={"items": items})
+        self.assertEqual([item["status"] for item in result.json["results"]], ["done", "failed"])
+        self.assertFalse(result.json["timed_out"])
+
+    def test_too_many_items_413(self):
+        self.app = NsAPI(batch_max_items=2)
+        items = [{"language": "python", "input": "pass"}] * 3
+
+        result = self.simulate_post(self.PATH, json={"items": items})
+        self.assertEqual(result.status_code, 413)
+        self.nsjail.run_code.assert_not_called()
+
+    def test_invalid_item_400(self):
+        cases = (
+            {"items": []},
+            {"items": [{"language": "python"}]},
+            {"items": [{"language": "python", "input": ""}], "timeout": 0},
+        )
+        for body in cases:
+            with self.subTest(body=body):
+                result = self.simulate_post(self.PATH, json=body)
+                self.assertEqual(result.status_code, 400)
+
+        items = [
+            {"language": "python", "input": ""},
+            {"language": "python", "input": "", "files": [{"path": "a", "content": "a"}]},
+        ]
+        result = self.simulate_post(self.PATH, json={"items": items})
+        self.assertEqual(result.status_code, 400)
+        self.assertTrue(result.json["description"].startswith("Item 1: "))
+        self.nsjail.run_code.assert_not_called()
@@ -0,0 +1,105 @@
+import hashlib
+from tempfile import TemporaryDirectory
+
+from nsbox.api import NsAPI
+from nsbox.blobs import BlobAttachment
+from nsbox.nsio import FileAttachment
+from tests.api import NsAPITestCase
+
+CONTENT = b"a,b\n1,2\n"
+DIGEST = hashlib.sha256(CONTENT).hexdigest()
+
+
+class TestBlobResource(NsAPITestCase):
+    def setUp(self):
+        super().setUp()
+        tmp = TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.app = NsAPI(blob_store_size=64, blob_dir=tmp.name)
+
+    def path(self, digest: str = DIGEST) -> str:
+        return f"/blobs/{digest}"
+
+    def test_put(self):
+        result = self.simulate_put(self.path(), body=CONTENT)
+        self.assertEqual(result.status_code, 201)
+        self.assertEqual(result.json, {"sha256": DIGEST, "size": len(CONTENT)})
+        self.assertEqual(self.app.blobs.size(DIGEST), len(CONTENT))
+
+        result = self.simulate_put(self.path(), body=CONTENT)
+        self.assertEqual(result.status_code, 200)
+
+    def test_put_digest_mismatch_400(self):
+        result = self.simulate_put(self.path(), body=b"other")
+        self.assertEqual(result.status_code, 400)
+        self.assertEqual(result.json["title"], "Digest mismatch")
+        self.assertNotIn(DIGEST, self.app.blobs)
+
+    def test_invalid_digest_400(self):
+        for digest in ("abc", DIGEST.upper(), "g" * 64):
+            with self.subTest(digest=digest):
+                result = self.simulate_put(self.path(digest), body=CONTENT)
+                self.assertEqual(result.status_code, 400)
+                self.assertEqual(result.json["title"], "Invalid digest")
+
+    def test_put_too_large_413(self):
+        content = bytes(65)
+        result = self.simulate_put(self.path(hashlib.sha256(content).hexdigest()), body=content)
+        self.assertEqual(result.status_code, 413)
+
+    def test_head(self):
+        self.assertEqual(self.simulate_head(self.path()).status_code, 404)
+
+        self.simulate_put(self.path(), body=CONTENT)
+        result = self.simulate_head(self.path())
+        self.assertEqual(result.status_code, 200)
+        self.assertEqual(result.headers["Content-Length"], str(len(CONTENT)))
+
+    def test_disabled_by_default(self):
+        self.app = NsAPI()
+        self.assertIsNone(self.app.blobs)
+        self.assertEqual(self.simulate_put(self.path(), body=CONTENT).status_code, 404)
+
+    def test_eval(self):
+        self.simulate_put(self.path(), body=CONTENT)
+        body = {
+            "language": "python",
+            "args": ["main.py"],
+            "files": [
+                {"path": "main.py", "content": "cHJpbnQoMSk="},
+                {"path": "data.csv", "blob": DIGEST},
+            ],
+        }
+
+        result = self.simulate_post("/eval", json=body)
+        self.assertEqual(result.status_code, 200)
+        self.mock_nsjail.return_value.run_code.assert_called_with(
+            run_args=["main.py"],
+            files=[
+                FileAttachment("main.py", b"print(1)"),
+                BlobAttachment("data.csv", b"", DIGEST),
+            ],
+        )
+
+    def test_eval_invalid_blob_400(self):
+        cases = {
+            "not stored": ({"path": "data.csv", "blob": DIGEST}, "is not stored"),
+            "traversal": ({"path": "../data.csv", "blob": DIGEST}, "may not traverse"),
+            "invalid": ({"path": "data.csv", "blob": "abc"}, "does not match"),
+            "with content": ({"path": "data.csv", "blob": DIGEST, "content": ""}, "should not"),
+        }
+        for name, (file, description) in cases.items():
+            with self.subTest(name):
+                body = {"language": "python", "input": "", "files": [file]}
+                result = self.simulate_post("/eval", json=body)
+                self.assertEqual(result.status_code, 400)
+                self.assertIn(description, result.json["description"])
+        self.mock_nsjail.return_value.run_code.assert_not_called()
+
+    def test_eval_blobs_disabled_400(self):
+        self.app = NsAPI()
+        body = {"language": "python", "input": "", "files": [{"path": "a", "blob": DIGEST}]}
+
+        result = self.simulate_post("/eval", json=body)
+        self.assertEqual(result.status_code, 400)
+        self.assertIn("blob store is disabled", result.json["description"])
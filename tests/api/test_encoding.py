@@ -0,0 +1,41 @@
+import json
+from base64 import b64encode
+from unittest import TestCase
+
+from nsbox.api.encoding import encode_json
+from nsbox.nsio import CHUNK_SIZE, FileAttachment
+
+
+class EncodeJSONTests(TestCase):
+    def test_encode(self):
+        files = [
+            FileAttachment("a.txt", b"hello"),
+            FileAttachment('b "quoted"', memoryview(b"x" * (CHUNK_SIZE + 1))),
+            FileAttachment("empty", b""),
+        ]
+        cases = (
+            {"stdout": "hi", "returncode": 0},
+            {"stdout": "hi", "returncode": 0, "timings": {"total": 1.0}},
+            {},
+        )
+        for media in cases:
+            with self.subTest(media=media):
+                entries = [{"path": file.path, "size": file.size} for file in files]
+                length, chunks = encode_json({**media, "files": entries}, files)
+                body = b"".join(chunks)
+
+                self.assertEqual(length, len(body))
+                expected = {
+                    **media,
+                    "files": [
+                        {**entry, "content": b64encode(file.content).decode()}
+                        for entry, file in zip(entries, files)
+                    ],
+                }
+                self.assertEqual(json.loads(body), expected)
+
+    def test_no_files(self):
+        length, chunks = encode_json({"stdout": "", "returncode": None, "files": []}, [])
+        body = b"".join(chunks)
+        self.assertEqual(length, len(body))
+        self.assertEqual(json.loads(body), {"stdout": "", "returncode": None, "files": []})
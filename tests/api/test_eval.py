@@ -1,3 +1,13 @@
+import io
+import zipfile
+from base64 import b64decode, b64encode
+from pathlib import Path
+from tempfile import TemporaryDirectory
+
+from nsbox.api import NsAPI
+from nsbox.archive import extract, pack
+from nsbox.nsio import FileAttachment, SkippedFile
+from nsbox.process import EvalResult
 from tests.api import NsAPITestCase
 
 
@@ -143,3 +153,194 @@ class TestEvalResource(NsAPITestCase):
         result = self.simulate_options(self.PATH)
         self.assertEqual(result.status_code, 200)
         self.assertEqual(result.headers.get("Allow"), "POST")
+
+    def test_cache(self):
+        self.mock_nsjail.return_value.config_digest = "digest"
+        self.app = NsAPI(cache_size=10)
+        run_code = self.mock_nsjail.return_value.run_code
+        body = {"language": "python", "input": "print('hello')"}
+
+        for _ in range(2):
+            result = self.simulate_post(self.PATH, json=body)
+            self.assertEqual(result.status_code, 200)
+            self.assertEqual("output", result.json["stdout"])
+        run_code.assert_called_once()
+
+        result = self.simulate_post(self.PATH, json={**body, "cache": False})
+        self.assertEqual(result.status_code, 200)
+        self.assertEqual(run_code.call_count, 2)
+
+        result = self.simulate_post(self.PATH, json={**body, "input": "print('world')"})
+        self.assertEqual(run_code.call_count, 3)
+        self.assertEqual(self.app.cache.stats()["hits"], 1)
+
+    def test_cache_disabled_by_default(self):
+        body = {"language": "python", "input": "print('hello')"}
+        for _ in range(2):
+            self.simulate_post(self.PATH, json=body)
+
+        self.assertIsNone(self.app.cache)
+        self.assertEqual(self.mock_nsjail.return_value.run_code.call_count, 2)
+
+    def test_timings(self):
+        self.mock_nsjail.return_value.run_code.return_value = EvalResult(
+            [], 0, "output", timings={"total": 1.5}, usage={"user_time": 0.5}
+        )
+        body = {"language": "python", "input": "print('hello')"}
+
+        result = self.simulate_post(self.PATH, json=body)
+        self.assertNotIn("timings", result.json)
+        self.assertNotIn("usage", result.json)
+
+        result = self.simulate_post(self.PATH, json={**body, "timings": True})
+        self.assertEqual(result.status_code, 200)
+        self.assertEqual(result.json["timings"]["total"], 1.5)
+        self.assertIn("encoding", result.json["timings"])
+        self.assertEqual(result.json["usage"], {"user_time": 0.5})
+
+    def test_usage(self):
+        self.mock_nsjail.return_value.run_code.return_value = EvalResult(
+            [], 0, "output", timings={"total": 1.5}, usage={"memory_peak": 8822784}
+        )
+        body = {"language": "python", "input": "print('hello')", "usage": True}
+
+        result = self.simulate_post(self.PATH, json=body)
+        self.assertEqual(result.status_code, 200)
+        self.assertNotIn("timings", result.json)
+        self.assertEqual(result.json["usage"], {"memory_peak": 8822784})
+
+    def test_timings_bypass_cache(self):
+        self.mock_nsjail.return_value.config_digest = "digest"
+        self.app = NsAPI(cache_size=10)
+
+        for flag in ("timings", "usage"):
+            self.mock_nsjail.return_value.run_code.reset_mock()
+            body = {"language": "python", "input": "print('hello')", flag: True}
+            for _ in range(2):
+                self.simulate_post(self.PATH, json=body)
+            self.assertEqual(self.mock_nsjail.return_value.run_code.call_count, 2)
+
+    def test_truncated(self):
+        files = [FileAttachment("a.txt", b"a")]
+        skipped = [SkippedFile("large.bin", 20_000_000)]
+        self.mock_nsjail.return_value.run_code.return_value = EvalResult(
+            [], 0, "output", files=files, skipped_files=skipped
+        )
+        body = {"language": "python", "input": "print('hello')"}
+
+        result = self.simulate_post(self.PATH, json=body)
+        self.assertEqual(result.status_code, 200)
+        self.assertEqual(result.json["files"], [{"path": "a.txt", "size": 1, "content": "YQ=="}])
+        self.assertEqual(
+            result.json["truncated"],
+            {"stdout": False, "files": [{"path": "large.bin", "size": 20_000_000}]},
+        )
+
+        self.mock_nsjail.return_value.run_code.return_value = EvalResult(
+            [], 0, "output", truncated=True
+        )
+        result = self.simulate_post(self.PATH, json=body)
+        self.assertEqual(result.json["truncated"], {"stdout": True, "files": []})
+
+    def test_languages_created_lazily(self):
+        self.mock_nsjail.assert_not_called()
+
+        body = {"language": "nodejs", "input": "console.log('hello');"}
+        for _ in range(2):
+            result = self.simulate_post(self.PATH, json=body)
+            self.assertEqual(result.status_code, 200)
+
+        self.mock_nsjail.assert_called_once_with(config_path="config/nsbox_js.cfg")
+        self.mock_nsjail.return_value.run_code.assert_called_with(
+            run_args=["-e", "console.log('hello');"], files=[]
+        )
+
+    def test_unsupported_language_400(self):
+        result = self.simulate_post(self.PATH, json={"language": "cobol", "input": ""})
+
+        self.assertEqual(result.status_code, 400)
+        self.assertEqual(result.json["title"], "Invalid language")
+        self.assertIn("'python'", result.json["description"])
+        self.mock_nsjail.assert_not_called()
+
+    def test_language_busy_429(self):
+        with TemporaryDirectory() as tmp:
+            Path(tmp, "python.toml").write_text(
+                'config = "nsbox_py.cfg"\nmax_concurrency = 1\nwait_timeout = 0.01\n'
+                "[nsjail]\nmax_output_size = 100\n"
+            )
+            self.app = NsAPI(languages_dir=tmp, max_output_size=10, read_chunk_size=5)
+        body = {"language": "python", "input": "print('hello')"}
+
+        with self.app.languages.slot("python"):
+            result = self.simulate_post(self.PATH, json=body)
+        self.assertEqual(result.status_code, 429)
+        self.assertEqual(result.headers["Retry-After"], "1")
+
+        result = self.simulate_post(self.PATH, json=body)
+        self.assertEqual(result.status_code, 200)
+        self.mock_nsjail.assert_called_once_with(
+            config_path=str(Path(tmp, "nsbox_py.cfg")), max_output_size=100, read_chunk_size=5
+        )
+
+    def test_archive(self):
+        """The files of an archive should be evaluated along with, and before, other files."""
+        self.mock_nsjail.return_value.files_max_entries = 10
+        self.mock_nsjail.return_value.memfs_instance_size = 1024
+        archive = pack([FileAttachment("main.py", b"print(1)"), FileAttachment("a/b", b"b")], "zip")
+        body = {
+            "language": "python",
+            "args": ["main.py"],
+            "archive": b64encode(archive.content).decode(),
+            "files": [{"path": "a/b", "content": "Yw=="}],
+        }
+
+        result = self.simulate_post(self.PATH, json=body)
+        self.assertEqual(result.status_code, 200)
+        self.mock_nsjail.return_value.run_code.assert_called_with(
+            run_args=["main.py"],
+            files=[
+                FileAttachment("main.py", b"print(1)"),
+                FileAttachment("a/b", b"b"),
+                FileAttachment("a/b", b"c"),
+            ],
+        )
+
+    def test_archive_invalid_400(self):
+        self.mock_nsjail.return_value.files_max_entries = 10
+        self.mock_nsjail.return_value.memfs_instance_size = 1024
+        buffer = io.BytesIO()
+        with zipfile.ZipFile(buffer, "w") as archive:
+            archive.writestr("large", bytes(2048))
+        cases = {
+            "not base64": "Invalid base64 encoding for the archive",
+            b64encode(b"not an archive").decode(): "Archive is invalid",
+            b64encode(buffer.getvalue()).decode(): "Archive is too large to extract",
+        }
+        for content, description in cases.items():
+            with self.subTest(description=description):
+                body = {"language": "python", "input": "", "archive": content}
+                result = self.simulate_post(self.PATH, json=body)
+                self.assertEqual(result.status_code, 400)
+                self.assertEqual(result.json["title"], "Request file is invalid")
+                self.assertIn(description, result.json["description"])
+        self.mock_nsjail.return_value.run_code.assert_not_called()
+
+    def test_output_archive(self):
+        files = [FileAttachment("a.txt", b"a"), FileAttachment("b/c.txt", b"c")]
+        self.mock_nsjail.return_value.run_code.return_value = EvalResult(
+            [], 0, "output", files=files
+        )
+        for fmt in ("tar", "tar.gz", "zip"):
+            with self.subTest(format=fmt):
+                body = {"language": "python", "input": "", "output_archive": fmt}
+                result = self.simulate_post(self.PATH, json=body)
+                self.assertEqual(result.status_code, 200)
+                self.assertEqual(int(result.headers["Content-Length"]), len(result.content))
+
+                (file,) = result.json["files"]
+                self.assertEqual(file["path"], f"output.{fmt}")
+                self.assertEqual(extract(b64decode(file["content"])), files)
+
+        body = {"language": "python", "input": "", "output_archive": "rar"}
+        self.assertEqual(self.simulate_post(self.PATH, json=body).status_code, 400)
@@ -0,0 +1,69 @@
+import time
+
+from nsbox.process import EvalResult
+from tests.api import NsAPITestCase
+
+
+class TestJobsResource(NsAPITestCase):
+    PATH = "/eval/jobs"
+
+    def wait_done(self, job_id: str) -> dict:
+        for _ in range(100):
+            result = self.simulate_get(f"{self.PATH}/{job_id}")
+            self.assertEqual(result.status_code, 200)
+            if result.json["status"] in ("done", "failed"):
+                return result.json
+            time.sleep(0.01)
+        self.fail(f"Job {job_id} did not finish")
+
+    def test_post_returns_202_and_result(self):
+        body = {"language": "python", "input": "print('hello')"}
+        result = self.simulate_post(self.PATH, json=body)
+
+        self.assertEqual(result.status_code, 202)
+        self.assertEqual(result.headers["Location"], f"{self.PATH}/{result.json['id']}")
+        self.assertEqual(result.json["status"], "queued")
+
+        job = self.wait_done(result.json["id"])
+        self.assertEqual(job["status"], "done")
+        self.assertEqual(job["result"], {"stdout": "output", "returncode": 0, "files": []})
+        self.mock_nsjail.return_value.run_code.assert_called_with(
+            run_args=["-c", "print('hello')"], files=[]
+        )
+
+    def test_failed_job(self):
+        self.mock_nsjail.return_value.run_code.side_effect = RuntimeError
+        result = self.simulate_post(self.PATH, json={"language": "python", "input": "pass"})
+
+        job = self.wait_done(result.json["id"])
+        self.assertEqual(job["status"], "failed")
+        self.assertNotIn("result", job)
+
+    def test_queue_full_429(self):
+        self.app.jobs.max_queued = 0
+        result = self.simulate_post(self.PATH, json={"language": "python", "input": "pass"})
+
+        self.assertEqual(result.status_code, 429)
+        self.assertEqual(result.json["title"], "Job queue is full")
+        self.assertIn("Retry-After", result.headers)
+
+    def test_invalid_schema_400(self):
+        result = self.simulate_post(self.PATH, json={"stuff": "foo"})
+        self.assertEqual(result.status_code, 400)
+
+    def test_unknown_job_404(self):
+        for job_id in ("0" * 32, "foo", ".."):
+            with self.subTest(job_id=job_id):
+                result = self.simulate_get(f"{self.PATH}/{job_id}")
+                self.assertEqual(result.status_code, 404)
+
+    def test_result_shared_through_state_dir(self):
+        """A job should be visible to other processes through the state directory."""
+        self.mock_nsjail.return_value.run_code.return_value = EvalResult([], 0, "shared")
+        result = self.simulate_post(self.PATH, json={"language": "python", "input": "pass"})
+        job_id = result.json["id"]
+        self.wait_done(job_id)
+
+        self.app.jobs._jobs.clear()
+        job = self.wait_done(job_id)
+        self.assertEqual(job["result"]["stdout"], "shared")
@@ -0,0 +1,26 @@
+import unittest
+from unittest import mock
+
+from nsbox.utils import metrics
+from tests.api import NsAPITestCase
+
+
+@unittest.skipUnless(metrics.ENABLED, "prometheus_client is not installed")
+class TestMetricsResource(NsAPITestCase):
+    PATH = "/metrics"
+
+    def test_get_metrics(self):
+        self.simulate_post("/eval", json={"language": "python", "input": "print(1)"})
+
+        result = self.simulate_get(self.PATH)
+        self.assertEqual(result.status_code, 200)
+        self.assertEqual(result.headers["Content-Type"], metrics.CONTENT_TYPE)
+        self.assertIn('nsbox_phase_seconds_count{phase="encoding"}', result.text)
+        self.assertIn("nsbox_jobs_queued", result.text)
+
+    def test_metrics_unavailable_404(self):
+        with mock.patch.object(metrics, "ENABLED", False):
+            result = self.simulate_get(self.PATH)
+
+        self.assertEqual(result.status_code, 404)
+        self.assertEqual(result.json["title"], "Metrics are unavailable")
@@ -0,0 +1,145 @@
+import json
+from email.parser import BytesParser
+from email.policy import HTTP
+
+from nsbox.api.multipart import encode
+from nsbox.archive import pack
+from nsbox.nsio import CHUNK_SIZE, FileAttachment
+from nsbox.process import EvalResult
+from tests.api import NsAPITestCase
+
+BOUNDARY = "nsboxtestboundary"
+
+
+def form(*parts: tuple[str, str | None, bytes]) -> bytes:
+    """Encode (name, filename, content) tuples as a multipart/form-data body."""
+    body = b""
+    for name, filename, content in parts:
+        disposition = f'form-data; name="{name}"'
+        if filename is not None:
+            disposition += f'; filename="{filename}"'
+        body += f"--{BOUNDARY}\r\nContent-Disposition: {disposition}\r\n\r\n".encode()
+        body += content + b"\r\n"
+    return body + f"--{BOUNDARY}--\r\n".encode()
+
+
+def parse(content_type: str, body: bytes) -> list[tuple[str, str | None, bytes]]:
+    """Decode a multipart/form-data body into (name, filename, content) tuples."""
+    message = BytesParser(policy=HTTP).parsebytes(
+        f"Content-Type: {content_type}\r\n\r\n".encode() + body
+    )
+    return [
+        (
+            part.get_param("name", header="content-disposition"),
+            part.get_filename(),
+            part.get_content(),
+        )
+        for part in message.iter_parts()
+    ]
+
+
+class TestMultipart(NsAPITestCase):
+    PATH = "/eval"
+
+    def post_form(self, *parts: tuple[str, str | None, bytes], **kwargs):
+        return self.simulate_post(
+            self.PATH,
+            body=form(*parts),
+            content_type=f"multipart/form-data; boundary={BOUNDARY}",
+            **kwargs,
+        )
+
+    def test_request_files(self):
+        request = {
+            "language": "python",
+            "args": ["main.py"],
+            "files": [{"path": "b64.txt", "content": "YQ=="}],
+        }
+        binary = bytes(range(256))
+        result = self.post_form(
+            ("request", None, json.dumps(request).encode()),
+            ("files", "main.py", b"print('hi')"),
+            ("files", "data/bin", binary),
+        )
+
+        self.assertEqual(result.status_code, 200)
+        self.assertEqual(result.json, {"stdout": "output", "returncode": 0, "files": []})
+        self.mock_nsjail.return_value.run_code.assert_called_with(
+            run_args=["main.py"],
+            files=[
+                FileAttachment("b64.txt", b"a"),
+                FileAttachment("main.py", b"print('hi')"),
+                FileAttachment("data/bin", binary),
+            ],
+        )
+
+    def test_request_archive(self):
+        self.mock_nsjail.return_value.files_max_entries = 10
+        self.mock_nsjail.return_value.memfs_instance_size = 1024
+        archive = pack([FileAttachment("main.py", b"print('hi')")], "tar.gz")
+        request = {"language": "python", "args": ["main.py"]}
+        result = self.post_form(
+            ("request", None, json.dumps(request).encode()),
+            ("archive", "files.tar.gz", bytes(archive.content)),
+            ("files", "data/bin", b"bin"),
+        )
+
+        self.assertEqual(result.status_code, 200)
+        self.mock_nsjail.return_value.run_code.assert_called_with(
+            run_args=["main.py"],
+            files=[FileAttachment("main.py", b"print('hi')"), FileAttachment("data/bin", b"bin")],
+        )
+
+    def test_invalid_request(self):
+        cases = (
+            # No request part.
+            (("files", "main.py", b""),),
+            # Malformed JSON.
+            (("request", None, b"{"),),
+            # Invalid schema.
+            (("request", None, b'{"language": "python"}'),),
+            # Illegal path.
+            (("request", None, b'{"language": "python", "args": []}'), ("files", "../x", b"")),
+        )
+        for parts in cases:
+            with self.subTest(parts=parts):
+                result = self.post_form(*parts)
+                self.assertEqual(result.status_code, 400)
+        self.mock_nsjail.return_value.run_code.assert_not_called()
+
+    def test_response_files(self):
+        files = [FileAttachment("out.png", b"\x89PNG\r\n--\r\n"), FileAttachment('a"b', b"")]
+        self.mock_nsjail.return_value.run_code.return_value = EvalResult([], 0, "hi", files=files)
+        body = {"language": "python", "input": "", "usage": True}
+
+        result = self.simulate_post(self.PATH, json=body, headers={"Accept": "multipart/form-data"})
+        self.assertEqual(result.status_code, 200)
+        self.assertEqual(int(result.headers["Content-Length"]), len(result.content))
+
+        (name, _, media), *parts = parse(result.headers["Content-Type"], result.content)
+        self.assertEqual(name, "result")
+        self.assertEqual(
+            json.loads(media),
+            {
+                "stdout": "hi",
+                "returncode": 0,
+                "files": [{"path": "out.png", "size": 10}, {"path": 'a"b', "size": 0}],
+                "usage": None,
+            },
+        )
+        self.assertEqual(
+            parts, [("files", "out.png", b"\x89PNG\r\n--\r\n"), ("files", "a%22b", b"")]
+        )
+
+    def test_json_response_by_default(self):
+        result = self.post_form(("request", None, b'{"language": "python", "input": ""}'))
+        self.assertEqual(result.headers["Content-Type"], "application/json")
+
+    def test_encode_reads_content_in_chunks(self):
+        content = memoryview(b"x" * (CHUNK_SIZE + 1))
+        _, length, chunks = encode({}, [FileAttachment("x", content)])
+        chunks = list(chunks)
+        self.assertEqual(length, sum(map(len, chunks)))
+        self.assertIn(b"x" * CHUNK_SIZE, chunks)
+        self.assertIn(b"x", chunks)
+        self.assertTrue(all(isinstance(chunk, bytes) for chunk in chunks))
@@ -0,0 +1,100 @@
+import json
+from pathlib import Path
+
+from tests.api import NsAPITestCase
+
+from nsbox.api.resources import EvalResource, StreamResource
+from nsbox.languages import Language, LanguageRegistry
+from nsbox.nsio import FileAttachment
+from nsbox.process import EvalResult
+
+
+def fake_stream(*chunks: str, result: EvalResult):
+    def stream_code(**_):
+        yield from chunks
+        return result
+
+    return stream_code
+
+
+class TestStreamResource(NsAPITestCase):
+    PATH = "/eval/stream"
+
+    def setUp(self):
+        super().setUp()
+        self.stream_code = self.mock_nsjail.return_value.stream_code
+        self.stream_code.side_effect = fake_stream(
+            "Hello ",
+            "world\n",
+            result=EvalResult([], 0, None, files=[FileAttachment("a.txt", b"a")]),
+        )
+
+    def test_post_streams_json_lines(self):
+        body = {"language": "python", "input": "print('Hello world')"}
+        result = self.simulate_post(self.PATH, json=body)
+
+        self.assertEqual(result.status_code, 200)
+        self.assertEqual(result.headers["Content-Type"], "application/x-ndjson")
+        frames = [json.loads(line) for line in result.text.splitlines()]
+        self.assertEqual(
+            frames,
+            [
+                {"stdout": "Hello "},
+                {"stdout": "world\n"},
+                {"returncode": 0, "files": [{"path": "a.txt", "size": 1, "content": "YQ=="}]},
+            ],
+        )
+        self.stream_code.assert_called_with(run_args=["-c", "print('Hello world')"], files=[])
+
+    def test_post_streams_server_sent_events(self):
+        body = {"language": "python", "input": "print('Hello world')"}
+        headers = {"Accept": "text/event-stream"}
+        result = self.simulate_post(self.PATH, json=body, headers=headers)
+
+        self.assertEqual(result.status_code, 200)
+        self.assertEqual(result.headers["Content-Type"], "text/event-stream")
+        events = result.text.split("\n\n")
+        self.assertEqual(events[0], 'event: stdout\ndata: {"stdout": "Hello "}')
+        self.assertTrue(events[2].startswith('event: result\ndata: {"returncode": 0'))
+
+    def test_error_message_is_streamed(self):
+        """An error message in place of the result's stdout should be sent as output."""
+        self.stream_code.side_effect = fake_stream(
+            result=EvalResult([], None, "ValueError: embedded null byte")
+        )
+        result = self.simulate_post(self.PATH, json={"language": "python", "input": "\0"})
+
+        frames = [json.loads(line) for line in result.text.splitlines()]
+        self.assertEqual(
+            frames,
+            [{"stdout": "ValueError: embedded null byte"}, {"returncode": None, "files": []}],
+        )
+
+    def test_unexpected_error_frame(self):
+        def stream_code(**_):
+            yield "partial"
+            raise RuntimeError
+
+        self.stream_code.side_effect = stream_code
+        result = self.simulate_post(self.PATH, json={"language": "python", "input": "pass"})
+
+        frames = [json.loads(line) for line in result.text.splitlines()]
+        self.assertEqual(frames[0], {"stdout": "partial"})
+        self.assertIn("error", frames[1])
+
+    def test_invalid_schema_400(self):
+        result = self.simulate_post(self.PATH, json={"stuff": "foo"})
+        self.assertEqual(result.status_code, 400)
+
+    def test_language_busy(self):
+        language = Language("python", Path("nsbox_py.cfg"), max_concurrency=1, wait_timeout=0.01)
+        self.app.languages = LanguageRegistry([language], self.app.languages.factory)
+        self.app.add_route(self.PATH, StreamResource(EvalResource(self.app.languages)))
+        body = {"language": "python", "input": "print('Hello world')"}
+
+        with self.app.languages.slot("python"):
+            result = self.simulate_post(self.PATH, json=body)
+
+        frames = [json.loads(line) for line in result.text.splitlines()]
+        self.assertEqual(len(frames), 1)
+        self.assertIn("evaluation slots", frames[0]["error"])
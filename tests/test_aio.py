@@ -0,0 +1,130 @@
+import asyncio
+import logging
+import os
+import sys
+import tempfile
+import time
+import unittest
+from pathlib import Path
+from textwrap import dedent
+
+from nsbox.aio import AsyncNsJail
+from nsbox.filesystem import Size
+from nsbox.nsio import FileAttachment
+from nsbox.process import EvalResult
+
+# Stands in for NsJail: runs Python in the directory mounted as home, ignoring everything else.
+FAKE_NSJAIL = f"""#!{sys.executable}
+import os, sys
+args = sys.argv[1:]
+sep = args.index("--")
+home = next(arg for prev, arg in zip(args, args[1:sep]) if prev == "--bindmount")
+os.chdir(home.split(":")[0])
+os.execv(sys.executable, [sys.executable, *args[sep + 2 :]])
+"""
+
+
+class AsyncNsJailTests(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        super().setUp()
+
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        nsjail_path = Path(tmp.name, "nsjail")
+        nsjail_path.write_text(FAKE_NSJAIL)
+        nsjail_path.chmod(0o755)
+
+        self.nsjail = AsyncNsJail(nsjail_path=str(nsjail_path), memfs_instance_size=2 * Size.MiB)
+        logging.getLogger("nsbox.aio").setLevel(logging.WARNING)
+        logging.getLogger("nsbox.nsjail").setLevel(logging.WARNING)
+
+    async def test_run_code(self):
+        code = "open('out.txt', 'w').write('hi'); print('hello')"
+        result = await self.nsjail.run_code(["-c", code])
+
+        self.assertEqual(result.returncode, 0)
+        self.assertEqual(result.stdout, "hello\n")
+        self.assertEqual(result.files, [FileAttachment("out.txt", b"hi")])
+        self.assertIn("total", result.timings)
+
+    async def test_files(self):
+        files = [FileAttachment("test.py", b"import sys; print(sys.argv[1])")]
+        result = await self.nsjail.run_code(["test.py", "arg"], files)
+
+        self.assertEqual(result.stdout, "arg\n")
+        self.assertEqual(result.files, [])
+
+    async def test_stream_code(self):
+        code = "import time\nfor i in range(3):\n    print(i, flush=True)\n    time.sleep(0.05)"
+        items = [item async for item in self.nsjail.stream_code(["-c", code])]
+
+        *output, result = items
+        self.assertEqual("".join(output), "0\n1\n2\n")
+        self.assertGreater(len(output), 1)
+        self.assertIsInstance(result, EvalResult)
+        self.assertIsNone(result.stdout)
+
+    async def test_concurrent_runs(self):
+        """Evaluations should overlap, without mixing up their output or files."""
+        code = dedent(
+            """
+            import sys, time
+            open(f"{sys.argv[1]}.txt", "w").write(sys.argv[1])
+            time.sleep(0.5)
+            print(sys.argv[1])
+            """
+        )
+        files = [FileAttachment("test.py", code.encode())]
+        names = [str(i) for i in range(10)]
+
+        start = time.monotonic()
+        results = await asyncio.gather(
+            *(self.nsjail.run_code(["test.py", name], files) for name in names)
+        )
+        self.assertLess(time.monotonic() - start, 5 * 0.5)
+
+        for name, result in zip(names, results):
+            self.assertEqual(result.stdout, f"{name}\n")
+            self.assertEqual(result.files, [FileAttachment(f"{name}.txt", name.encode())])
+
+    async def test_output_is_truncated(self):
+        self.nsjail.max_output_size = 5
+        result = await self.nsjail.run_code(["-c", "print('abcd\N{SNOWMAN}' * 100_000)"])
+
+        self.assertEqual(result.stdout, "abcd")
+        self.assertTrue(result.truncated)
+        self.assertEqual(result.returncode, 128 + 15)
+
+    async def test_invalid_unicode(self):
+        result = await self.nsjail.run_code(["-c", "import sys; sys.stdout.buffer.write(b'\\xff')"])
+        self.assertIsNone(result.returncode)
+        self.assertEqual(result.stdout, "UnicodeDecodeError: invalid Unicode in output pipe")
+
+    async def test_wall_time_limit(self):
+        self.nsjail.wall_time_limit = 0.5
+        start = time.monotonic()
+        result = await self.nsjail.run_code(["-c", "import time; time.sleep(10)"])
+
+        self.assertLess(time.monotonic() - start, 5)
+        self.assertEqual(result.returncode, 128 + 15)
+
+    async def test_cancel_terminates_nsjail(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        pid_file = Path(tmp.name, "pid")
+        code = f"import os, time; open({str(pid_file)!r}, 'w').write(str(os.getpid())); "
+        code += "print('started', flush=True); time.sleep(10)"
+        stream = self.nsjail.stream_code(["-c", code])
+
+        self.assertEqual(await anext(stream), "started\n")
+        await stream.aclose()
+
+        pid = int(pid_file.read_text())
+        for _ in range(50):
+            try:
+                os.kill(pid, 0)
+            except ProcessLookupError:
+                break
+            await asyncio.sleep(0.1)
+        else:
+            self.fail("NsJail wasn't terminated")
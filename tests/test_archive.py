@@ -0,0 +1,108 @@
+import io
+import tarfile
+import zipfile
+from unittest import TestCase
+
+from nsbox.archive import ArchiveError, extract, pack
+from nsbox.nsio import FileAttachment, IllegalPathError
+
+FILES = [FileAttachment("main.py", b"print('hi')"), FileAttachment("data/a.bin", bytes(256))]
+
+
+def make_zip(*members: tuple[str, bytes]) -> bytes:
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w", compression=zipfile.ZIP_DEFLATED) as archive:
+        for name, content in members:
+            archive.writestr(name, content)
+    return buffer.getvalue()
+
+
+def make_tar(*members: tarfile.TarInfo | tuple[str, bytes], mode: str = "w:gz") -> bytes:
+    buffer = io.BytesIO()
+    with tarfile.open(fileobj=buffer, mode=mode) as archive:
+        for member in members:
+            if isinstance(member, tarfile.TarInfo):
+                archive.addfile(member)
+            else:
+                info = tarfile.TarInfo(member[0])
+                info.size = len(member[1])
+                archive.addfile(info, io.BytesIO(member[1]))
+    return buffer.getvalue()
+
+
+class ExtractTests(TestCase):
+    def test_formats(self):
+        members = [(file.path, bytes(file.content)) for file in FILES]
+        directory = tarfile.TarInfo("data")
+        directory.type = tarfile.DIRTYPE
+        archives = {
+            "zip": make_zip(("data/", b""), *members),
+            "tar": make_tar(directory, *members, mode="w"),
+            "tar.gz": make_tar(*members),
+            "tar.xz": make_tar(*members, mode="w:xz"),
+        }
+        for name, data in archives.items():
+            with self.subTest(format=name):
+                self.assertEqual(extract(data), FILES)
+                self.assertEqual(extract(memoryview(data)), FILES)
+
+    def test_invalid(self):
+        for data in (b"", b"not an archive", make_zip(("a", b"a"))[:-30]):
+            with self.subTest(data=data), self.assertRaises(ArchiveError):
+                extract(data)
+
+    def test_illegal_paths(self):
+        for name in ("/etc/passwd", "../x", "a/../../x"):
+            for data in (make_zip((name, b"")), make_tar((name, b""))):
+                with self.subTest(name=name), self.assertRaises(IllegalPathError):
+                    extract(data)
+
+    def test_links_rejected(self):
+        for kind in (tarfile.SYMTYPE, tarfile.LNKTYPE, tarfile.CHRTYPE):
+            link = tarfile.TarInfo("link")
+            link.type = kind
+            link.linkname = "/etc/passwd"
+            with self.subTest(kind=kind), self.assertRaisesRegex(ArchiveError, "regular file"):
+                extract(make_tar(link))
+
+    def test_limits(self):
+        members = [("a", b"x" * 600), ("b", b"x" * 600)]
+        for data in (make_zip(*members), make_tar(*members)):
+            with self.subTest(data=data[:2]):
+                self.assertEqual(len(extract(data, max_files=2, max_size=1200)), 2)
+                with self.assertRaisesRegex(ArchiveError, "too many files"):
+                    extract(data, max_files=1)
+                with self.assertRaisesRegex(ArchiveError, "too large"):
+                    extract(data, max_size=1000)
+
+    def test_bomb(self):
+        """A highly compressed archive should be rejected before it is decompressed."""
+        data = make_zip(("bomb", bytes(100 * 1024**2)))
+        self.assertLess(len(data), 200 * 1024)
+        with self.assertRaisesRegex(ArchiveError, "too large"):
+            extract(data, max_size=1024**2)
+
+    def test_understated_size(self):
+        """A zip member larger than its declared size shouldn't be read past the limit."""
+        data = bytearray(make_zip(("a", b"x" * 1000)))
+        # Patch the uncompressed size in the central directory to claim 10 bytes.
+        offset = data.rindex(b"PK\x01\x02") + 24
+        data[offset : offset + 4] = (10).to_bytes(4, "little")
+        with self.assertRaises(ArchiveError):
+            extract(bytes(data), max_size=100)
+
+
+class PackTests(TestCase):
+    def test_round_trip(self):
+        for format in ("tar", "tar.gz", "zip"):
+            with self.subTest(format=format):
+                archive = pack(FILES, format)
+                self.assertEqual(archive.path, f"output.{format}")
+                self.assertEqual(extract(archive.content), FILES)
+
+    def test_deterministic(self):
+        self.assertEqual(bytes(pack(FILES, "zip").content), bytes(pack(FILES, "zip").content))
+
+    def test_unsupported_format(self):
+        with self.assertRaises(ValueError):
+            pack(FILES, "rar")
@@ -0,0 +1,142 @@
+import hashlib
+import io
+import os
+import subprocess
+import time
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from unittest import TestCase
+
+from nsbox.blobs import (
+    BlobAttachment,
+    BlobDigestError,
+    BlobNotFoundError,
+    BlobStore,
+    BlobTooLargeError,
+)
+from nsbox.cache import cache_key
+from nsbox.nsio import FileAttachment
+
+
+def sha256(content: bytes) -> str:
+    return hashlib.sha256(content).hexdigest()
+
+
+class BlobStoreTests(TestCase):
+    def setUp(self):
+        super().setUp()
+        tmp = TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.path = Path(tmp.name)
+        self.store = BlobStore(self.path, max_bytes=100)
+
+    def put(self, content: bytes) -> str:
+        digest = sha256(content)
+        self.store.put(digest, io.BytesIO(content), chunk_size=7)
+        return digest
+
+    def age(self, digest: str, seconds: float) -> None:
+        """Make a blob look like it was last used `seconds` ago."""
+        then = time.time() - seconds
+        os.utime(self.path / digest, (then, then))
+
+    def test_put(self):
+        content = b"a" * 50
+        digest = sha256(content)
+
+        self.assertTrue(self.store.put(digest, io.BytesIO(content), chunk_size=7))
+        self.assertFalse(self.store.put(digest, io.BytesIO(b"")))
+        self.assertIn(digest, self.store)
+        self.assertEqual(self.store.size(digest), 50)
+        self.assertEqual((self.path / digest).read_bytes(), content)
+        self.assertEqual((self.path / digest).stat().st_mode & 0o777, 0o444)
+
+    def test_put_digest_mismatch(self):
+        digest = sha256(b"expected")
+        with self.assertRaises(BlobDigestError):
+            self.store.put(digest, io.BytesIO(b"actual"))
+
+        self.assertNotIn(digest, self.store)
+        self.assertEqual(os.listdir(self.path / ".tmp"), [])
+
+    def test_put_too_large(self):
+        content = b"a" * 101
+        with self.assertRaises(BlobTooLargeError):
+            self.store.put(sha256(content), io.BytesIO(content))
+
+        self.assertEqual(os.listdir(self.path / ".tmp"), [])
+
+    def test_invalid_digest(self):
+        for digest in ("", "../" + "0" * 61, "A" * 64, ".tmp"):
+            with self.subTest(digest=digest):
+                self.assertNotIn(digest, self.store)
+                self.assertFalse(self.store.touch(digest))
+                with self.assertRaises(ValueError):
+                    self.store.put(digest, io.BytesIO(b""))
+
+    def test_evicts_least_recently_used(self):
+        old = self.put(b"a" * 40)
+        used = self.put(b"b" * 40)
+        self.age(old, 20)
+        self.age(used, 30)
+        self.store.touch(used)
+
+        new = self.put(b"c" * 40)
+        self.assertNotIn(old, self.store)
+        self.assertIn(used, self.store)
+        self.assertIn(new, self.store)
+
+    def test_checked_out_blobs_not_evicted(self):
+        pinned = self.put(b"a" * 60)
+        self.age(pinned, 20)
+
+        with self.store.checkout(pinned) as link:
+            self.assertEqual(link.read_bytes(), b"a" * 60)
+            new = self.put(b"b" * 60)
+            self.assertIn(pinned, self.store)
+
+        self.assertEqual(os.listdir(self.path / ".runs"), [])
+        self.age(new, 10)
+        self.store.evict()
+        self.assertNotIn(pinned, self.store)
+        self.assertIn(new, self.store)
+
+    def test_links_of_exited_processes_pruned(self):
+        digest = self.put(b"a" * 60)
+        process = subprocess.Popen(["true"])
+        process.wait()
+        os.link(self.path / digest, self.path / ".runs" / f"{process.pid}-stale")
+        self.age(digest, 20)
+
+        self.put(b"b" * 60)
+        self.assertEqual(os.listdir(self.path / ".runs"), [])
+        self.assertNotIn(digest, self.store)
+
+    def test_checkout_evicted(self):
+        with self.assertRaises(FileNotFoundError):
+            with self.store.checkout(sha256(b"missing")):
+                pass
+
+    def test_attachment(self):
+        digest = self.put(b"content")
+        self.age(digest, 20)
+
+        file = self.store.attachment("data/file.txt", digest)
+        self.assertIsInstance(file, BlobAttachment)
+        self.assertEqual(file.path, "data/file.txt")
+        self.assertEqual(file.size, 0)
+        self.assertEqual(file.sha256, digest)
+        self.assertLess(time.time() - (self.path / digest).stat().st_mtime, 10)
+
+        with self.assertRaises(BlobNotFoundError):
+            self.store.attachment("file.txt", sha256(b"missing"))
+
+    def test_cache_key(self):
+        """Files should have the same cache key whether they are stored or sent."""
+        digest = self.put(b"content")
+
+        inline = cache_key("python", "config", [], [FileAttachment("a", b"content")])
+        stored = cache_key("python", "config", [], [self.store.attachment("a", digest)])
+        other = cache_key("python", "config", [], [FileAttachment("a", b"other")])
+        self.assertEqual(inline, stored)
+        self.assertNotEqual(stored, other)
@@ -0,0 +1,77 @@
+import time
+from unittest import TestCase, mock
+
+from nsbox.cache import ResultCache, cache_key
+from nsbox.nsio import FileAttachment
+from nsbox.process import EvalResult
+
+
+class CacheKeyTests(TestCase):
+    def test_key_depends_on_every_part(self):
+        files = [FileAttachment("a.py", b"print(1)")]
+        key = cache_key("python", "digest", ["-c", "1"], files)
+
+        self.assertEqual(key, cache_key("python", "digest", ("-c", "1"), iter(files)))
+        for other in (
+            cache_key("nodejs", "digest", ["-c", "1"], files),
+            cache_key("python", "other", ["-c", "1"], files),
+            cache_key("python", "digest", ["-c", "2"], files),
+            cache_key("python", "digest", ["-c1"], files),
+            cache_key("python", "digest", ["-c", "1"], [FileAttachment("a.py", b"print(2)")]),
+            cache_key("python", "digest", ["-c", "1"], [FileAttachment("b.py", b"print(1)")]),
+            cache_key("python", "digest", ["-c", "1"], []),
+        ):
+            self.assertNotEqual(key, other)
+
+
+class ResultCacheTests(TestCase):
+    def test_hit_and_miss(self):
+        cache = ResultCache()
+        result = EvalResult([], 0, "output")
+
+        self.assertIsNone(cache.get("key"))
+        self.assertTrue(cache.put("key", result))
+        self.assertIs(cache.get("key"), result)
+
+        stats = cache.stats()
+        self.assertEqual((stats["hits"], stats["misses"], stats["entries"]), (1, 1, 1))
+        self.assertEqual(stats["bytes"], len("output"))
+
+    def test_incomplete_results_are_not_cached(self):
+        cache = ResultCache()
+        for returncode in (None, 137, 143, 255):
+            with self.subTest(returncode=returncode):
+                self.assertFalse(cache.put("key", EvalResult([], returncode, "")))
+        self.assertEqual(len(cache), 0)
+
+    def test_ttl(self):
+        cache = ResultCache(ttl=10)
+        cache.put("key", EvalResult([], 0, ""))
+
+        with mock.patch("nsbox.cache.time.monotonic", return_value=time.monotonic() + 11):
+            self.assertIsNone(cache.get("key"))
+        self.assertEqual(len(cache), 0)
+
+    def test_lru_eviction(self):
+        cache = ResultCache(max_entries=2)
+        for key in "abc":
+            if key == "c":
+                # Using "a" makes "b" the least recently used.
+                cache.get("a")
+            cache.put(key, EvalResult([], 0, key))
+
+        self.assertIsNone(cache.get("b"))
+        self.assertIsNotNone(cache.get("a"))
+        self.assertIsNotNone(cache.get("c"))
+        self.assertEqual(cache.stats()["evictions"], 1)
+
+    def test_size_limit(self):
+        cache = ResultCache(max_bytes=10)
+        files = [FileAttachment("f", b"12345")]
+
+        self.assertFalse(cache.put("big", EvalResult([], 0, "x" * 11)))
+        self.assertTrue(cache.put("a", EvalResult([], 0, "1234", files=files)))
+        self.assertTrue(cache.put("b", EvalResult([], 0, "1234")))
+
+        self.assertIsNone(cache.get("a"))
+        self.assertEqual(cache.stats()["bytes"], 4)
@@ -0,0 +1,137 @@
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+from unittest import TestCase
+
+from nsbox.config_pb2 import NsJailConfig
+from nsbox.nsjail import NsJail
+from nsbox.utils.cgroup import RUN_CGROUPS_V2, RunCgroup, get_version
+
+
+class RunCgroupTests(TestCase):
+    def setUp(self):
+        super().setUp()
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.mount = Path(tmp.name)
+
+    def config_v1(self) -> NsJailConfig:
+        config = NsJailConfig()
+        config.cgroup_mem_max = 50 * 1024**2
+        config.cgroup_mem_mount = str(self.mount / "memory")
+        config.cgroup_mem_parent = "NSJAIL"
+        config.cgroup_pids_max = 6
+        config.cgroup_pids_mount = str(self.mount / "pids")
+        config.cgroup_pids_parent = "NSJAIL"
+        return config
+
+    def test_v1_create_and_remove(self):
+        for controller in ("memory", "pids", "cpu"):
+            (self.mount / controller / "NSJAIL").mkdir(parents=True)
+
+        cgroup = RunCgroup(self.config_v1(), 1)
+        with cgroup:
+            # Only the controllers in-use by the config are used.
+            self.assertEqual(
+                cgroup.paths,
+                [self.mount / c / "NSJAIL" / cgroup.name for c in ("memory", "pids")],
+            )
+            self.assertEqual(
+                cgroup.nsjail_args,
+                (
+                    "--cgroup_mem_parent",
+                    f"NSJAIL/{cgroup.name}",
+                    "--cgroup_pids_parent",
+                    f"NSJAIL/{cgroup.name}",
+                ),
+            )
+            for path in cgroup.paths:
+                self.assertTrue(path.is_dir())
+            # A cgroup NsJail failed to remove.
+            (cgroup.paths[0] / "NSJAIL.123").mkdir()
+
+        for path in cgroup.paths:
+            self.assertFalse(path.exists())
+
+    def test_v1_stats(self):
+        cgroup = RunCgroup(self.config_v1(), 1)
+        memory, pids = cgroup.paths
+        memory.mkdir(parents=True)
+        pids.mkdir(parents=True)
+        (memory / "memory.max_usage_in_bytes").write_text("8822784\n")
+        (memory / "memory.oom_control").write_text("oom_kill_disable 0\nunder_oom 0\noom_kill 1\n")
+        (pids / "pids.peak").write_text("3\n")
+
+        self.assertEqual(cgroup.stats(), {"memory_peak": 8822784, "oom_kills": 1, "pids_peak": 3})
+
+    def test_v2_stats(self):
+        config = NsJailConfig()
+        config.cgroupv2_mount = str(self.mount)
+        cgroup = RunCgroup(config, 2)
+
+        path = self.mount / RUN_CGROUPS_V2 / cgroup.name
+        self.assertEqual(cgroup.paths, [path])
+        self.assertEqual(cgroup.nsjail_args, ("--cgroupv2_mount", str(path)))
+
+        path.mkdir(parents=True)
+        (path / "cpu.stat").write_text("usage_usec 250000\nuser_usec 200000\nsystem_usec 50000\n")
+        (path / "memory.peak").write_text("8822784\n")
+        (path / "memory.events").write_text("low 0\nhigh 0\nmax 2\noom 1\noom_kill 1\n")
+        (path / "pids.peak").write_text("2\n")
+        (path / "io.stat").write_text(
+            "8:0 rbytes=4096 wbytes=0 rios=1 wios=0 dbytes=0 dios=0\n"
+            "8:16 rbytes=4096 wbytes=8192 rios=1 wios=2 dbytes=0 dios=0\n"
+        )
+
+        expected = {
+            "cpu_time": 0.25,
+            "memory_peak": 8822784,
+            "oom_kills": 1,
+            "pids_peak": 2,
+            "io_read_bytes": 8192,
+            "io_write_bytes": 8192,
+        }
+        self.assertEqual(cgroup.stats(), expected)
+
+        # Counters are relative to the last reset, but peaks aren't.
+        cgroup.reset()
+        (path / "cpu.stat").write_text("usage_usec 750000\n")
+        self.assertEqual(
+            cgroup.stats(),
+            {**expected, "cpu_time": 0.5, "oom_kills": 0, "io_read_bytes": 0, "io_write_bytes": 0},
+        )
+
+    def test_missing_stats_are_left_out(self):
+        config = NsJailConfig()
+        config.cgroupv2_mount = str(self.mount)
+        cgroup = RunCgroup(config, 2)
+        self.assertEqual(cgroup.stats(), {})
+
+    def test_stats_of_exited_process(self):
+        config = NsJail._read_config("./config/nsbox_py.cfg")
+        version = get_version(config)
+        cgroup = RunCgroup(config, version)
+        try:
+            cgroup.create()
+        except OSError as e:
+            self.skipTest(f"Cannot create cgroups: {e}")
+        self.addCleanup(cgroup.remove)
+
+        process = subprocess.Popen(
+            [sys.executable, "-c", "import sys; sys.stdin.read(); x = ' ' * 32 * 1024**2"],
+            stdin=subprocess.PIPE,
+        )
+        # Like NsJail, run the process in a child cgroup which is removed once it exits.
+        children = [path / "NSJAIL.test" for path in cgroup.paths]
+        for child in children:
+            child.mkdir()
+            (child / "cgroup.procs").write_text(str(process.pid))
+        process.communicate(timeout=10)
+        for child in children:
+            child.rmdir()
+
+        stats = cgroup.stats()
+        self.assertGreaterEqual(stats["memory_peak"], 32 * 1024**2)
+        if "pids_peak" in stats:
+            self.assertEqual(stats["pids_peak"], 1)
@@ -0,0 +1,74 @@
+import threading
+import time
+from unittest import TestCase
+
+from nsbox.jobs import JobQueue, JobStatus, QueueFullError
+from nsbox.process import EvalResult
+
+
+class JobQueueTests(TestCase):
+    def setUp(self):
+        super().setUp()
+        self.release = threading.Event()
+        self.running: list[str] = []
+
+    def make_queue(self, **kwargs) -> JobQueue:
+        queue = JobQueue(**kwargs)
+        self.addCleanup(queue.close)
+        self.addCleanup(self.release.set)
+        return queue
+
+    def blocking(self, name: str):
+        def func():
+            self.running.append(name)
+            self.release.wait()
+            return EvalResult([], 0, name)
+
+        return func
+
+    def wait_for(self, predicate):
+        for _ in range(100):
+            if predicate():
+                return
+            time.sleep(0.01)
+        self.fail("Condition was not met in time")
+
+    def test_result(self):
+        queue = self.make_queue()
+        job = queue.submit("python", lambda: EvalResult([], 0, "hello"))
+
+        self.wait_for(lambda: job.status is JobStatus.DONE)
+        self.assertEqual(queue.get(job.id)["result"]["stdout"], "hello")
+
+    def test_queue_full(self):
+        queue = self.make_queue(workers=1, max_queued=1)
+        queue.submit("python", self.blocking("a"))
+        self.wait_for(lambda: self.running == ["a"])
+
+        queue.submit("python", self.blocking("b"))
+        with self.assertRaises(QueueFullError):
+            queue.submit("python", self.blocking("c"))
+
+    def test_language_limits(self):
+        """A language at its limit should not block jobs of other languages."""
+        queue = self.make_queue(workers=3, language_limits={"python": 1})
+        jobs = [
+            queue.submit("python", self.blocking("py1")),
+            queue.submit("python", self.blocking("py2")),
+            queue.submit("nodejs", self.blocking("js1")),
+        ]
+        self.wait_for(lambda: sorted(self.running) == ["js1", "py1"])
+        self.assertEqual(jobs[1].status, JobStatus.QUEUED)
+        self.assertEqual(queue.stats()["running"], 2)
+
+        self.release.set()
+        self.wait_for(lambda: all(job.status is JobStatus.DONE for job in jobs))
+        self.assertEqual(self.running[-1], "py2")
+
+    def test_result_ttl(self):
+        queue = self.make_queue(result_ttl=0)
+        job = queue.submit("python", lambda: EvalResult([], 0))
+
+        self.wait_for(lambda: job.finished is not None)
+        time.sleep(0.01)
+        self.assertIsNone(queue.get(job.id))
@@ -0,0 +1,139 @@
+import asyncio
+import threading
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from unittest import TestCase, mock
+
+from nsbox.languages import Language, LanguageBusyError, LanguageRegistry, UnknownLanguageError
+
+
+class LanguageRegistryTests(TestCase):
+    def setUp(self):
+        super().setUp()
+        tmp = TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.dir = Path(tmp.name)
+
+    def write(self, name: str, content: str) -> Path:
+        path = self.dir / name
+        path.write_text(content)
+        return path
+
+    def test_from_file(self):
+        path = self.write(
+            "ruby.toml",
+            'config = "../ruby.cfg"\n'
+            'default_args = ["-e"]\n'
+            "max_concurrency = 2\n"
+            "[nsjail]\n"
+            "memfs_pool_size = 4\n",
+        )
+        language = Language.from_file(path)
+
+        self.assertEqual(language.name, "ruby")
+        self.assertEqual(language.config_path, self.dir.parent / "ruby.cfg")
+        self.assertEqual(language.default_args, ("-e",))
+        self.assertEqual(language.max_concurrency, 2)
+        self.assertEqual(language.options, {"memfs_pool_size": 4})
+
+    def test_from_file_invalid(self):
+        cases = (
+            "config = ",
+            'name = "ruby"',
+            'config = "ruby.cfg"\nmax_workers = 2',
+            'config = "ruby.cfg"\nmax_concurrency = "many"',
+        )
+        for content in cases:
+            with self.subTest(content=content), self.assertRaises(ValueError):
+                Language.from_file(self.write("ruby.toml", content))
+
+    def test_from_dir(self):
+        self.write("a.toml", 'name = "python"\nconfig = "py.cfg"')
+        self.write("b.toml", 'name = "nodejs"\nconfig = "js.cfg"')
+        self.write("c.txt", "not a language")
+
+        registry = LanguageRegistry.from_dir(self.dir, mock.Mock())
+        self.assertEqual(registry.names, ["nodejs", "python"])
+
+    def test_from_dir_duplicate(self):
+        self.write("a.toml", 'name = "python"\nconfig = "a.cfg"')
+        self.write("b.toml", 'name = "python"\nconfig = "b.cfg"')
+
+        with self.assertRaises(ValueError):
+            LanguageRegistry.from_dir(self.dir, mock.Mock())
+
+    def test_default_languages(self):
+        registry = LanguageRegistry.from_dir("config/languages", mock.Mock())
+
+        self.assertEqual(registry.names, ["nodejs", "python"])
+        self.assertEqual(registry.language("python").default_args, ("-c",))
+        self.assertEqual(registry.language("nodejs").default_args, ("-e",))
+        for name in registry.names:
+            self.assertTrue(registry.language(name).config_path.is_file())
+
+    def test_lazy_runners(self):
+        factory = mock.Mock(side_effect=lambda language: language.name)
+        registry = LanguageRegistry(
+            [Language("python", Path("py.cfg")), Language("nodejs", Path("js.cfg"))], factory
+        )
+        factory.assert_not_called()
+
+        self.assertEqual(registry.get("python"), "python")
+        self.assertEqual(registry.get("python"), "python")
+        factory.assert_called_once_with(registry.language("python"))
+        self.assertEqual(registry.runners, {"python": "python"})
+
+    def test_unknown_language(self):
+        registry = LanguageRegistry([Language("python", Path("py.cfg"))], mock.Mock())
+
+        self.assertNotIn("cobol", registry)
+        with self.assertRaisesRegex(UnknownLanguageError, "'python'"):
+            registry.get("cobol")
+        with self.assertRaises(UnknownLanguageError):
+            with registry.slot("cobol"):
+                pass
+
+    def test_slot_limit(self):
+        language = Language("python", Path("py.cfg"), max_concurrency=1, wait_timeout=0.01)
+        registry = LanguageRegistry([language], mock.Mock())
+
+        with registry.slot("python"):
+            acquired = []
+
+            def other():
+                try:
+                    with registry.slot("python"):
+                        acquired.append(True)
+                except LanguageBusyError:
+                    acquired.append(False)
+
+            thread = threading.Thread(target=other)
+            thread.start()
+            thread.join()
+            self.assertEqual(acquired, [False])
+
+        # The slot is free again once released.
+        with registry.slot("python"):
+            pass
+
+    def test_slot_unlimited(self):
+        registry = LanguageRegistry([Language("python", Path("py.cfg"))], mock.Mock())
+
+        with registry.slot("python"), registry.slot("python"):
+            pass
+
+    def test_async_slot_limit(self):
+        language = Language("python", Path("py.cfg"), max_concurrency=1, wait_timeout=0.01)
+        registry = LanguageRegistry([language], mock.Mock())
+
+        async def main():
+            async with registry.async_slot("python"):
+                with self.assertRaises(LanguageBusyError):
+                    async with registry.async_slot("python"):
+                        pass
+            async with registry.async_slot("python"):
+                pass
+
+        loop = asyncio.new_event_loop()
+        self.addCleanup(loop.close)
+        loop.run_until_complete(main())
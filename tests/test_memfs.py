@@ -1,10 +1,16 @@
 import logging
+import os
+import time
 from concurrent.futures import ThreadPoolExecutor
 from contextlib import ExitStack
 from unittest import TestCase, mock
 from uuid import uuid4
 
-from nsbox.memfs import MemFS
+from nsbox.memfs import FileWriteError, MemFS, MemFSPool
+from nsbox.nsio import FileAttachment, SkippedFile
+from nsbox.utils.snapshot import Snapshot
+from nsbox.utils.timed import Deadline
+from nsbox.utils.walk import WalkLimitError
 
 UUID_TEST = uuid4()
 
@@ -63,3 +69,258 @@ class MemFSTests(TestCase):
         with self.assertWarns(ResourceWarning):
             del memfs
         self.assertFalse(path.exists())
+
+    def test_wipe(self):
+        """Wiping should remove all files and recreate home."""
+        with MemFS(1024 * 1024) as memfs:
+            (memfs.home / "dir").mkdir()
+            (memfs.home / "dir" / "test.txt").write_text("Hello")
+            (memfs.path / "other.txt").write_text("World")
+
+            self.assertTrue(memfs.wipe())
+            self.assertEqual([p.name for p in memfs.path.iterdir()], ["home"])
+            self.assertEqual(list(memfs.home.iterdir()), [])
+
+    def test_wipe_dirty(self):
+        """Wiping should report a dirty tmpfs if space is still held by an open file."""
+        with MemFS(1024 * 1024) as memfs:
+            file = memfs.home / "test.txt"
+            file.write_text("Hello" * 1000)
+            with file.open():
+                self.assertFalse(memfs.wipe())
+            self.assertTrue(memfs.wipe())
+
+    def test_write_files(self):
+        """Files should be written with their directories and mode, and recorded in a snapshot."""
+        files = [
+            FileAttachment("a.txt", b"a"),
+            FileAttachment("dir/sub/b.txt", b"b" * 100_000),
+            FileAttachment("dir/sub/../c.txt", memoryview(b"c")),
+            FileAttachment("dir/sub/d.txt", b""),
+        ]
+        old_umask = os.umask(0o022)
+        self.addCleanup(os.umask, old_umask)
+
+        with MemFS(1024 * 1024) as memfs, mock.patch("os.mkdir", wraps=os.mkdir) as mkdir:
+            snapshot = memfs.write_files(files)
+
+            self.assertEqual(mkdir.call_count, 2)
+            self.assertEqual((memfs.home / "dir/sub/b.txt").read_bytes(), b"b" * 100_000)
+            self.assertEqual((memfs.home / "dir/c.txt").read_bytes(), b"c")
+            self.assertEqual((memfs.home / "a.txt").stat().st_mode & 0o777, 0o777)
+            self.assertEqual(len(snapshot), 4)
+            for file in ("a.txt", "dir/sub/b.txt", "dir/c.txt", "dir/sub/d.txt"):
+                self.assertFalse(snapshot.changed(memfs.home / file), file)
+
+    def test_write_files_error(self):
+        """A file which can't be created should be reported by its path."""
+        files = [FileAttachment("dir/test.txt", b"abc"), FileAttachment("dir", b"xyz")]
+        with MemFS(1024 * 1024) as memfs:
+            with self.assertRaises(FileWriteError) as cm:
+                memfs.write_files(files)
+
+        self.assertEqual(cm.exception.path, "dir")
+        self.assertIsInstance(cm.exception.error, IsADirectoryError)
+        self.assertEqual(str(cm.exception), "IsADirectoryError: Failed to create file 'dir'.")
+
+    @mock.patch("nsbox.nsio.MMAP_MIN_SIZE", 1000)
+    def test_files_are_mapped_and_outlive_cleanup(self):
+        """Large files should be mapped rather than read, and remain valid once unmounted."""
+        with MemFS(1024 * 1024) as memfs:
+            (memfs.output / "a.txt").write_bytes(b"a" * 1000)
+            (memfs.output / "b.txt").write_bytes(b"b" * 999)
+            (memfs.output / "empty").write_bytes(b"")
+            files = memfs.files_list(limit=10, pattern="**/*")
+
+        self.assertEqual([file.path for file in files], ["a.txt", "b.txt", "empty"])
+        self.assertIsInstance(files[0].content, memoryview)
+        self.assertEqual(files[0].content, b"a" * 1000)
+        self.assertEqual(files[1].content, b"b" * 999)
+        self.assertIsInstance(files[1].content, bytes)
+        self.assertEqual(files[2].content, b"")
+
+    def test_files_max_bytes(self):
+        """Files that would exceed the size budget should be skipped."""
+        with MemFS(1024 * 1024) as memfs:
+            for name, size in (("a", 600), ("b", 600), ("c", 400)):
+                (memfs.output / name).write_bytes(b"x" * size)
+            files = memfs.files_list(limit=10, pattern="**/*", max_bytes=1000)
+
+        self.assertLessEqual(sum(file.size for file in files), 1000)
+        self.assertEqual(len(files), 2)
+        self.assertIn("c", [file.path for file in files])
+
+    def test_files_max_encoded_size(self):
+        """Files should be skipped in order of path once they exceed the encoded size limit."""
+        with MemFS(1024 * 1024) as memfs:
+            for name, size in (("c", 30), ("a", 300), ("b", 30)):
+                (memfs.output / name).write_bytes(b"x" * size)
+            budget = sum(FileAttachment(name, b"x" * 30).encoded_size for name in ("b", "c"))
+
+            skipped = []
+            files = memfs.files_list(
+                limit=10, pattern="**/*", max_encoded_size=budget, skipped=skipped
+            )
+
+        self.assertEqual([file.path for file in files], ["b", "c"])
+        self.assertEqual(skipped, [SkippedFile("a", 300)])
+
+    def test_files_limit_keeps_first_paths(self):
+        """Only the first files in order of path should be kept, however many there are."""
+        with MemFS(1024 * 1024) as memfs:
+            for i in reversed(range(50)):
+                (memfs.output / f"{i:02}").write_bytes(b"x")
+            with mock.patch(
+                "nsbox.nsio.FileAttachment.from_path", wraps=FileAttachment.from_path
+            ) as from_path:
+                files = memfs.files_list(limit=5, pattern="**/*")
+
+        self.assertEqual([file.path for file in files], ["00", "01", "02", "03", "04"])
+        self.assertEqual(from_path.call_count, 5)
+
+    def test_files_skipped_are_not_opened(self):
+        """Files skipped due to the size limits should not be mapped."""
+        with MemFS(1024 * 1024) as memfs:
+            for name, size in (("a", 600), ("b", 600)):
+                (memfs.output / name).write_bytes(b"x" * size)
+            skipped = []
+            with mock.patch(
+                "nsbox.nsio.FileAttachment.from_path", wraps=FileAttachment.from_path
+            ) as from_path:
+                files = memfs.files_list(limit=10, pattern="**/*", max_bytes=1000, skipped=skipped)
+
+        self.assertEqual([file.path for file in files], ["a"])
+        self.assertEqual(skipped, [SkippedFile("b", 600)])
+        from_path.assert_called_once()
+
+    def test_files_exclude_unmodified(self):
+        """Files which weren't modified since they were written should be excluded."""
+        with MemFS(1024 * 1024) as memfs:
+            for name in ("a", "b", "c"):
+                (memfs.output / name).write_bytes(b"x")
+            written = Snapshot()
+            for name in ("a", "b"):
+                written.add(memfs.output / name)
+
+            # Rewritten with the same size, possibly within the same tick of a coarse clock.
+            (memfs.output / "b").write_bytes(b"y")
+            files = memfs.files_list(limit=10, pattern="**/*", exclude_files=written)
+
+        self.assertEqual([file.path for file in files], ["b", "c"])
+
+    def test_files_walk_limits(self):
+        """Output directories deeper or larger than the limits should fail the search."""
+        with MemFS(1024 * 1024) as memfs:
+            memfs.mkdir("home/a/b")
+            (memfs.output / "a" / "b" / "file").write_bytes(b"x")
+            self.assertEqual(len(memfs.files_list(10, "**/*", max_depth=2, max_entries=3)), 1)
+            with self.assertRaisesRegex(WalkLimitError, "depth"):
+                memfs.files_list(10, "**/*", max_depth=1)
+            with self.assertRaisesRegex(WalkLimitError, "entry"):
+                memfs.files_list(10, "**/*", max_entries=2)
+
+    def test_files_deadline(self):
+        """File parsing should stop once its deadline expires or is cancelled."""
+        with MemFS(1024 * 1024) as memfs:
+            (memfs.output / "a").write_bytes(b"a")
+            for deadline in (Deadline(0), Deadline(10)):
+                deadline.cancel()
+                with self.subTest(deadline=deadline), self.assertRaises(TimeoutError):
+                    memfs.files_list(limit=10, pattern="**/*", deadline=deadline)
+
+            files = memfs.files_list(limit=10, pattern="**/*", deadline=Deadline(10))
+            self.assertEqual(len(files), 1)
+
+
+class MemFSPoolTests(TestCase):
+    def setUp(self):
+        super().setUp()
+        self.logger = logging.getLogger("nsbox.memfs")
+        self.logger.setLevel(logging.WARNING)
+
+        self.pool = MemFSPool(2, 1024 * 1024)
+        self.addCleanup(self.pool.close)
+
+    def wait_idle(self, count: int):
+        """Wait for the background thread to bring the pool to `count` idle instances."""
+        for _ in range(100):
+            if self.pool.stats()["idle"] == count and not self.pool.stats()["resetting"]:
+                return
+            time.sleep(0.01)
+        self.fail(f"Pool did not reach {count} idle instances: {self.pool.stats()}")
+
+    def test_hit_and_miss(self):
+        """The first acquire should miss, and later ones should hit the pre-mounted instances."""
+        with self.pool.memfs() as memfs:
+            self.assertTrue(memfs.path.is_mount())
+        self.assertEqual(self.pool.stats()["misses"], 1)
+
+        self.wait_idle(2)
+        with self.pool.memfs() as memfs:
+            self.assertTrue(memfs.path.is_mount())
+        self.assertEqual(self.pool.stats()["hits"], 1)
+
+    def test_released_instances_are_wiped(self):
+        """Files written by a previous user should not be visible to the next one."""
+        self.pool.release(self.pool.acquire())
+        self.wait_idle(2)
+
+        memfs = self.pool.acquire()
+        (memfs.home / "secret.txt").write_text("secret")
+        self.pool.release(memfs)
+        self.wait_idle(2)
+
+        instances = [self.pool.acquire(), self.pool.acquire()]
+        self.assertIn(memfs, instances)
+        for memfs in instances:
+            self.assertEqual(list(memfs.home.iterdir()), [])
+            self.pool.release(memfs)
+
+    def test_dirty_instance_is_remounted(self):
+        """An instance that cannot be wiped clean should be replaced by a new mount."""
+        memfs = self.pool.acquire()
+        self.wait_idle(2)
+
+        with (memfs.home / "test.txt").open("w") as file:
+            file.write("Hello" * 1000)
+            file.flush()
+            self.pool.release(memfs)
+            self.wait_idle(2)
+
+        self.assertEqual(self.pool.stats()["remounts"], 1)
+        self.assertFalse(memfs.path.exists())
+
+    def test_instance_reused_after_files_are_collected(self):
+        """Collecting small output files shouldn't keep an instance from being wiped clean."""
+        self.pool.release(self.pool.acquire())
+        self.wait_idle(2)
+        memfs = self.pool.acquire()
+
+        (memfs.output / "output.txt").write_text("Hello" * 1000)
+        files = memfs.files_list(limit=10, pattern="**/*")
+        self.pool.release(memfs)
+        self.wait_idle(2)
+
+        self.assertEqual(files[0].content, b"Hello" * 1000)
+        self.assertEqual(self.pool.stats()["remounts"], 0)
+        self.assertTrue(memfs.path.is_mount())
+
+    def test_high_water(self):
+        """Instances released beyond the high water mark should be unmounted."""
+        instances = [self.pool.acquire() for _ in range(4)]
+        for memfs in instances:
+            self.pool.release(memfs)
+        self.wait_idle(2)
+
+        self.assertLessEqual(sum(memfs.path.exists() for memfs in instances), 2)
+
+    def test_close(self):
+        """Closing the pool should unmount all idle instances."""
+        memfs = self.pool.acquire()
+        self.pool.release(memfs)
+        self.wait_idle(2)
+        self.pool.close()
+
+        self.assertFalse(memfs.path.exists())
+        with self.assertRaises(RuntimeError):
+            self.pool.acquire()
@@ -1,17 +1,32 @@
+import hashlib
 import io
 import logging
+import os
 import shutil
+import signal
+import subprocess
 import sys
 import tempfile
+import time
 import unittest
 import unittest.mock
+from concurrent.futures import ThreadPoolExecutor
 from itertools import product
 from pathlib import Path
 from textwrap import dedent
 
+from google.protobuf import text_format
+
+from nsbox.blobs import BlobAttachment, BlobStore
+from nsbox.config_pb2 import NsJailConfig
 from nsbox.filesystem import Size
-from nsbox.nsjail import NsJail
-from nsbox.nsio import FileAttachment
+from nsbox.memfs import MemFS
+from nsbox.nsio import FileAttachment, SkippedFile
+from nsbox.nsjail import WALL_TIME_GRACE, NsJail
+from nsbox.process import EvalResult
+from nsbox.utils import metrics
+from nsbox.utils.logging import RunIdFilter
+from nsbox.warm import BOOTSTRAP, WarmJail
 
 
 class NsJailTests(unittest.TestCase):
@@ -264,6 +279,63 @@ class NsJailTests(unittest.TestCase):
         self.assertEqual(result.stderr, None)
         self.assertEqual(result.returncode, None)
 
+    def test_memfs_pool_reused_after_files(self):
+        """Runs which return files should hand their MemFS instance back to the pool."""
+        nsjail = NsJail(memfs_instance_size=2 * Size.MiB, memfs_pool_size=1)
+        self.addCleanup(nsjail.memfs_pool.close)
+        code = "open('output.txt', 'w').write('hello' * 1000)"
+
+        results = []
+        for _ in range(3):
+            results.append(nsjail.run_code(["-c", code]))
+            for _ in range(100):
+                if not nsjail.memfs_pool.stats()["resetting"]:
+                    break
+                time.sleep(0.01)
+
+        for result in results:
+            self.assertEqual(result.returncode, 0)
+            self.assertEqual(result.files, [FileAttachment("output.txt", b"hello" * 1000)])
+        stats = nsjail.memfs_pool.stats()
+        self.assertEqual(stats["remounts"], 0)
+        self.assertEqual(stats["hits"], 2)
+
+    def test_blob_mounted_read_only(self):
+        """Blobs should be readable at their path, but neither writable nor returned."""
+        code = dedent(
+            """
+            print(open("data/blob.txt").read())
+            try:
+                open("data/blob.txt", "w")
+            except OSError as e:
+                print(type(e).__name__)
+            """
+        ).strip()
+
+        with tempfile.TemporaryDirectory() as tmp:
+            store = BlobStore(tmp, 1024)
+            content = b"stored"
+            digest = hashlib.sha256(content).hexdigest()
+            store.put(digest, io.BytesIO(content))
+
+            result = self.nsjail.run_code(["-c", code], [store.attachment("data/blob.txt", digest)])
+            self.assertEqual(result.stdout, "stored\nOSError\n")
+            self.assertEqual(result.returncode, 0)
+            self.assertEqual(result.files, [])
+            self.assertEqual(os.listdir(Path(tmp, ".runs")), [])
+
+    def test_blob_not_stored(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            store = BlobStore(tmp, 1024)
+            digest = hashlib.sha256(b"evicted").hexdigest()
+            store.put(digest, io.BytesIO(b"evicted"))
+            file = store.attachment("blob.txt", digest)
+            os.unlink(Path(tmp, digest))
+
+            result = self.nsjail.run_code([""], [file])
+        self.assertEqual(result.stdout, "FileNotFoundError: Failed to create file 'blob.txt'.")
+        self.assertEqual(result.returncode, None)
+
     def test_sigsegv_returns_139(self):  # In honour of Juan.
         code = dedent(
             """
@@ -396,18 +468,266 @@ class NsJailTests(unittest.TestCase):
         result = self.eval_file(code)
         self.assertEqual(result.returncode, 143)
 
+    def popen(self, code: str) -> subprocess.Popen:
+        """Run Python code in a plain subprocess in place of NsJail."""
+        return subprocess.Popen(
+            [sys.executable, "-c", code], stdout=subprocess.PIPE, stderr=subprocess.STDOUT
+        )
+
     def test_large_output_is_truncated(self):
         chunk = "a" * self.nsjail.read_chunk_size
-        expected_chunks = self.nsjail.max_output_size // sys.getsizeof(chunk) + 1
-
-        nsjail_subprocess = unittest.mock.MagicMock()
+        chunks = self.nsjail.max_output_size // len(chunk) + 10
 
         # Go 10 chunks over to make sure we exceed the limit
-        nsjail_subprocess.stdout = io.StringIO((expected_chunks + 10) * chunk)
-        nsjail_subprocess.poll.return_value = None
+        nsjail_subprocess = self.popen(
+            f"import sys; sys.stdout.write({chunk!r} * {chunks}); sys.stdout.flush()"
+        )
+
+        output, stdout = self.nsjail._consume_stdout(nsjail_subprocess)
+        self.assertEqual(len(output), self.nsjail.max_output_size)
+        self.assertTrue(stdout.truncated)
+        self.assertEqual(nsjail_subprocess.returncode, -signal.SIGTERM)
 
-        output = self.nsjail._consume_stdout(nsjail_subprocess)
-        self.assertEqual(output, chunk * expected_chunks)
+    def test_truncated_output_drops_partial_character(self):
+        nsjail = NsJail(max_output_size=5)
+        output, _ = nsjail._consume_stdout(self.popen("print('abcd\N{SNOWMAN}' * 1000)"))
+        self.assertEqual(output, "abcd")
+
+    def test_output_is_streamed_in_chunks(self):
+        """Output should be yielded as soon as it's read, without splitting characters."""
+        code = dedent(
+            """
+            import sys, time
+            out = sys.stdout.buffer
+            for data in (b"ab", "\N{SNOWMAN}".encode()[:2], b"\\x83c"):
+                out.write(data)
+                out.flush()
+                time.sleep(0.1)
+            """
+        )
+
+        chunks = list(self.nsjail._iter_stdout(self.popen(code)))
+        self.assertEqual(chunks, ["ab", "\N{SNOWMAN}c"])
+
+    def test_invalid_unicode_output(self):
+        with self.assertRaises(UnicodeDecodeError):
+            self.nsjail._consume_stdout(self.popen("import os; os.write(1, b'a\\xff')"))
+
+    def test_wall_time_limit_terminates_silent_process(self):
+        nsjail_subprocess = self.popen("import time; time.sleep(10)")
+
+        start = time.monotonic()
+        output, _ = self.nsjail._consume_stdout(nsjail_subprocess, timeout=0.5)
+        self.assertLess(time.monotonic() - start, 5)
+        self.assertEqual(output, "")
+        self.assertEqual(nsjail_subprocess.returncode, -signal.SIGTERM)
+
+    def test_wall_time_limit_from_config_and_args(self):
+        time_limit = self.nsjail.config.time_limit
+        cases = [
+            (None, (), time_limit + WALL_TIME_GRACE),
+            (None, ("--time_limit", "1"), 1 + WALL_TIME_GRACE),
+            (None, ("-t", "0"), None),
+            (3.5, ("--time_limit", "1"), 3.5),
+            (0, (), None),
+        ]
+        for wall_time_limit, args, expected in cases:
+            with self.subTest(wall_time_limit=wall_time_limit, args=args):
+                self.nsjail.wall_time_limit = wall_time_limit
+                self.assertEqual(self.nsjail._wall_time_limit(args), expected)
+
+    def warm_jail(self) -> WarmJail:
+        """Start the warm bootstrap in a plain subprocess in place of NsJail."""
+        fs = MemFS(2 * Size.MiB)
+        process = subprocess.Popen(
+            [sys.executable, "-BSqu", "-c", BOOTSTRAP],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT,
+            cwd=fs.home,
+        )
+        return WarmJail(process, fs, tempfile.TemporaryFile(), process.args)
+
+    def test_warm_pool_only_for_python(self):
+        with self.assertLogs(self.logger, logging.WARNING):
+            nsjail = NsJail(config_path="./config/nsbox_js.cfg", warm_pool_size=1)
+        self.assertIsNone(nsjail.warm_pool)
+        self.assertIsNotNone(NsJail(warm_pool_size=1).warm_pool)
+
+    def test_warm_jail_is_used_when_possible(self):
+        def stream(*args):
+            yield ""
+            return EvalResult([], 0, None)
+
+        self.nsjail.warm_pool = unittest.mock.Mock()
+        cases = (
+            (["", "-c", "print(1)"], (), True),
+            (["test.py"], (), True),
+            (["-c", "print(1)"], ("--time_limit", "1"), False),
+            (["-X", "dev", "-c", "print(1)"], (), False),
+            (
+                ["test.py"],
+                (),
+                False,
+                [BlobAttachment("a", b"", "0" * 64, unittest.mock.MagicMock())],
+            ),
+        )
+        for run_args, nsjail_args, warm, *files in cases:
+            with self.subTest(run_args=run_args, nsjail_args=nsjail_args, files=files):
+                with (
+                    unittest.mock.patch.object(
+                        self.nsjail, "_stream_warm", side_effect=stream
+                    ) as stream_warm,
+                    unittest.mock.patch.object(self.nsjail, "_stream", side_effect=stream) as cold,
+                ):
+                    self.nsjail.run_code(run_args, *files, nsjail_args=nsjail_args)
+                self.assertEqual(stream_warm.called, warm)
+                self.assertEqual(cold.called, not warm)
+
+    def test_warm_jail_runs_code(self):
+        files = [FileAttachment("test.py", b"import sys; print(sys.argv[1:])")]
+        stream = self.nsjail._stream_warm(self.warm_jail(), ["test.py", "arg"], files)
+
+        output = []
+        while True:
+            try:
+                output.append(next(stream))
+            except StopIteration as e:
+                result = e.value
+                break
+
+        self.assertEqual("".join(output), "['arg']\n")
+        self.assertEqual(result.returncode, 0)
+        self.assertEqual(result.files, [])
+
+    def test_concurrent_runs(self):
+        """Concurrent runs in threads should neither mix up their output, files, nor logs."""
+        code = dedent(
+            """
+            import sys, time
+            name = sys.argv[1]
+            with open(f"out_{name}.txt", "w") as f:
+                f.write(name * 1000)
+            for _ in range(50):
+                print(name, flush=True)
+                time.sleep(0.001)
+            """
+        )
+        files = [FileAttachment("test.py", code.encode())]
+        self.nsjail.warm_pool = unittest.mock.Mock(acquire=self.warm_jail)
+
+        records = []
+        handler = logging.Handler()
+        handler.emit = records.append
+        handler.addFilter(RunIdFilter())
+        self.logger.addHandler(handler)
+        self.logger.setLevel(logging.INFO)
+        self.addCleanup(self.logger.removeHandler, handler)
+
+        names = [str(i) for i in range(24)]
+        with ThreadPoolExecutor(8) as executor:
+            results = list(
+                executor.map(lambda name: self.nsjail.run_code(["test.py", name], files), names)
+            )
+
+        for name, result in zip(names, results):
+            with self.subTest(name=name):
+                self.assertEqual(result.returncode, 0)
+                self.assertEqual(result.stdout, f"{name}\n" * 50)
+                self.assertEqual(
+                    result.files, [FileAttachment(f"out_{name}.txt", name.encode() * 1000)]
+                )
+
+        # Each run logs that it found its files under its own ID.
+        found = [record for record in records if record.getMessage().startswith("Found ")]
+        self.assertEqual(len({record.run_id for record in found}), len(names))
+        self.assertNotIn("-", {record.run_id for record in records})
+
+    def test_response_size_limit(self):
+        """The output and then the files should be cut off at the response size limit."""
+        code = dedent(
+            """
+            for name, size in (("a", 3000), ("b", 30), ("c", 30)):
+                with open(name, "wb") as f:
+                    f.write(bytes(size))
+            print("hello")
+            """
+        )
+        files = [FileAttachment("test.py", code.encode())]
+        self.nsjail.warm_pool = unittest.mock.Mock(acquire=self.warm_jail)
+
+        # Enough for the output and "b", but not for "a" nor also "c".
+        size = len("hello\n") + FileAttachment("b", bytes(30)).encoded_size
+        self.nsjail.max_response_size = size + 1
+        result = self.nsjail.run_code(["test.py"], files)
+
+        self.assertEqual(result.stdout, "hello\n")
+        self.assertFalse(result.truncated)
+        self.assertEqual([file.path for file in result.files], ["b"])
+        self.assertEqual(result.skipped_files, [SkippedFile("a", 3000), SkippedFile("c", 30)])
+
+        self.nsjail.max_response_size = 3
+        result = self.nsjail.run_code(["test.py"], files)
+
+        self.assertEqual(result.stdout, "hel")
+        self.assertTrue(result.truncated)
+        self.assertEqual(result.files, [])
+        self.assertEqual(len(result.skipped_files), 3)
+
+    @unittest.skipUnless(metrics.ENABLED, "prometheus_client is not installed")
+    def test_metrics(self):
+        from prometheus_client import REGISTRY
+
+        def sample(name: str, **labels: str) -> float:
+            return REGISTRY.get_sample_value(name, labels) or 0
+
+        phases = ("files_write", "nsjail_start", "execution", "attachments")
+        before = [sample("nsbox_phase_seconds_count", phase=phase) for phase in phases]
+        returncodes = sample("nsbox_returncodes_total", returncode="143")
+        truncations = sample("nsbox_output_truncations_total")
+
+        self.nsjail.max_output_size = 5
+        self.nsjail.warm_pool = unittest.mock.Mock(acquire=self.warm_jail)
+        files = [FileAttachment("test.py", b"print('hello world')")]
+        result = self.nsjail.run_code(["test.py"], files)
+
+        self.assertEqual(result.stdout, "hello")
+        after = [sample("nsbox_phase_seconds_count", phase=phase) for phase in phases]
+        self.assertEqual(after, [count + 1 for count in before])
+        self.assertEqual(sample("nsbox_returncodes_total", returncode="143"), returncodes + 1)
+        self.assertEqual(sample("nsbox_output_truncations_total"), truncations + 1)
+
+    def test_timings_and_usage(self):
+        self.nsjail.warm_pool = unittest.mock.Mock(acquire=self.warm_jail)
+        code = "x = bytearray(20_000_000); print(sum(range(1_000_000)))"
+        result = self.nsjail.run_code(["-c", code])
+
+        self.assertEqual(result.returncode, 0)
+        self.assertEqual(
+            set(result.timings),
+            {
+                "files_write",
+                "nsjail_start",
+                "stdout",
+                "execution",
+                "attachments",
+                "cleanup",
+                "total",
+            },
+        )
+        self.assertLessEqual(result.timings["stdout"], result.timings["execution"])
+        self.assertLessEqual(result.timings["execution"], result.timings["total"])
+        self.assertGreater(result.usage["user_time"] + result.usage["system_time"], 0)
+        self.assertGreater(result.usage["max_rss"], 20_000_000)
+
+    def test_warm_jail_timeout_returns_137(self):
+        self.nsjail.config.time_limit = 1
+        stream = self.nsjail._stream_warm(
+            self.warm_jail(), ["-c", "import time; time.sleep(10)"], ()
+        )
+        with self.assertRaises(StopIteration) as cm:
+            next(stream)
+        self.assertEqual(cm.exception.value.returncode, 137)
 
     def test_nsjail_args(self):
         args = ["foo", "bar"]
@@ -470,6 +790,49 @@ class NsJailArgsTests(unittest.TestCase):
         self.assertEqual(self.nsjail.read_chunk_size, self.read_chunk_size)
 
 
+class NsJailConfigMemfdTests(unittest.TestCase):
+    # Stands in for NsJail: prints the config it was given.
+    FAKE_NSJAIL = f"""#!{sys.executable}
+import sys
+args = sys.argv[1:]
+with open(args[args.index("--config") + 1]) as f:
+    print(f.read(), end="")
+"""
+
+    def setUp(self):
+        self._temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self._temp_dir.cleanup)
+        self.nsjail_path = Path(self._temp_dir.name, "nsjail")
+        self.nsjail_path.write_text(self.FAKE_NSJAIL)
+        self.nsjail_path.chmod(0o755)
+
+        logging.getLogger("nsbox.nsjail").setLevel(logging.WARNING)
+
+    def test_config_memfd(self):
+        nsjail = NsJail(str(self.nsjail_path), config_memfd=True, cgroup_stats=False)
+        result = nsjail.run_code(["-c", "pass"])
+
+        config = NsJailConfig()
+        text_format.Parse(result.stdout, config)
+        self.assertEqual(config, nsjail.config)
+
+        path = result.args[result.args.index("--config") + 1]
+        self.assertRegex(path, r"^/proc/self/fd/\d+$")
+        # The config can't be modified once written.
+        with self.assertRaises(PermissionError):
+            os.write(int(path.rsplit("/", 1)[1]), b"x")
+
+    def test_argv_template(self):
+        nsjail = NsJail(str(self.nsjail_path), cgroup_stats=False)
+        result = nsjail.run_code(["", "-c", "pass"], nsjail_args=["--time_limit", "1"])
+
+        self.assertEqual(result.args[: len(nsjail._argv_head)], list(nsjail._argv_head))
+        self.assertEqual(result.args[2], nsjail.config_path)
+        end = result.args.index("--")
+        self.assertEqual(result.args[end - 2 : end], ["--time_limit", "1"])
+        self.assertEqual(result.args[end:], [*nsjail._argv_exec, "-c", "pass"])
+
+
 class NsJailCgroupTests(unittest.TestCase):
     # This should still pass for v2, even if this test isn't relevant.
     def test_cgroupv1(self):
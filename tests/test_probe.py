@@ -0,0 +1,94 @@
+import multiprocessing
+import os
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from unittest import TestCase, mock
+
+from nsbox.nsjail import NsJail
+from nsbox.utils import probe
+
+
+def _probe_in_child(config_path: str, queue: multiprocessing.Queue) -> None:
+    """Probe `config_path` and report whether the cgroups had to be set up again."""
+    with mock.patch("nsbox.utils.cgroup.init", return_value=1) as init:
+        probe.probe(config_path)
+        queue.put(init.called)
+
+
+class ProbeTests(TestCase):
+    def setUp(self):
+        super().setUp()
+        tmp = TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.dir = Path(tmp.name)
+        self.config = self.dir / "test.cfg"
+        self.config.write_text('name: "test"\ntime_limit: 2\n')
+
+        probe.clear()
+        self.addCleanup(probe.clear)
+
+        patcher = mock.patch("nsbox.utils.cgroup.init", return_value=2)
+        self.init = patcher.start()
+        self.addCleanup(patcher.stop)
+        patcher = mock.patch("nsbox.utils.swap.should_ignore_limit", return_value=True)
+        self.should_ignore_limit = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_probe(self):
+        result = probe.probe(self.config)
+
+        self.assertEqual(result.config.name, "test")
+        self.assertEqual(result.config.time_limit, 2)
+        self.assertEqual(result.cgroup_version, 2)
+        self.assertTrue(result.ignore_swap_limits)
+        self.should_ignore_limit.assert_called_once_with(result.config, 2)
+
+    def test_probed_once(self):
+        first = probe.probe(self.config)
+        # The same file through another path.
+        second = probe.probe(self.dir / "." / "test.cfg")
+
+        self.assertIs(first, second)
+        self.init.assert_called_once()
+
+    def test_changed_config_is_probed_again(self):
+        first = probe.probe(self.config)
+        self.config.write_text('name: "test"\ntime_limit: 3\n')
+        # The modification time may not have changed on a coarse clock.
+        os.utime(self.config, ns=(0, 0))
+        second = probe.probe(self.config)
+
+        self.assertEqual(second.config.time_limit, 3)
+        self.assertNotEqual(first.digest, second.digest)
+        self.assertEqual(self.init.call_count, 2)
+
+    def test_forked_process_inherits_probes(self):
+        probe.probe(self.config)
+
+        context = multiprocessing.get_context("fork")
+        queue = context.Queue()
+        process = context.Process(target=_probe_in_child, args=(str(self.config), queue))
+        process.start()
+        process.join(10)
+
+        self.assertFalse(queue.get(timeout=1))
+
+    def test_probe_languages(self):
+        (self.dir / "a.toml").write_text('name = "test"\nconfig = "test.cfg"')
+
+        probes = probe.probe_languages(self.dir)
+        self.assertEqual(list(probes), ["test"])
+        self.assertIs(probes["test"], probe.probe(self.config))
+
+    def test_invalid_config_exits(self):
+        self.config.write_text("not a config")
+
+        with self.assertRaises(SystemExit), self.assertLogs(probe.log, "CRITICAL"):
+            probe.probe(self.config)
+
+    def test_nsjail_config_is_a_copy(self):
+        nsjail = NsJail(config_path=str(self.config), cgroup_stats=False)
+        nsjail.config.time_limit = 10
+
+        self.assertEqual(probe.probe(self.config).config.time_limit, 2)
+        self.assertEqual(nsjail.config_digest, probe.probe(self.config).digest)
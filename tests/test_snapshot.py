@@ -0,0 +1,75 @@
+import os
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from unittest import TestCase, mock
+
+from nsbox.utils.snapshot import Snapshot
+
+
+class SnapshotTests(TestCase):
+    def setUp(self):
+        super().setUp()
+        temp_dir = TemporaryDirectory()
+        self.addCleanup(temp_dir.cleanup)
+        self.root = Path(temp_dir.name)
+
+    def test_unchanged(self):
+        file = self.root / "file"
+        file.write_bytes(b"abc")
+        snapshot = Snapshot()
+        snapshot.add(file, b"abc")
+
+        self.assertIn(file, snapshot)
+        self.assertFalse(snapshot.changed(file))
+        self.assertFalse(snapshot.changed(str(self.root / "." / "file"), file.stat()))
+
+    def test_not_added(self):
+        file = self.root / "file"
+        file.write_bytes(b"abc")
+        self.assertTrue(Snapshot().changed(file))
+
+    def test_small_file_compared_by_content(self):
+        """Small files should be compared by content, whatever their modified time."""
+        file = self.root / "file"
+        file.write_bytes(b"abc")
+        snapshot = Snapshot()
+        state = snapshot.add(file)
+        self.assertIsNotNone(state.digest)
+
+        # Same size and modified time, as with writes within one tick of a coarse clock.
+        file.write_bytes(b"abd")
+        os.utime(file, ns=(state.mtime_ns, state.mtime_ns))
+        self.assertTrue(snapshot.changed(file))
+
+        # Touched, but the same content.
+        file.write_bytes(b"abc")
+        os.utime(file, ns=(state.mtime_ns + 10**9, state.mtime_ns + 10**9))
+        self.assertFalse(snapshot.changed(file))
+
+    def test_large_file_compared_by_stat(self):
+        """Large files should be compared by modified time, without being read."""
+        file = self.root / "file"
+        file.write_bytes(b"x" * 100)
+        snapshot = Snapshot(hash_size=10)
+        state = snapshot.add(file, b"x" * 100)
+        self.assertIsNone(state.digest)
+
+        with mock.patch.object(snapshot, "_read") as read:
+            self.assertFalse(snapshot.changed(file))
+            os.utime(file, ns=(state.mtime_ns + 1, state.mtime_ns + 1))
+            self.assertTrue(snapshot.changed(file))
+        read.assert_not_called()
+
+    def test_replaced_or_resized(self):
+        file = self.root / "file"
+        file.write_bytes(b"abc")
+        snapshot = Snapshot()
+        snapshot.add(file)
+
+        file.write_bytes(b"abcd")
+        self.assertTrue(snapshot.changed(file))
+
+        # Created before the original is removed, so its inode can't be reused.
+        (self.root / "other").write_bytes(b"abcd")
+        (self.root / "other").rename(file)
+        self.assertTrue(snapshot.changed(file))
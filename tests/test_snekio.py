@@ -1,7 +1,11 @@
+import json
+import tempfile
+from base64 import b64encode
+from pathlib import Path
 from unittest import TestCase
 
 from nsbox import nsio
-from nsbox.nsio import FileAttachment, IllegalPathError, ParsingError
+from nsbox.nsio import CHUNK_SIZE, FileAttachment, IllegalPathError, ParsingError
 
 
 class nsioTests(TestCase):
@@ -56,3 +60,35 @@ class nsioTests(TestCase):
             with self.assertRaises(error) as cm:
                 FileAttachment.from_dict(data)
             self.assertEqual(str(cm.exception), msg)
+
+    def test_file_from_path(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            file = Path(tmp, "dir", "a.bin")
+            file.parent.mkdir()
+            file.write_bytes(b"foo")
+            attachment = FileAttachment.from_path(file, relative_to=Path(tmp))
+            file.unlink()
+
+        self.assertEqual(attachment, FileAttachment("dir/a.bin", b"foo"))
+        self.assertEqual(attachment.as_dict, {"path": "dir/a.bin", "size": 3, "content": "Zm9v"})
+
+    def test_iter_content_and_b64(self):
+        content = bytes(range(256)) * (CHUNK_SIZE // 256 + 1)
+        for file in (FileAttachment("a", content), FileAttachment("a", memoryview(content))):
+            with self.subTest(type=type(file.content)):
+                self.assertEqual(b"".join(file.iter_content()), content)
+                self.assertTrue(all(isinstance(c, bytes) for c in file.iter_content()))
+
+                encoded = b64encode(content)
+                self.assertEqual(b"".join(file.iter_b64()), encoded)
+                self.assertEqual(file.b64_size, len(encoded))
+
+        self.assertEqual(list(FileAttachment("a", b"").iter_content()), [])
+        self.assertEqual(FileAttachment("a", b"").b64_size, 0)
+        with self.assertRaises(ValueError):
+            list(FileAttachment("a", b"abc").iter_b64(4))
+
+    def test_encoded_size(self):
+        for file in (FileAttachment("a", b""), FileAttachment('dir/"b"', b"\x00" * 100)):
+            with self.subTest(file=file):
+                self.assertEqual(file.encoded_size, len(json.dumps(file.as_dict)))
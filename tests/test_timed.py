@@ -1,30 +1,65 @@
-import math
+import threading
 import time
 from unittest import TestCase
 
-from nsbox.utils.timed import time_limit
-
-
-class TimedTests(TestCase):
-    def test_sleep(self):
-        """Test that a sleep can be interrupted."""
-        _finished = False
-        start = time.perf_counter()
-        with self.assertRaises(TimeoutError):
-            with time_limit(1):
-                time.sleep(2)
-                _finished = True
-        end = time.perf_counter()
-        self.assertLess(end - start, 2)
-        self.assertFalse(_finished)
-
-    def test_iter(self):
-        """Test that a long-running built-in function can be interrupted."""
-        _result = 0
-        start = time.perf_counter()
-        with self.assertRaises(TimeoutError):
-            with time_limit(1):
-                _result = math.factorial(2**30)
-        end = time.perf_counter()
-        self.assertEqual(_result, 0)
-        self.assertLess(end - start, 2)
+from nsbox.utils.timed import Deadline
+
+
+class DeadlineTests(TestCase):
+    def test_expires(self):
+        """Test that a deadline expires after its timeout, with sub-second precision."""
+        deadline = Deadline(0.2)
+        self.assertFalse(deadline.expired)
+        deadline.check()
+        self.assertLessEqual(deadline.remaining(), 0.2)
+
+        time.sleep(0.25)
+        self.assertTrue(deadline.expired)
+        self.assertEqual(deadline.remaining(), 0)
+        with self.assertRaisesRegex(TimeoutError, "timed out after 0.2 seconds"):
+            deadline.check()
+
+    def test_no_timeout(self):
+        deadline = Deadline()
+        self.assertIsNone(deadline.remaining())
+        self.assertFalse(deadline.expired)
+        self.assertFalse(deadline.wait(0.01))
+        deadline.check()
+
+    def test_wait(self):
+        start = time.monotonic()
+        self.assertFalse(Deadline(5).wait(0.1))
+        self.assertTrue(Deadline(0.1).wait(5))
+        self.assertLess(time.monotonic() - start, 1)
+
+    def test_cancel_from_another_thread(self):
+        """Test that cancelling a deadline wakes up a thread waiting for it."""
+        deadline = Deadline(10)
+        timer = threading.Timer(0.1, deadline.cancel)
+        start = time.monotonic()
+        timer.start()
+
+        self.assertTrue(deadline.wait())
+        self.assertLess(time.monotonic() - start, 5)
+        self.assertTrue(deadline.cancelled)
+        with self.assertRaisesRegex(TimeoutError, "cancelled"):
+            deadline.check("Parsing")
+
+    def test_check_in_threads(self):
+        """Test that deadlines are checked independently in any thread."""
+        errors = []
+
+        def check(timeout: float) -> None:
+            deadline = Deadline(timeout)
+            time.sleep(0.1)
+            try:
+                deadline.check()
+            except TimeoutError as e:
+                errors.append(e)
+
+        threads = [threading.Thread(target=check, args=(t,)) for t in (0.05, 5, 0.05, 5)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(errors), 2)
@@ -0,0 +1,122 @@
+import glob
+import os
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from unittest import TestCase
+
+from nsbox.utils.timed import Deadline
+from nsbox.utils.walk import GlobPattern, WalkLimitError, walk_files
+
+
+class WalkFilesTests(TestCase):
+    def setUp(self):
+        super().setUp()
+        temp_dir = TemporaryDirectory()
+        self.addCleanup(temp_dir.cleanup)
+        self.root = Path(temp_dir.name)
+
+    def make_files(self, *paths: str) -> None:
+        for path in paths:
+            file = self.root / path
+            file.parent.mkdir(parents=True, exist_ok=True)
+            file.write_bytes(b"")
+
+    def walk(self, pattern: str, **kwargs) -> list[str]:
+        return sorted(name for name, _ in walk_files(self.root, pattern, **kwargs))
+
+    def test_matches_like_glob(self):
+        """Files should match the same patterns as with a recursive glob, hidden ones excluded."""
+        self.make_files(
+            "a", "_b", "a-b", "[c]", "d/e.py", "d/_f", "d/.g", "d/h/i.txt", ".j/k", "l/m/n.py"
+        )
+        patterns = (
+            "**/*",
+            "**",
+            "**/[!_]*",
+            "*",
+            "*/*",
+            "d/*",
+            "**/*.py",
+            "d/**/*.txt",
+            "[a-c]*",
+            "[!a]*",
+            "[[]c]",
+            ".j/*",
+            "d/.*",
+        )
+        for pattern in patterns:
+            with self.subTest(pattern=pattern):
+                expected = sorted(
+                    path
+                    for path in glob.glob(pattern, root_dir=self.root, recursive=True)
+                    if (self.root / path).is_file()
+                )
+                self.assertEqual(self.walk(pattern), expected)
+
+    def test_symlinks(self):
+        """Symlinks to files should be found, but symlinks to directories not followed."""
+        self.make_files("dir/file")
+        os.symlink("dir/file", self.root / "file_link")
+        os.symlink("dir", self.root / "dir_link")
+        os.symlink("missing", self.root / "broken_link")
+        self.assertEqual(self.walk("**/*"), ["dir/file", "file_link"])
+
+    def test_entries_are_stat_cached(self):
+        """The yielded entries should have the stat result of the file."""
+        (self.root / "file").write_bytes(b"abc")
+        ((name, entry),) = walk_files(self.root)
+        self.assertEqual(name, "file")
+        self.assertEqual(entry.stat().st_size, 3)
+
+    def test_max_depth(self):
+        """Walking into directories deeper than the limit should fail."""
+        self.make_files("a/b/c/file")
+        self.assertEqual(self.walk("**/*", max_depth=3), ["a/b/c/file"])
+        with self.assertRaisesRegex(WalkLimitError, "directory depth limit"):
+            self.walk("**/*", max_depth=2)
+
+    def test_max_depth_beyond_pattern(self):
+        """Directories deeper than the pattern can match should be skipped rather than fail."""
+        self.make_files("a/file", "a/b/c/file")
+        self.assertEqual(self.walk("*/*", max_depth=1), ["a/file"])
+
+    def test_deep_tree(self):
+        """The walk shouldn't be limited by the recursion limit."""
+        # Created and removed iteratively, since os.makedirs and shutil.rmtree recurse too.
+        dirs = [self.root / Path(*["d"] * depth) for depth in range(1, 1200)]
+        for path in dirs:
+            path.mkdir()
+        self.addCleanup(lambda: [path.rmdir() for path in reversed(dirs)])
+        (dirs[-1] / "file").write_bytes(b"")
+        self.addCleanup((dirs[-1] / "file").unlink)
+
+        self.assertEqual(self.walk("**/*"), [f"{dirs[-1].relative_to(self.root).as_posix()}/file"])
+
+    def test_max_entries(self):
+        """Scanning more directory entries than the limit should fail."""
+        self.make_files(*(f"dir/{i}" for i in range(10)))
+        self.assertEqual(len(self.walk("**/*", max_entries=11)), 10)
+        with self.assertRaisesRegex(WalkLimitError, "directory entry limit"):
+            self.walk("**/*", max_entries=10)
+
+    def test_deadline(self):
+        """The walk should stop once its deadline expires or is cancelled."""
+        self.make_files("file")
+        deadline = Deadline(10)
+        deadline.cancel()
+        with self.assertRaises(TimeoutError):
+            self.walk("**/*", deadline=deadline)
+
+
+class GlobPatternTests(TestCase):
+    def test_max_depth(self):
+        self.assertIsNone(GlobPattern("**/*").max_depth)
+        self.assertIsNone(GlobPattern("a/**").max_depth)
+        self.assertEqual(GlobPattern("*").max_depth, 0)
+        self.assertEqual(GlobPattern("a/*/*.py").max_depth, 2)
+
+    def test_sets_exclude_separators(self):
+        """Negated sets shouldn't match across directories."""
+        self.assertTrue(GlobPattern("a[!_]b").match("axb"))
+        self.assertFalse(GlobPattern("a[!_]b").match("a/b"))
+        self.assertFalse(GlobPattern("a?b").match("a/b"))
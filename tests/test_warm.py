@@ -0,0 +1,153 @@
+import json
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from textwrap import dedent
+from unittest import TestCase, mock
+
+from nsbox.warm import BOOTSTRAP, WarmJail, WarmPool, warm_argv
+
+
+def bootstrap(*imports: str, cwd: str | None = None) -> subprocess.Popen:
+    """Start the bootstrap script in a plain interpreter in place of a jail."""
+    return subprocess.Popen(
+        [sys.executable, "-BSqu", "-c", BOOTSTRAP, *imports],
+        stdin=subprocess.PIPE,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.STDOUT,
+        cwd=cwd,
+    )
+
+
+def spawn() -> WarmJail:
+    return WarmJail(bootstrap(), mock.Mock(), tempfile.TemporaryFile(), [sys.executable])
+
+
+class WarmArgvTests(TestCase):
+    def test_supported(self):
+        cases = (
+            ["-c", "print(1)"],
+            ["-c", "print(1)", "arg"],
+            ["-m", "timeit", "-n", "1"],
+            ["test.py"],
+            ["test.py", "-c", "arg"],
+        )
+        for args in cases:
+            with self.subTest(args=args):
+                self.assertEqual(warm_argv(args), args)
+
+    def test_unsupported(self):
+        cases = ([], ["-c"], ["-m"], ["-X", "dev", "-c", "1"], ["-Ec", "1"], ["-c", "\0"])
+        for args in cases:
+            with self.subTest(args=args):
+                self.assertIsNone(warm_argv(args))
+
+
+class BootstrapTests(TestCase):
+    def run_bootstrap(self, argv: list[str], *imports: str, cwd: str | None = None):
+        process = bootstrap(*imports, cwd=cwd)
+        stdout, _ = process.communicate(json.dumps(argv).encode(), timeout=10)
+        return process.returncode, stdout.decode()
+
+    def test_code(self):
+        code = dedent(
+            """
+            import sys
+            print(sys.argv, __name__, sorted(k for k in globals() if not k.startswith("__")))
+            """
+        )
+        returncode, stdout = self.run_bootstrap(["-c", code, "arg"])
+        self.assertEqual(returncode, 0)
+        self.assertEqual(stdout, "['-c', 'arg'] __main__ ['sys']\n")
+
+    def test_exception(self):
+        returncode, stdout = self.run_bootstrap(["-c", "1 / 0"])
+        self.assertEqual(returncode, 1)
+        self.assertEqual(
+            stdout,
+            'Traceback (most recent call last):\n  File "<string>", line 1, in <module>\n'
+            "ZeroDivisionError: division by zero\n",
+        )
+
+    def test_syntax_error(self):
+        returncode, stdout = self.run_bootstrap(["-c", "1 +"])
+        self.assertEqual(returncode, 1)
+        self.assertTrue(stdout.startswith('  File "<string>", line 1'))
+        self.assertTrue(stdout.endswith("SyntaxError: invalid syntax\n"))
+
+    def test_exit(self):
+        returncode, stdout = self.run_bootstrap(["-c", "raise SystemExit(3)"])
+        self.assertEqual(returncode, 3)
+        self.assertEqual(stdout, "")
+
+    def test_module_and_path(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            Path(tmp, "test.py").write_text("import sys; print(sys.argv[1:], __name__)")
+            for argv in (["-m", "test", "arg"], ["test.py", "arg"]):
+                with self.subTest(argv=argv):
+                    returncode, stdout = self.run_bootstrap(argv, cwd=tmp)
+                    self.assertEqual(returncode, 0)
+                    self.assertEqual(stdout, "['arg'] __main__\n")
+
+    def test_imports(self):
+        code = "import sys; print('decimal' in sys.modules)"
+        self.assertEqual(self.run_bootstrap(["-c", code]), (0, "False\n"))
+        self.assertEqual(self.run_bootstrap(["-c", code], "decimal", "missing"), (0, "True\n"))
+
+    def test_no_request(self):
+        process = bootstrap()
+        stdout, _ = process.communicate(b"", timeout=10)
+        self.assertEqual((process.returncode, stdout), (0, b""))
+
+
+class WarmPoolTests(TestCase):
+    def setUp(self):
+        super().setUp()
+        self.pool = WarmPool(2, spawn)
+        self.addCleanup(self.pool.close)
+
+    def wait_for_idle(self, count: int):
+        for _ in range(100):
+            if self.pool.stats()["idle"] >= count:
+                return
+            time.sleep(0.05)
+        self.fail(f"Pool did not fill up to {count} jails")
+
+    def test_hit_and_miss(self):
+        self.assertIsNone(self.pool.acquire())
+        self.wait_for_idle(2)
+
+        with self.pool.acquire() as jail:
+            self.assertTrue(jail.alive)
+            process = jail.start(["-c", "print('hi')"])
+            self.assertEqual(process.stdout.read(), b"hi\n")
+            self.assertEqual(process.wait(timeout=10), 0)
+        jail.fs.cleanup.assert_called_once()
+
+        self.wait_for_idle(2)
+        stats = self.pool.stats()
+        self.assertEqual((stats["hits"], stats["misses"]), (1, 1))
+
+    def test_dead_jails_are_discarded(self):
+        self.pool.acquire()
+        self.wait_for_idle(2)
+        for jail in list(self.pool._idle):
+            jail.process.kill()
+            jail.process.wait()
+
+        with self.assertLogs("nsbox.warm", "WARNING"):
+            self.assertIsNone(self.pool.acquire())
+
+    def test_close(self):
+        self.pool.acquire()
+        self.wait_for_idle(2)
+        jails = list(self.pool._idle)
+
+        self.pool.close()
+        self.assertEqual(self.pool.stats()["idle"], 0)
+        for jail in jails:
+            self.assertFalse(jail.alive)
+        with self.assertRaises(RuntimeError):
+            self.pool.acquire()